@@ -1,28 +1,25 @@
 import logging
-from erddapy import ERDDAP
 import pandas as pd
 import os
 import re
 import json
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
 from math import ceil
 import urllib
+import urllib.error
 from urllib.parse import urlsplit, urlunsplit, quote
-from requests.exceptions import HTTPError, ConnectionError
 from decimal import *
-import requests
-import urllib3
 import io
 from gdutils.apis.dac import fetch_dac_catalog_json
-from gdutils.geojson import latlon_to_geojson_track
 
 
 class GdacClient(object):
 
     def __init__(self, erddap_url=None):
 
+        # erddapy, requests and the plotting packages are imported on first use to keep import gdutils fast
+        from erddapy import ERDDAP
+
         self._logger = logging.getLogger(os.path.basename(__file__))
 
         self._erddap_url = erddap_url or 'https://gliders.ioos.us/erddap'
@@ -51,6 +48,15 @@ class GdacClient(object):
         # Store the merged self.datasets and self._api_datasets
         self._merged_datasets = pd.DataFrame()
 
+        # gdutils.inventory.VariableInventory of the data set variables
+        self._variable_inventory = None
+
+        # gdutils.search.DatasetSearchEngine used by search_datasets before sending the search to the server
+        self._search_engine = None
+
+        # gdutils.intervals.DeploymentIntervalIndex of the time coverage of the search results
+        self._deployment_index = None
+
         self._profiles_variables = ['time',
                                     'latitude',
                                     'longitude',
@@ -113,6 +119,31 @@ class GdacClient(object):
 
         return self._datasets_summaries.join(self._datasets_info)
 
+    @property
+    def search_engine(self):
+        """
+        gdutils.search.DatasetSearchEngine created by self.build_search_engine
+        """
+        return self._search_engine
+
+    @property
+    def variable_inventory(self):
+        """
+        gdutils.inventory.VariableInventory created by self.build_variable_inventory or self.load_variable_inventory
+        """
+        return self._variable_inventory
+
+    @property
+    def deployment_index(self):
+        """
+        gdutils.intervals.DeploymentIntervalIndex of the time coverage of the data sets found by self.search_datasets
+        """
+        if self._deployment_index is None:
+            from gdutils.intervals import DeploymentIntervalIndex
+            self._deployment_index = DeploymentIntervalIndex.from_datasets_days(self._datasets_days)
+
+        return self._deployment_index
+
     @property
     def daily_profile_positions(self):
         return self._daily_profile_positions
@@ -132,6 +163,8 @@ class GdacClient(object):
             return
 
         self._datasets_days = df
+        # Rebuilt from the new data set days on next use
+        self._deployment_index = None
 
     @property
     def dataset_ids(self):
@@ -218,17 +251,15 @@ class GdacClient(object):
 
     @property
     def glider_days_per_yyyymmdd(self):
-        return self._datasets_days.sum(axis=1)
+        return self.deployment_index.period_counts('D')
 
     @property
     def glider_days_per_year(self):
-        return self._datasets_days.sum(axis=1).groupby(lambda x: x.year).sum()
+        return self.glider_days_per_yyyymmdd.groupby(lambda x: x.year).sum()
 
     @property
     def ymd_glider_days_calendar(self):
-        # calendar = self.glider_days_per_yyyymmdd.groupby(
-        #     [lambda x: x.year, lambda x: x.month, lambda x: x.day]).sum().unstack()
-        calendar = self._datasets_days.sum(axis=1).groupby(
+        calendar = self.glider_days_per_yyyymmdd.groupby(
             [lambda x: x.year, lambda x: x.month, lambda x: x.day]).sum().unstack()
 
         # Fill in the missing (yyyy,mm) indices
@@ -250,8 +281,7 @@ class GdacClient(object):
 
     @property
     def ym_glider_days_calendar(self):
-        # calendar = self.glider_days_per_yyyymmdd.groupby([lambda x: x.year, lambda x: x.month]).sum().unstack()
-        calendar = self._datasets_days.sum(axis=1).groupby([lambda x: x.year, lambda x: x.month]).sum().unstack()
+        calendar = self.glider_days_per_yyyymmdd.groupby([lambda x: x.year, lambda x: x.month]).sum().unstack()
 
         # Fill in the missing year indices
         years = np.arange(calendar.index.min(), calendar.index.max() + 1)
@@ -270,8 +300,7 @@ class GdacClient(object):
 
     @property
     def md_glider_days_calendar(self):
-        # calendar = self.glider_days_per_yyyymmdd.groupby([lambda x: x.month, lambda x: x.day]).sum().unstack()
-        calendar = self._datasets_days.sum(axis=1).groupby([lambda x: x.month, lambda x: x.day]).sum().unstack()
+        calendar = self.glider_days_per_yyyymmdd.groupby([lambda x: x.month, lambda x: x.day]).sum().unstack()
 
         # Fill in the missing month indices
         calendar.reindex(pd.Index(np.arange(1, 13)))
@@ -289,18 +318,23 @@ class GdacClient(object):
 
     @property
     def deployments_per_yyyymmdd(self):
-        return self._datasets_days.sum(axis=1)
+        return self.deployment_index.period_counts('D')
+
+    @property
+    def deployments_per_yyyymm(self):
+        return self.deployment_index.period_counts('M')
 
     @property
     def deployments_per_year(self):
-        return self._datasets_days.groupby(lambda x: x.year).any().sum(axis=1)
+        counts = self.deployment_index.period_counts('Y')
+        counts.index = counts.index.year
+
+        return counts
 
     @property
     def ymd_deployments_calendar(self):
-        # calendar = self.deployments_per_yyyymmdd.groupby(
-        #     [lambda x: x.year, lambda x: x.month, lambda x: x.day]).sum().unstack()
-        calendar = self._datasets_days.groupby([lambda x: x.year, lambda x: x.month, lambda x: x.day]).any().sum(
-            axis=1).unstack()
+        calendar = self.deployments_per_yyyymmdd.groupby(
+            [lambda x: x.year, lambda x: x.month, lambda x: x.day]).sum().unstack()
 
         # Fill in the missing (yyyy,mm) indices
         years = np.arange(calendar.index.levels[0].min(), calendar.index.levels[0].max() + 1)
@@ -321,8 +355,7 @@ class GdacClient(object):
 
     @property
     def ym_deployments_calendar(self):
-        # calendar = self.deployments_per_yyyymmdd.groupby([lambda x: x.year, lambda x: x.month]).sum().unstack()
-        calendar = self._datasets_days.groupby([lambda x: x.year, lambda x: x.month]).any().sum(axis=1).unstack()
+        calendar = self.deployments_per_yyyymm.groupby([lambda x: x.year, lambda x: x.month]).sum().unstack()
 
         # Fill in the missing year indices
         years = np.arange(calendar.index.min(), calendar.index.max() + 1)
@@ -341,8 +374,8 @@ class GdacClient(object):
 
     @property
     def md_deployments_calendar(self):
-        # calendar = self.deployments_per_yyyymmdd.groupby([lambda x: x.month, lambda x: x.day]).sum().unstack()
-        calendar = self._datasets_days.groupby([lambda x: x.month, lambda x: x.day]).any().sum(axis=1).unstack()
+        # Deployments spanning several years are counted once for each month and day
+        calendar = self.deployment_index.month_day_counts().unstack()
 
         # Fill in the missing month indices
         calendar.reindex(pd.Index(np.arange(1, 13)))
@@ -396,6 +429,7 @@ class GdacClient(object):
         :return:
         self.erddap_datasets: Pandas DataFrame containing the result of the Advanced Search
         """
+        import requests
 
         try:
 
@@ -435,6 +469,7 @@ class GdacClient(object):
         :param dataset_id: valid ERDDAP dataset id
         :return: Valid WMO ID or empty string
         """
+        import requests
 
         wmo_id = None
         if dataset_id not in self._erddap_datasets.index:
@@ -478,11 +513,12 @@ class GdacClient(object):
         self.datasets
 
         Equivalent to ERDDAP's Advanced Search.  Searches can be performed by free text, bounding box, time bounds, etc.
-        See the erddapy documentation for valid kwargs"""
+        See the erddapy documentation for valid kwargs.  If self.search_engine has been built, the search is answered
+        locally and only sent to the server if the engine cannot answer it"""
+        import requests
+        import urllib3
 
         url = self._client.get_search_url(items_per_page=self._items_per_page, **params)
-        self._logger.debug(url)
-        self._last_request = url
 
         glider_regex = re.compile(r'^(.*)-\d{8}T\d{4}')
 
@@ -504,14 +540,22 @@ class GdacClient(object):
             dataset_ids = [dataset_ids]
 
         try:
-            self._datasets_info = pd.read_csv(url)
-            # Drop the allDatasets row
-            self._datasets_info.drop(self._datasets_info[self._datasets_info['Dataset ID'] == 'allDatasets'].index,
-                                     inplace=True)
+            # Answer the search from the local search engine, if possible, and the ERDDAP server otherwise
+            search_ids = self._search_engine.search(params) if self._search_engine is not None else None
+            if search_ids is not None:
+                self._logger.info('{:} datasets found in the local search engine'.format(len(search_ids)))
+                self._datasets_info = self._erddap_datasets.loc[search_ids].reset_index()
+            else:
+                self._logger.debug(url)
+                self._last_request = url
+                self._datasets_info = pd.read_csv(url)
 
-            # rename columns more friendly
-            columns = {s: s.replace(' ', '_').lower() for s in self._datasets_info.columns}
-            self._datasets_info.rename(columns=columns, inplace=True)
+                # rename columns more friendly
+                columns = {s: s.replace(' ', '_').lower() for s in self._datasets_info.columns}
+                self._datasets_info.rename(columns=columns, inplace=True)
+
+            # Drop the allDatasets row
+            self._datasets_info = self._datasets_info[self._datasets_info.dataset_id != 'allDatasets']
 
             if not include_delayed_mode:
                 self._logger.info('Excluding delayed mode datasets')
@@ -556,7 +600,7 @@ class GdacClient(object):
                 self._logger.debug('Creating download url: {:}'.format(dataset_id))
                 data_url = self._client.get_download_url(dataset_id=dataset_id,
                                                          variables=self._profiles_variables)
-            except (ConnectionError, ConnectionRefusedError, urllib3.exceptions.MaxRetryError,
+            except (requests.exceptions.ConnectionError, ConnectionRefusedError, urllib3.exceptions.MaxRetryError,
                     requests.exceptions.HTTPError) as e:
                 self._logger.error('{:} fetch failed: {:}'.format(dataset_id, e))
                 continue
@@ -625,6 +669,10 @@ class GdacClient(object):
         # Create and store the DataFrame containing a 1 on each day the glider was deployed, 0 otherwise
         self._datasets_days = pd.concat(datasets_days, axis=1).sort_index()
 
+        # Index the deployment time coverage for the active data set queries and the calendars
+        from gdutils.intervals import DeploymentIntervalIndex
+        self._deployment_index = DeploymentIntervalIndex.from_datasets(self._datasets_summaries)
+
         # Create and store the DataFrame containing the number of profiles on each day for each deployment
         self._datasets_profiles = pd.concat(daily_profiles, axis=1).sort_index()
         self._datasets_profiles.index = pd.to_datetime(self._datasets_profiles.index)
@@ -634,6 +682,25 @@ class GdacClient(object):
 
         return
 
+    def build_search_engine(self, metadata_index=None):
+        """
+        Build the local search engine from self.erddap_datasets and the ERDDAP allDatasets table.  Once built,
+        search_datasets answers searches locally and only sends searches the engine cannot answer to the server.
+        Rebuild the engine to pick up new data sets.
+
+        :param metadata_index: gdutils.metadata.MetadataIndex enabling local search_for, ioos_category, long_name,
+            standard_name and variable_name searches.  Without it, search_for searches are sent to the server
+        :return: gdutils.search.DatasetSearchEngine or None if the engine could not be built
+        """
+        from gdutils.search import DatasetSearchEngine
+
+        search_engine = DatasetSearchEngine.from_client(self, metadata_index=metadata_index)
+        if search_engine is not None:
+            self._search_engine = search_engine
+            self._logger.info('Created {:}'.format(search_engine))
+
+        return search_engine
+
     def get_dataset_info(self, dataset_id):
         """Fetch the dataset metadata for the specified dataset_id"""
 
@@ -759,6 +826,21 @@ class GdacClient(object):
             self._logger.error('Request: {:}'.format(url))
             return pd.DataFrame()
 
+    def get_dataset_track(self, dataset_id):
+        """
+        Fetch the profiles of the specified dataset as a compact, time sorted gdutils.track.DatasetTrack
+
+        :param dataset_id: ERDDAP dataset ID
+        :return: DatasetTrack or None if no profiles were found
+        """
+        from gdutils.track import DatasetTrack
+
+        profiles = self.get_dataset_profiles(dataset_id)
+        if profiles.empty:
+            return
+
+        return DatasetTrack.from_profiles(profiles, dataset_id=dataset_id)
+
     def get_dataset_time_coverage(self, dataset_id):
         """Get the time coverage and wmo id (if specified) for specified dataset_id """
         if dataset_id not in self.dataset_ids:
@@ -806,6 +888,9 @@ class GdacClient(object):
 
     def plot_yearly_totals(self, totals_type=None, palette='Blues_d', **kwargs):
         """Bar chart plot of deployments, glider days and profiles, grouped by year"""
+        import seaborn as sns
+        import matplotlib.pyplot as plt
+
         totals = self.yearly_counts.reset_index()
 
         if totals_type and totals_type not in totals.columns:
@@ -874,27 +959,107 @@ class GdacClient(object):
             self._logger.error('Dataset id {:} not found in {:}'.format(dataset_id, self.__repr__()))
             return {}
 
-        profiles = self.get_dataset_profiles(dataset_id)
-        if profiles.empty:
+        track = self.get_dataset_track(dataset_id)
+        if not track:
             self._logger.warning('No profiles found for dataset ID: {:}'.format(dataset_id))
             return {}
 
-        return latlon_to_geojson_track(profiles.latitude,
-                                       profiles.longitude,
-                                       profiles.index,
-                                       include_points=points,
-                                       precision=precision)
+        return track.to_geojson(include_points=points, precision=precision)
 
     def get_dataset_metadata(self, dataset_id):
+        import requests
+        import urllib3
 
         try:
             info_url = self._client.get_info_url(dataset_id)
             return pd.read_csv(info_url)
-        except (ConnectionError, ConnectionRefusedError, urllib3.exceptions.MaxRetryError,
+        except (requests.exceptions.ConnectionError, ConnectionRefusedError, urllib3.exceptions.MaxRetryError,
                 requests.exceptions.HTTPError) as e:
             self._logger.error(e)
             return pd.DataFrame([])
 
+    def build_variable_inventory(self, dataset_ids=None, metadata_index=None, path=None):
+        """
+        Harvest the info pages of dataset_ids into metadata_index and build the data set x variable inventory, stored
+        in self.variable_inventory.  Only new and updated info pages are fetched.
+
+        :param dataset_ids: list of dataset ids.  Defaults to self.dataset_ids or, if no search has been performed, all
+            data sets on the ERDDAP server
+        :param metadata_index: gdutils.metadata.MetadataIndex instance.  Defaults to the index at
+            gdutils.metadata.metadata_index_path
+        :param path: if specified, the inventory is written to path
+        :return: gdutils.inventory.VariableInventory
+        """
+        from gdutils.metadata import MetadataIndex
+        from gdutils.inventory import VariableInventory
+
+        dataset_ids = dataset_ids or self.dataset_ids or self._erddap_datasets.index.tolist()
+        if not dataset_ids:
+            self._logger.warning('No data sets to inventory')
+            return
+
+        metadata_index = metadata_index or MetadataIndex(erddap_url=self._erddap_url)
+        metadata_index.harvest(dataset_ids)
+
+        self._variable_inventory = VariableInventory.from_metadata_index(metadata_index, dataset_ids=dataset_ids)
+        self._logger.info('Created {:}'.format(self._variable_inventory))
+
+        if path:
+            self._variable_inventory.save(path)
+
+        return self._variable_inventory
+
+    def load_variable_inventory(self, path=None):
+        """
+        Load an inventory written by VariableInventory.save into self.variable_inventory
+
+        :param path: inventory file.  Defaults to gdutils.inventory.variable_inventory_path
+        :return: gdutils.inventory.VariableInventory or None if the inventory could not be loaded
+        """
+        from gdutils.inventory import VariableInventory
+
+        inventory = VariableInventory.load(path)
+        if inventory is not None:
+            self._variable_inventory = inventory
+
+        return inventory
+
+    def get_datasets_with_variables(self, variables, min_time=None, max_time=None, match='all'):
+        """
+        Dataset ids containing variables and active between min_time and max_time, from self.variable_inventory
+
+        :param variables: variable name or list of variable names
+        :param min_time: window start
+        :param max_time: window end
+        :param match: 'all' to require all variables or 'any' to require at least one
+        :return: list of dataset ids
+        """
+        if self._variable_inventory is None:
+            self._logger.warning('No variable inventory. Use build_variable_inventory or load_variable_inventory')
+            return []
+
+        return self._variable_inventory.find_datasets(variables, min_time=min_time, max_time=max_time, match=match)
+
+    def get_active_datasets(self, dt0, dt1=None):
+        """
+        Dataset ids, from the last search, active at dt0 or, if dt1 is specified, at any time between dt0 and dt1
+
+        :param dt0: datetime or window start
+        :param dt1: window end
+        :return: list of dataset ids in start time order
+        """
+        return self.deployment_index.overlapping(dt0, dt1 if dt1 is not None else dt0)
+
+    def get_datasets_glider_days(self, dt0, dt1):
+        """
+        Number of days between dt0 and dt1 inclusive each data set, from the last search, was deployed
+
+        :param dt0: window start
+        :param dt1: window end
+        :return: Series indexed by the dataset ids of the data sets active between dt0 and dt1
+        """
+        return self.deployment_index.days_active(dt0, dt1)
+
     def get_api_datasets(self):
         """
         Fetch all data sets registered at the U.S IOOS Glider DAC.  The url is stored in gdutils.dac.dac_catalog_url
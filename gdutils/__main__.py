@@ -0,0 +1,4 @@
+import sys
+from gdutils.cli import main
+
+sys.exit(main())
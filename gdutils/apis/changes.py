@@ -0,0 +1,209 @@
+import logging
+import os
+import pandas as pd
+from gdutils.apis.dac import fetch_dac_catalog_dataframe
+
+logging.getLogger(__file__)
+
+# Columns that indicate a data set has been updated, in order of preference
+change_key_columns = ['latest_file_mtime',
+                      'updated']
+
+
+class CatalogChanges(object):
+
+    def __init__(self, old, new, added, removed, modified, changed_fields):
+        """Added, removed and modified data sets between two DAC catalog snapshots, as returned by
+        diff_catalog_snapshots"""
+
+        self._old = old
+        self._new = new
+        self._added = added
+        self._removed = removed
+        self._modified = modified
+        self._changed_fields = changed_fields
+
+    @property
+    def added(self):
+        """Dataset ids found in the new snapshot only"""
+        return self._added
+
+    @property
+    def removed(self):
+        """Dataset ids found in the old snapshot only"""
+        return self._removed
+
+    @property
+    def modified(self):
+        """Dataset ids found in both snapshots that have been updated"""
+        return self._modified
+
+    @property
+    def changed_fields(self):
+        """Dictionary mapping each modified dataset id to the list of fields that differ between the snapshots"""
+        return self._changed_fields
+
+    @property
+    def changed_dataset_ids(self):
+        """Dataset ids that need to be (re)processed: added and modified data sets"""
+        return sorted(self._added + self._modified)
+
+    @property
+    def added_datasets(self):
+        return self._new.loc[self._added]
+
+    @property
+    def removed_datasets(self):
+        return self._old.loc[self._removed]
+
+    @property
+    def modified_datasets(self):
+        return self._new.loc[self._modified]
+
+    @property
+    def is_empty(self):
+        return not (self._added or self._removed or self._modified)
+
+    def to_frame(self):
+        """
+        One row per change: added and removed data sets and each changed field of the modified data sets
+        :return: DataFrame with dataset_id, change, field, old_value and new_value columns
+        """
+        columns = ['dataset_id', 'change', 'field', 'old_value', 'new_value']
+
+        rows = [[dataset_id, 'added', None, None, None] for dataset_id in self._added]
+        rows += [[dataset_id, 'removed', None, None, None] for dataset_id in self._removed]
+        for dataset_id in self._modified:
+            for field in self._changed_fields[dataset_id]:
+                rows.append([dataset_id,
+                             'modified',
+                             field,
+                             self._old.at[dataset_id, field] if field in self._old.columns else None,
+                             self._new.at[dataset_id, field] if field in self._new.columns else None])
+
+        return pd.DataFrame(rows, columns=columns)
+
+    def __repr__(self):
+        return '<CatalogChanges(added={:}, removed={:}, modified={:})>'.format(len(self._added),
+                                                                            len(self._removed),
+                                                                            len(self._modified))
+
+
+def diff_catalog_snapshots(old, new, key_columns=None, compare_columns=None):
+    """
+    Compare two DAC catalog snapshots, as returned by fetch_dac_catalog_dataframe or fetch_datasets_status_dataframe,
+    indexed by dataset_id.  A data set found in both snapshots is modified if any of key_columns differ.  The fields
+    reported as changed are taken from compare_columns.
+    :param old: previous catalog snapshot DataFrame
+    :param new: current catalog snapshot DataFrame
+    :param key_columns: columns used to detect modified data sets.  Defaults to the columns in
+        gdutils.apis.changes.change_key_columns present in both snapshots, or all shared columns if there are none
+    :param compare_columns: columns reported in CatalogChanges.changed_fields.  Defaults to all shared columns
+    :return: CatalogChanges
+    """
+    shared_columns = [col for col in new.columns if col in old.columns]
+
+    if key_columns is None:
+        key_columns = [col for col in change_key_columns if col in shared_columns] or shared_columns
+    else:
+        key_columns = [col for col in key_columns if col in shared_columns]
+
+    if compare_columns is None:
+        compare_columns = shared_columns
+    else:
+        compare_columns = [col for col in compare_columns if col in shared_columns]
+
+    added = sorted(new.index.difference(old.index))
+    removed = sorted(old.index.difference(new.index))
+
+    common = new.index.intersection(old.index)
+    old_common = old.loc[common]
+    new_common = new.loc[common]
+
+    is_modified = pd.Series(False, index=common)
+    for col in key_columns:
+        is_modified |= _column_differs(old_common[col], new_common[col])
+
+    modified = sorted(common[is_modified.values])
+
+    changed_fields = {dataset_id: [] for dataset_id in modified}
+    if modified:
+        old_modified = old_common.loc[modified]
+        new_modified = new_common.loc[modified]
+        for col in compare_columns:
+            differs = _column_differs(old_modified[col], new_modified[col])
+            for dataset_id in differs.index[differs.values]:
+                changed_fields[dataset_id].append(col)
+
+    return CatalogChanges(old, new, added, removed, modified, changed_fields)
+
+
+def fetch_dac_catalog_changes(snapshot_path, url=None, key_columns=None):
+    """
+    Fetch the current DAC deployments catalog, diff it against the snapshot stored at snapshot_path and replace the
+    stored snapshot with the current catalog.  All data sets are reported as added if no snapshot exists.
+    :param snapshot_path: location of the stored catalog snapshot
+    :param url: Alternate url end point
+    :param key_columns: columns used to detect modified data sets
+    :return: CatalogChanges or None if the catalog could not be fetched
+    """
+    new = fetch_dac_catalog_dataframe(url=url)
+    if new.empty:
+        logging.error('Failed to fetch the DAC catalog')
+        return
+
+    old = load_catalog_snapshot(snapshot_path)
+    if old.empty:
+        old = new.iloc[0:0]
+
+    changes = diff_catalog_snapshots(old, new, key_columns=key_columns)
+
+    save_catalog_snapshot(new, snapshot_path)
+
+    return changes
+
+
+def save_catalog_snapshot(df, snapshot_path):
+    """
+    Write a catalog snapshot DataFrame to snapshot_path.  Data types are preserved.
+    :param df: catalog snapshot DataFrame
+    :param snapshot_path: snapshot file path
+    :return: snapshot_path or None if the write failed
+    """
+    tmp_path = '{:}.{:}.tmp'.format(snapshot_path, os.getpid())
+    try:
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, snapshot_path)
+    except (IOError, OSError) as e:
+        logging.error('Failed to write catalog snapshot {:}: {:}'.format(snapshot_path, e))
+        return
+
+    return snapshot_path
+
+
+def load_catalog_snapshot(snapshot_path):
+    """
+    Read a catalog snapshot written by save_catalog_snapshot
+    :param snapshot_path: snapshot file path
+    :return: catalog snapshot DataFrame or an empty DataFrame if the snapshot does not exist
+    """
+    if not os.path.isfile(snapshot_path):
+        logging.info('No catalog snapshot found: {:}'.format(snapshot_path))
+        return pd.DataFrame()
+
+    try:
+        return pd.read_pickle(snapshot_path)
+    except (IOError, OSError, ValueError) as e:
+        logging.error('Failed to read catalog snapshot {:}: {:}'.format(snapshot_path, e))
+        return pd.DataFrame()
+
+
+def _column_differs(old, new):
+
+    both_null = (old.isnull() & new.isnull()).values
+    try:
+        differs = (old.values != new.values)
+    except (TypeError, ValueError):
+        differs = (old.astype('str').values != new.astype('str').values)
+
+    return pd.Series(differs & ~both_null, index=new.index)
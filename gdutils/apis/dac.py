@@ -1,23 +1,84 @@
-import requests
 import logging
 import pandas as pd
+import os
+import json
+import time
+import copy
+import hashlib
+import threading
 
 dac_catalog_url = 'https://gliders.ioos.us/providers/api/deployment'
 
+# Number of seconds a fetched catalog is used before it is revalidated with the server
+dac_catalog_ttl = 300
+
+# Location of the on-disk catalog cache. Set to None to keep the cache in memory only
+dac_catalog_cache_dir = os.getenv('GDUTILS_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'gdutils'))
+
+# In-memory catalog cache entries, keyed by url
+_catalog_cache = {}
+_catalog_lock = threading.Lock()
+
 logging.getLogger(__file__)
 
 
-def fetch_dac_catalog_dataframe(url=None):
+def fetch_dac_catalog_dataframe(url=None, ttl=None):
     """
-    Fetch the DAC deployments API json response and convert to a DataFrame with appropriate data types.
+    Fetch the DAC deployments API json response and convert to a DataFrame with appropriate data types.  The parsed
+    DataFrame is cached along with the response and only rebuilt when the catalog changes.
     :param url: Alternate url end point
+    :param ttl: Number of seconds a cached catalog is used before revalidating with the server
     :return: pandas DataFrame
     """
 
-    catalog = fetch_dac_catalog_json(url=url)
-    if not catalog:
+    entry = _fetch_cached_catalog(url=url, ttl=ttl)
+    if not entry['results']:
         return pd.DataFrame()
 
+    if entry['dataframe'] is None:
+        entry['dataframe'] = _catalog_to_dataframe(entry['results'])
+
+    return entry['dataframe'].copy()
+
+
+def fetch_dac_catalog_json(url=None, ttl=None):
+    """
+    Fetch the API end point response located at gdutils.apis.dac.dac_catalog_url.  Responses are cached in memory and
+    in gdutils.apis.dac.dac_catalog_cache_dir for ttl seconds, after which the catalog is revalidated with a conditional
+    GET (ETag/If-Modified-Since).  An unchanged catalog costs a single 304 response.
+    :param url: Alternate url end point
+    :param ttl: Number of seconds a cached catalog is used before revalidating with the server
+    :return: json
+    """
+
+    entry = _fetch_cached_catalog(url=url, ttl=ttl)
+
+    # Callers are free to modify the returned records
+    return copy.deepcopy(entry['results'])
+
+
+def clear_dac_catalog_cache(disk=False):
+    """
+    Clear the in-memory catalog cache and, optionally, the on-disk catalog cache
+    :param disk: Also remove the cached catalog files
+    """
+
+    with _catalog_lock:
+        urls = list(_catalog_cache.keys())
+        _catalog_cache.clear()
+
+        if not disk or not dac_catalog_cache_dir:
+            return
+
+        for url in set(urls + [dac_catalog_url]):
+            cache_file = _catalog_cache_file(url)
+            if os.path.isfile(cache_file):
+                logging.info('Removing cached catalog {:}'.format(cache_file))
+                os.remove(cache_file)
+
+
+def _catalog_to_dataframe(catalog):
+
     df = pd.DataFrame(catalog).rename(columns={'name': 'dataset_id'}).set_index('dataset_id')
 
     drop_cols = ['estimated_deploy_date',
@@ -39,33 +100,113 @@ def fetch_dac_catalog_dataframe(url=None):
                       'latest_file_mtime',
                       'updated']
 
-    # Convert timestamp_cols to datetime64[ns] dtype
+    # Convert timestamp_cols (milliseconds since the epoch) to datetime64[ns] dtype
     for col in timestamp_cols:
-        df[col] = pd.to_datetime(df[col]/1000, utc=True, format='s', errors='coerce')
+        df[col] = pd.to_datetime(df[col], unit='ms', utc=True, errors='coerce')
 
     return df
 
 
-def fetch_dac_catalog_json(url=None):
-    """
-    Fetch the API end point response located at gdutils.apis.dac.dac_catalog_url
-    :param url: Alternate url end point
-    :return: json
-    """
+def _fetch_cached_catalog(url=None, ttl=None):
 
     url = url or dac_catalog_url
+    ttl = dac_catalog_ttl if ttl is None else ttl
+
+    # Concurrent callers wait for a single fetch rather than each requesting the catalog
+    with _catalog_lock:
+
+        entry = _catalog_cache.get(url) or _read_catalog_cache_file(url)
+        if entry:
+            _catalog_cache[url] = entry
+            if time.time() - entry['fetched'] < ttl:
+                logging.debug('Using cached catalog: {:}'.format(url))
+                return entry
+
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        logging.info('Fetching API registered data sets from {:}'.format(url))
+
+        import requests
+        try:
+            r = requests.get(url, headers=headers, timeout=60)
+        except requests.exceptions.RequestException as e:
+            logging.error('Failed to fetch API endpoint {:} ({:})'.format(url, e))
+            return entry or _new_catalog_entry()
+
+        if r.status_code == 304 and entry:
+            logging.info('Catalog not modified: {:}'.format(url))
+            entry['fetched'] = time.time()
+            _write_catalog_cache_file(url, entry)
+            return entry
+
+        if r.status_code != 200:
+            logging.error('Failed to fetch DAC registered deployments: {:}'.format(r.reason))
+            return entry or _new_catalog_entry()
+
+        entry = _new_catalog_entry(results=r.json()['results'],
+                                   etag=r.headers.get('ETag'),
+                                   last_modified=r.headers.get('Last-Modified'))
+
+        _catalog_cache[url] = entry
+        _write_catalog_cache_file(url, entry)
+
+        return entry
 
-    logging.info('Fetching API registered data sets from {:}'.format(url))
+
+def _new_catalog_entry(results=None, etag=None, last_modified=None, fetched=None):
+
+    return {'results': results or [],
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched': time.time() if fetched is None else fetched,
+            'dataframe': None}
+
+
+def _catalog_cache_file(url):
+
+    return os.path.join(dac_catalog_cache_dir, 'dac_catalog_{:}.json'.format(hashlib.sha1(url.encode()).hexdigest()))
+
+
+def _read_catalog_cache_file(url):
+
+    if not dac_catalog_cache_dir:
+        return
+
+    cache_file = _catalog_cache_file(url)
+    if not os.path.isfile(cache_file):
+        return
 
     try:
-        r = requests.get(dac_catalog_url, timeout=60)
-    except requests.exceptions.ReadTimeout as e:
-        logging.error('Failed to fetch API endpoint {:} ({:})'.format(url, e))
-        return []
+        with open(cache_file, 'r') as fid:
+            cached = json.load(fid)
+        return _new_catalog_entry(results=cached['results'],
+                                  etag=cached['etag'],
+                                  last_modified=cached['last_modified'],
+                                  fetched=float(cached['fetched']))
+    except (IOError, ValueError, KeyError, TypeError) as e:
+        logging.warning('Ignoring invalid catalog cache file {:}: {:}'.format(cache_file, e))
+        return
 
-    if r.status_code == 200:
-        return r.json()['results']
 
-    logging.error('Failed to fetch DAC registered deployments: {:}'.format(r.reason))
+def _write_catalog_cache_file(url, entry):
 
-    return []
+    if not dac_catalog_cache_dir:
+        return
+
+    cache_file = _catalog_cache_file(url)
+    tmp_file = '{:}.{:}.tmp'.format(cache_file, os.getpid())
+    try:
+        os.makedirs(dac_catalog_cache_dir, exist_ok=True)
+        with open(tmp_file, 'w') as fid:
+            json.dump({'url': url,
+                       'etag': entry['etag'],
+                       'last_modified': entry['last_modified'],
+                       'fetched': entry['fetched'],
+                       'results': entry['results']}, fid)
+        os.replace(tmp_file, cache_file)
+    except (IOError, OSError) as e:
+        logging.warning('Failed to write catalog cache file {:}: {:}'.format(cache_file, e))
@@ -1,160 +1,300 @@
 import logging
+import re
+import numpy as np
 import pandas as pd
 
 logging.getLogger(__file__)
 
+# Columns used to build the data set status codes
+status_columns = ['delayed_mode',
+                  'completed',
+                  'orphaned']
+
+# Status code bits.  Each data set is assigned a code in [0, 8) built from these bits
+DELAYED_MODE_BIT = 1
+COMPLETED_BIT = 2
+ORPHANED_BIT = 4
+
+_all_codes = frozenset(range(8))
+
+
+class StatusFilter(object):
+
+    def __init__(self, codes, expression):
+        """Data set status predicate, stored as the set of status codes it matches.  Predicates are combined with
+        & (and), | (or) and ~ (not)"""
+
+        self._codes = frozenset(codes)
+        self._expression = expression
+
+    @property
+    def codes(self):
+        return self._codes
+
+    @property
+    def expression(self):
+        return self._expression
+
+    def __and__(self, other):
+        return StatusFilter(self._codes & other.codes, '({:} & {:})'.format(self._expression, other.expression))
+
+    def __or__(self, other):
+        return StatusFilter(self._codes | other.codes, '({:} | {:})'.format(self._expression, other.expression))
+
+    def __invert__(self):
+        return StatusFilter(_all_codes - self._codes, '~{:}'.format(self._expression))
+
+    def __repr__(self):
+        return '<StatusFilter(expression={:}, codes={:})>'.format(self._expression, sorted(self._codes))
+
+
+DELAYED_MODE = StatusFilter([c for c in _all_codes if c & DELAYED_MODE_BIT], 'delayed_mode')
+COMPLETED = StatusFilter([c for c in _all_codes if c & COMPLETED_BIT], 'completed')
+ORPHANED = StatusFilter([c for c in _all_codes if c & ORPHANED_BIT], 'orphaned')
+REAL_TIME = StatusFilter((~DELAYED_MODE).codes, 'real_time')
+ACTIVE = StatusFilter((~COMPLETED).codes, 'active')
+
+# Names available to compile_status_filter
+status_filters = {'delayed_mode': DELAYED_MODE,
+                  'real_time': REAL_TIME,
+                  'completed': COMPLETED,
+                  'inactive': COMPLETED,
+                  'active': ACTIVE,
+                  'orphaned': ORPHANED,
+                  'all': StatusFilter(_all_codes, 'all')}
+
+_token_regex = re.compile(r'\s*(\(|\)|&|\||~|[A-Za-z_]+)')
+
+
+def compile_status_filter(expression):
+    """
+    Compile a status filter expression (i.e.: 'real_time & active & ~orphaned') to a StatusFilter.  Expressions are
+    built from the names in status_filters, the operators & (and), | (or), ~ (not) and parentheses.  The words and, or
+    and not may be used in place of the operators.
+    :param expression: status filter expression
+    :return: StatusFilter
+    """
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _token_regex.match(expression, position)
+        if not match:
+            raise ValueError('Invalid status filter expression: {:}'.format(expression))
+        tokens.append({'and': '&', 'or': '|', 'not': '~'}.get(match.group(1).lower(), match.group(1)))
+        position = match.end()
+
+    status_filter, position = _parse_or(tokens, 0)
+    if position != len(tokens):
+        raise ValueError('Invalid status filter expression: {:}'.format(expression))
+
+    return status_filter
+
+
+class DatasetStatusIndex(object):
+
+    def __init__(self, df):
+        """Status index for a DAC data sets DataFrame (delayed_mode, completed and orphaned columns).  A status code is
+        computed once for each row and filters are resolved through the precomputed row positions for each code.
+
+        Missing (NaN) status values match neither polarity: a data set with a missing value only matches a filter
+        that it matches whatever the missing value is (i.e.: a missing completed value matches 'real_time' and 'all'
+        but neither 'active' nor 'completed')."""
+
+        self._df = df
+        self._codes = np.array([], dtype='uint8')
+        self._unknown = np.array([], dtype='uint8')
+        self._positions = [np.array([], dtype='int64') for _ in range(len(_all_codes) ** 2)]
+        self._filtered_positions = {}
+
+        self._is_valid = True
+        for col in status_columns:
+            if col not in df.columns:
+                logging.error('DataFrame is missing column {:}'.format(col))
+                self._is_valid = False
+
+        if not self._is_valid:
+            return
+
+        self._codes = (df.delayed_mode.fillna(False).values.astype('bool') * DELAYED_MODE_BIT |
+                       df.completed.fillna(False).values.astype('bool') * COMPLETED_BIT |
+                       df.orphaned.fillna(False).values.astype('bool') * ORPHANED_BIT).astype('uint8')
+        # Status bits whose value is missing
+        self._unknown = (df.delayed_mode.isnull().values * DELAYED_MODE_BIT |
+                         df.completed.isnull().values * COMPLETED_BIT |
+                         df.orphaned.isnull().values * ORPHANED_BIT).astype('uint8')
+
+        # Rows are grouped by code and missing bits.  A stable sort keeps the row positions of each group in ascending
+        # order
+        keys = self._codes | self._unknown << 3
+        order = np.argsort(keys, kind='stable')
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=len(self._positions)))))
+        self._positions = [order[bounds[k]:bounds[k + 1]] for k in range(len(self._positions))]
+
+    @property
+    def dataframe(self):
+        return self._df
+
+    @property
+    def codes(self):
+        """Series containing the status code for each data set.  Missing status values are not set"""
+        if not self._is_valid:
+            return pd.Series(dtype='uint8')
+
+        return pd.Series(self._codes, index=self._df.index, name='status_code')
+
+    def positions(self, status_filter):
+        """
+        Row positions of the data sets matching status_filter, in ascending order
+        :param status_filter: StatusFilter or status filter expression
+        :return: numpy array
+        """
+        if isinstance(status_filter, str):
+            status_filter = compile_status_filter(status_filter)
+
+        if status_filter.codes not in self._filtered_positions:
+            # A group matches if the filter matches every possible value of its missing bits
+            keys = [k for k in range(len(self._positions))
+                    if all([(k & 7 | m) in status_filter.codes for m in _all_codes if m & (k >> 3) == m])]
+            positions = [self._positions[k] for k in keys if self._positions[k].size]
+            if positions:
+                self._filtered_positions[status_filter.codes] = np.sort(np.concatenate(positions))
+            else:
+                self._filtered_positions[status_filter.codes] = np.array([], dtype='int64')
+
+        return self._filtered_positions[status_filter.codes]
+
+    def filter(self, status_filter):
+        """
+        Return the data frame subset of data sets matching status_filter
+        :param status_filter: StatusFilter or status filter expression
+        :return: DataFrame
+        """
+        if not self._is_valid:
+            return pd.DataFrame()
+
+        return self._df.iloc[self.positions(status_filter)]
+
+    def count(self, status_filter):
+        """
+        Number of data sets matching status_filter
+        :param status_filter: StatusFilter or status filter expression
+        :return: int
+        """
+        return len(self.positions(status_filter))
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __repr__(self):
+        return '<DatasetStatusIndex(num_datasets={:})>'.format(len(self._codes))
+
 
 def filter_all_real_time(df, include_orphaned=False):
     """
     Return the data frame subset of all real-time data sets that are not orphaned.
-    :param df: DAC data sets DataFrame
+    :param df: DAC data sets DataFrame or DatasetStatusIndex
     :param include_orphaned: include (True) or exclude (False) orphaned data sets
     :return: DataFrame
     """
-    required_cols = ['delayed_mode',
-                     'completed',
-                     'orphaned']
-
-    has_required = True
-    for col in required_cols:
-        if col not in df.columns:
-            logging.error('DataFrame is missing column {:}'.format(col))
-            had_required = False
-
-    if not has_required:
-        return pd.DataFrame()
-
-    if include_orphaned:
-        return df[(df.delayed_mode == False)]
-    else:
-        return df[(df.delayed_mode == False) & (df.orphaned == False)]
+    return _filter_status(df, REAL_TIME, include_orphaned)
 
 
 def filter_all_delayed_mode(df, include_orphaned=False):
     """
     Return the data frame subset of all delayed-mode data sets that are not orphaned.
-    :param df: DAC data sets DataFrame
+    :param df: DAC data sets DataFrame or DatasetStatusIndex
     :param include_orphaned: include (True) or exclude (False) orphaned data sets
     :return: DataFrame
     """
-    required_cols = ['delayed_mode',
-                     'completed',
-                     'orphaned']
-
-    has_required = True
-    for col in required_cols:
-        if col not in df.columns:
-            logging.error('DataFrame is missing column {:}'.format(col))
-            had_required = False
-
-    if not has_required:
-        return pd.DataFrame()
-
-    if include_orphaned:
-        return df[(df.delayed_mode == True)]
-    else:
-        return df[(df.delayed_mode == True) & (df.orphaned == False)]
+    return _filter_status(df, DELAYED_MODE, include_orphaned)
 
 
 def filter_real_time_active(df, include_orphaned=False):
     """
     Return the data frame subset of real-time active data sets that are not orphaned.
-    :param df: DAC data sets DataFrame
+    :param df: DAC data sets DataFrame or DatasetStatusIndex
     :param include_orphaned: include (True) or exclude (False) orphaned data sets
     :return: DataFrame
     """
-    required_cols = ['delayed_mode',
-                     'completed',
-                     'orphaned']
-
-    has_required = True
-    for col in required_cols:
-        if col not in df.columns:
-            logging.error('DataFrame is missing column {:}'.format(col))
-            had_required = False
-
-    if not has_required:
-        return pd.DataFrame()
-
-    if include_orphaned:
-        return df[(df.delayed_mode == False) & (df.completed == False)]
-    else:
-        return df[(df.delayed_mode == False) & (df.completed == False) & (df.orphaned == False)]
+    return _filter_status(df, REAL_TIME & ACTIVE, include_orphaned)
 
 
 def filter_real_time_inactive(df, include_orphaned=False):
     """
     Return the data frame subset of real-time inactive (completed) data sets that are not orphaned.
-    :param df: DAC data sets DataFrame
+    :param df: DAC data sets DataFrame or DatasetStatusIndex
     :param include_orphaned: include (True) or exclude (False) orphaned data sets
     :return: DataFrame
     """
-    required_cols = ['delayed_mode',
-                     'completed',
-                     'orphaned']
-
-    has_required = True
-    for col in required_cols:
-        if col not in df.columns:
-            logging.error('DataFrame is missing column {:}'.format(col))
-            had_required = False
-
-    if not has_required:
-        return pd.DataFrame()
-
-    if include_orphaned:
-        return df[(df.delayed_mode == False) & (df.completed == True)]
-    else:
-        return df[(df.delayed_mode == False) & (df.completed == True) & (df.orphaned == False)]
+    return _filter_status(df, REAL_TIME & COMPLETED, include_orphaned)
 
 
 def filter_delayed_mode_active(df, include_orphaned=False):
     """
     Return the data frame subset of delayed-mode active data sets that are not orphaned.
-    :param df: DAC data sets DataFrame
+    :param df: DAC data sets DataFrame or DatasetStatusIndex
     :param include_orphaned: include (True) or exclude (False) orphaned data sets
     :return: DataFrame
     """
-    required_cols = ['delayed_mode',
-                     'completed',
-                     'orphaned']
-
-    has_required = True
-    for col in required_cols:
-        if col not in df.columns:
-            logging.error('DataFrame is missing column {:}'.format(col))
-            had_required = False
-
-    if not has_required:
-        return pd.DataFrame()
-
-    if include_orphaned:
-        return df[(df.delayed_mode == True) & (df.completed == False)]
-    else:
-        return df[(df.delayed_mode == True) & (df.completed == False) & (df.orphaned == False)]
+    return _filter_status(df, DELAYED_MODE & ACTIVE, include_orphaned)
 
 
 def filter_delayed_mode_inactive(df, include_orphaned=False):
     """
     Return the data frame subset of delayed-mode inactive (completed) data sets that are not orphaned.
-    :param df: DAC data sets DataFrame
+    :param df: DAC data sets DataFrame or DatasetStatusIndex
     :param include_orphaned: include (True) or exclude (False) orphaned data sets
     :return: DataFrame
     """
-    required_cols = ['delayed_mode',
-                     'completed',
-                     'orphaned']
-
-    has_required = True
-    for col in required_cols:
-        if col not in df.columns:
-            logging.error('DataFrame is missing column {:}'.format(col))
-            had_required = False
-
-    if not has_required:
-        return pd.DataFrame()
-
-    if include_orphaned:
-        return df[(df.delayed_mode == True) & (df.completed == True)]
-    else:
-        return df[(df.delayed_mode == True) & (df.completed == True) & (df.orphaned == False)]
+    return _filter_status(df, DELAYED_MODE & COMPLETED, include_orphaned)
+
+
+def _filter_status(df, status_filter, include_orphaned):
+
+    status_index = df
+    if not isinstance(status_index, DatasetStatusIndex):
+        status_index = DatasetStatusIndex(df)
+
+    if not include_orphaned:
+        status_filter = status_filter & ~ORPHANED
+
+    return status_index.filter(status_filter)
+
+
+def _parse_or(tokens, position):
+
+    status_filter, position = _parse_and(tokens, position)
+    while position < len(tokens) and tokens[position] == '|':
+        other, position = _parse_and(tokens, position + 1)
+        status_filter = status_filter | other
+
+    return status_filter, position
+
+
+def _parse_and(tokens, position):
+
+    status_filter, position = _parse_not(tokens, position)
+    while position < len(tokens) and tokens[position] == '&':
+        other, position = _parse_not(tokens, position + 1)
+        status_filter = status_filter & other
+
+    return status_filter, position
+
+
+def _parse_not(tokens, position):
+
+    if position < len(tokens) and tokens[position] == '~':
+        status_filter, position = _parse_not(tokens, position + 1)
+        return ~status_filter, position
+
+    if position < len(tokens) and tokens[position] == '(':
+        status_filter, position = _parse_or(tokens, position + 1)
+        if position >= len(tokens) or tokens[position] != ')':
+            raise ValueError('Unbalanced parentheses in status filter expression')
+        return status_filter, position + 1
+
+    if position >= len(tokens) or tokens[position] not in status_filters:
+        raise ValueError('Invalid status filter name: {:}'.format(tokens[position] if position < len(tokens) else ''))
+
+    return status_filters[tokens[position]], position + 1
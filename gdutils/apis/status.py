@@ -1,4 +1,3 @@
-import requests
 import logging
 import pandas as pd
 
@@ -57,6 +56,7 @@ def fetch_datasets_status_dataframe(url=None):
 
 
 def fetch_datasets_status_json(url=None):
+    import requests
 
     url = url or datasets_status_url
 
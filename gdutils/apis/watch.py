@@ -0,0 +1,283 @@
+import logging
+import os
+import time
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from gdutils.apis.dac import fetch_dac_catalog_dataframe
+from gdutils.apis.changes import diff_catalog_snapshots, load_catalog_snapshot, save_catalog_snapshot
+
+
+class DacWatcher(object):
+
+    def __init__(self, url=None, poll_interval=300, debounce=600, max_delay=3600, max_workers=4, max_in_flight=None,
+                 snapshot_path=None, process_existing=False):
+        """Poll the IOOS Glider DAC deployments API and dispatch the registered handlers to a worker pool for each data
+        set whose latest_file_mtime changes.
+
+        Parameters
+        url: alternate deployments API end point
+        poll_interval: seconds between deployments API requests
+        debounce: seconds a data set must go without further updates before its handlers are dispatched
+        max_delay: maximum seconds a continuously updating data set is held back by the debounce
+        max_workers: number of worker threads
+        max_in_flight: maximum number of queued and running handler calls. Updates beyond this limit stay pending and
+            are coalesced until workers free up. A data set is always dispatched when nothing is in flight. Defaults to
+            2 * max_workers
+        snapshot_path: file used to persist the last seen catalog between runs
+        process_existing: dispatch handlers for all data sets on the first poll if no snapshot exists
+        """
+
+        self._logger = logging.getLogger(os.path.basename(__file__))
+
+        self._url = url
+        self._poll_interval = poll_interval
+        self._debounce = debounce
+        self._max_delay = max_delay
+        self._max_workers = max_workers
+        self._max_in_flight = max_in_flight or 2 * max_workers
+        self._snapshot_path = snapshot_path
+        self._process_existing = process_existing
+
+        self._handlers = {}
+        self._snapshot = pd.DataFrame()
+        if self._snapshot_path:
+            self._snapshot = load_catalog_snapshot(self._snapshot_path)
+        # Last persisted snapshot.  Pending and in flight data sets keep their last processed row
+        self._stored_snapshot = self._snapshot
+
+        # dataset_id -> {'first_seen': epoch seconds, 'last_seen': epoch seconds, 'record': catalog row,
+        #   'deferred': True once the update has been held back by a full worker pool}
+        self._pending = {}
+        # (dataset_id, handler name) -> Future
+        self._in_flight = {}
+
+        self._stats = {'polls': 0,
+                       'updates': 0,
+                       'dispatched': 0,
+                       'completed': 0,
+                       'failed': 0,
+                       'deferred': 0}
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._executor = None
+        self._last_poll = 0.
+        # Number of ready data sets deferred by the last dispatch
+        self._backlog = 0
+
+    @property
+    def handlers(self):
+        return list(self._handlers.keys())
+
+    @property
+    def pending(self):
+        """Dataset ids with updates waiting to be dispatched"""
+        with self._lock:
+            return sorted(self._pending.keys())
+
+    @property
+    def in_flight(self):
+        """Number of queued and running handler calls"""
+        with self._lock:
+            return len(self._in_flight)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return self._stats.copy()
+
+    @property
+    def snapshot(self):
+        """Last fetched deployments catalog DataFrame"""
+        return self._snapshot
+
+    def register_handler(self, name, handler):
+        """
+        Register a handler to be called as handler(dataset_id, record) in a worker thread for each updated data set.
+        record is the data set's deployments catalog row (pandas Series).
+        :param name: unique handler name
+        :param handler: callable
+        """
+        if not callable(handler):
+            raise ValueError('Handler {:} is not callable'.format(name))
+
+        self._handlers[name] = handler
+
+    def unregister_handler(self, name):
+
+        self._handlers.pop(name, None)
+
+    def poll(self):
+        """
+        Fetch the deployments catalog and queue the data sets whose latest_file_mtime has changed since the last poll
+        :return: list of updated dataset ids
+        """
+        catalog = fetch_dac_catalog_dataframe(url=self._url, ttl=0)
+        self._last_poll = time.time()
+        if catalog.empty:
+            self._logger.warning('No deployments returned from the DAC catalog')
+            return []
+
+        with self._lock:
+            self._stats['polls'] += 1
+
+        if self._snapshot.empty and not self._process_existing:
+            self._logger.info('Initial catalog snapshot: {:} data sets'.format(catalog.shape[0]))
+            self._store_snapshot(catalog)
+            return []
+
+        old = self._snapshot if not self._snapshot.empty else catalog.iloc[0:0]
+        changes = diff_catalog_snapshots(old, catalog, key_columns=['latest_file_mtime'])
+
+        updated = changes.changed_dataset_ids
+        now = time.time()
+        with self._lock:
+            for dataset_id in updated:
+                pending = self._pending.setdefault(dataset_id, {'first_seen': now})
+                pending['last_seen'] = now
+                pending['record'] = catalog.loc[dataset_id]
+            self._stats['updates'] += len(updated)
+
+        self._store_snapshot(catalog)
+
+        if updated:
+            self._logger.info('{:} updated data sets: {:}'.format(len(updated), changes))
+
+        return updated
+
+    def dispatch(self):
+        """
+        Submit the handlers for each pending data set that has been quiet for at least debounce seconds (or pending
+        for max_delay seconds) to the worker pool
+        :return: list of dispatched dataset ids
+        """
+        if not self._handlers:
+            return []
+
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+
+        now = time.time()
+        dispatched = []
+        backlog = 0
+        with self._lock:
+            ready = sorted([dataset_id for dataset_id, pending in self._pending.items()
+                            if now - pending['last_seen'] >= self._debounce
+                            or now - pending['first_seen'] >= self._max_delay],
+                           key=lambda x: self._pending[x]['first_seen'])
+
+            # Data sets whose previous run has not finished wait for it.  Their updates stay pending.
+            ready = [dataset_id for dataset_id in ready
+                     if not any([(dataset_id, name) in self._in_flight for name in self._handlers])]
+
+            for i, dataset_id in enumerate(ready):
+
+                # A data set is always dispatched to an idle pool, even if it has more handlers than max_in_flight
+                if self._in_flight and len(self._in_flight) + len(self._handlers) > self._max_in_flight:
+                    # Each pending update is counted as deferred once, however many ticks it waits
+                    for deferred_id in ready[i:]:
+                        if not self._pending[deferred_id].get('deferred'):
+                            self._pending[deferred_id]['deferred'] = True
+                            self._stats['deferred'] += 1
+                    if len(ready) - i != self._backlog:
+                        self._logger.debug('Worker pool full: deferring {:} data sets'.format(len(ready) - i))
+                    backlog = len(ready) - i
+                    break
+
+                pending = self._pending.pop(dataset_id)
+                for name, handler in self._handlers.items():
+                    future = self._executor.submit(self._run_handler, name, handler, dataset_id, pending['record'])
+                    self._in_flight[(dataset_id, name)] = future
+                    self._stats['dispatched'] += 1
+
+                dispatched.append(dataset_id)
+
+            self._backlog = backlog
+
+        return dispatched
+
+    def run(self, max_polls=None):
+        """
+        Poll the deployments API every poll_interval seconds and dispatch handlers until stop is called
+        :param max_polls: stop after this many polls
+        """
+        self._stop_event.clear()
+        tick = max(1., min(self._poll_interval, self._debounce or self._poll_interval) / 10.)
+        polls = 0
+
+        self._logger.info('Watching {:} (handlers={:}, poll_interval={:}s, debounce={:}s)'.format(
+            self._url or 'DAC deployments API', ', '.join(self._handlers), self._poll_interval, self._debounce))
+
+        while not self._stop_event.is_set():
+
+            if time.time() - self._last_poll >= self._poll_interval:
+                if max_polls is not None and polls >= max_polls:
+                    break
+                try:
+                    self.poll()
+                except Exception as e:
+                    self._logger.error('Catalog poll failed: {:}'.format(e))
+                    self._last_poll = time.time()
+                polls += 1
+
+            self.dispatch()
+
+            self._stop_event.wait(tick)
+
+        self.shutdown()
+
+    def stop(self):
+        """Stop the run loop after the current iteration"""
+        self._stop_event.set()
+
+    def shutdown(self, wait=True):
+
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _run_handler(self, name, handler, dataset_id, record):
+
+        t0 = time.time()
+        try:
+            handler(dataset_id, record)
+        except Exception as e:
+            self._logger.error('Handler {:} failed for {:}: {:}'.format(name, dataset_id, e))
+            with self._lock:
+                self._stats['failed'] += 1
+        else:
+            self._logger.info('Handler {:} completed for {:} in {:0.1f} seconds'.format(name, dataset_id,
+                                                                                         time.time() - t0))
+            with self._lock:
+                self._stats['completed'] += 1
+        finally:
+            with self._lock:
+                self._in_flight.pop((dataset_id, name), None)
+
+    def _store_snapshot(self, catalog):
+        """Keep catalog as the snapshot the next poll is compared to and persist it to snapshot_path.  Data sets whose
+        handlers have not finished are persisted with their last processed row, or left out if they have never been
+        processed, so they are picked up again if the watcher is restarted before they complete."""
+
+        self._snapshot = catalog
+        if not self._snapshot_path:
+            return
+
+        with self._lock:
+            unprocessed = set(self._pending.keys()).union([dataset_id for dataset_id, name in self._in_flight])
+
+        unprocessed = catalog.index.intersection(list(unprocessed))
+        if unprocessed.empty:
+            stored = catalog
+        else:
+            processed = self._stored_snapshot.index.intersection(unprocessed)
+            stored = pd.concat([catalog.drop(index=unprocessed), self._stored_snapshot.loc[processed]])
+
+        save_catalog_snapshot(stored, self._snapshot_path)
+        self._stored_snapshot = stored
+
+    def __repr__(self):
+        return '<DacWatcher(handlers={:}, pending={:}, in_flight={:})>'.format(len(self._handlers),
+                                                                              len(self._pending),
+                                                                              len(self._in_flight))
@@ -0,0 +1,254 @@
+"""Build the fleet catalog: a {status}.json summary of all data sets plus a datasets/{dataset_id} directory containing
+daily_track.json and deployment.json for each data set.  Each data set directory also contains a hash of the inputs
+used to create it, so that only the directories of data sets that changed since the last build are rewritten."""
+import logging
+import os
+import json
+import hashlib
+import pandas as pd
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from gdutils.geojson import latlon_to_geojson_track
+
+logging.getLogger(__file__)
+
+# GdacClient.datasets columns not written to the catalog
+catalog_drop_columns = ['estimated_deploy_date',
+                        'estimated_deploy_location',
+                        'glider_name',
+                        'deployment_dir',
+                        'title']
+
+# Coordinate columns rounded to catalog_decimals decimal places
+catalog_coordinate_columns = ['lat_min',
+                              'lat_max',
+                              'lon_min',
+                              'lon_max',
+                              'deployment_lat',
+                              'deployment_lon']
+
+catalog_decimals = 3
+
+# Name of the file, in each data set directory, containing the hash of the inputs
+inputs_hash_file = '.inputs.sha1'
+
+
+def round_coordinates(datasets, columns=None, decimals=catalog_decimals):
+    """
+    Round the coordinate columns of datasets to decimals decimal places
+
+    :param datasets: GdacClient.datasets DataFrame
+    :param columns: list of columns to round.  Defaults to gdutils.catalog.catalog_coordinate_columns
+    :param decimals: number of decimal places
+    :return: copy of datasets with the rounded columns
+    """
+    columns = [c for c in (columns or catalog_coordinate_columns) if c in datasets.columns]
+
+    datasets = datasets.copy()
+    datasets[columns] = datasets[columns].astype('float').round(decimals)
+
+    return datasets
+
+
+def group_daily_positions(daily_positions):
+    """
+    Split GdacClient.daily_profile_positions into one DataFrame per data set with a single groupby
+
+    :param daily_positions: GdacClient.daily_profile_positions DataFrame
+    :return: dictionary mapping dataset_id to the data set's daily averaged profile positions
+    """
+    if daily_positions.empty:
+        return {}
+
+    return {dataset_id: positions for dataset_id, positions in daily_positions.groupby('dataset_id', sort=False)}
+
+
+def build_catalog_records(datasets, deployments, drop_columns=None):
+    """
+    Merge each data set with its DAC registered deployment.  The DAC deployments are indexed by name so each data set
+    is joined in constant time.
+
+    :param datasets: GdacClient.datasets DataFrame
+    :param deployments: list of DAC registered deployments returned by gdutils.apis.dac.fetch_dac_catalog_json
+    :param drop_columns: columns removed from the records.  Defaults to gdutils.catalog.catalog_drop_columns
+    :return: dictionary mapping dataset_id to the merged deployment record, ordered as datasets
+    """
+    drop_columns = catalog_drop_columns if drop_columns is None else drop_columns
+
+    deployments = {d['name']: d for d in deployments if 'name' in d}
+
+    datasets = round_coordinates(datasets).astype('object')
+    datasets = datasets.where(datasets.notnull(), False)
+
+    records = {}
+    for dataset_id, dataset in zip(datasets.index, datasets.to_dict(orient='records')):
+
+        deployment = deployments.get(dataset_id)
+        if deployment is None:
+            logging.warning('Deployment not registered at the DAC: {:}'.format(dataset_id))
+            continue
+
+        # Copy the deployment so that cached catalog records are not modified
+        record = dict(deployment)
+        record.update(dataset)
+
+        # Chop off the end of the summary
+        if isinstance(record.get('summary'), str):
+            record['summary'] = record['summary'][0:record['summary'].find('\\n\\ncdm_data_type') - 1]
+
+        for col in drop_columns:
+            record.pop(col, None)
+
+        records[dataset_id] = record
+
+    return records
+
+
+def inputs_hash(record, positions):
+    """
+    Hash of the inputs used to create a data set catalog directory
+
+    :param record: merged deployment record
+    :param positions: the data set's daily averaged profile positions
+    :return: hex digest
+    """
+    h = hashlib.sha1(json.dumps(record, default=str, sort_keys=True).encode())
+    h.update(pd.to_datetime(positions.date).values.astype('datetime64[s]').tobytes())
+    h.update(positions[['latitude', 'longitude']].to_numpy(dtype='float64').tobytes())
+
+    return h.hexdigest()
+
+
+def write_dataset_catalog(dataset_path, dataset_id, record, positions, force=False):
+    """
+    Write daily_track.json and deployment.json for a single data set to dataset_path.  Nothing is written if the
+    inputs have not changed since dataset_path was last written, unless force is True.
+
+    :param dataset_path: data set catalog directory
+    :param dataset_id: data set id
+    :param record: merged deployment record
+    :param positions: the data set's daily averaged profile positions
+    :param force: write the files even if the inputs have not changed
+    :return: 'written', 'unchanged' or 'failed'
+    """
+    digest = inputs_hash(record, positions)
+    hash_path = os.path.join(dataset_path, inputs_hash_file)
+
+    if not force and _read_text(hash_path) == digest:
+        logging.debug('Dataset catalog is up to date: {:}'.format(dataset_path))
+        return 'unchanged'
+
+    try:
+        os.makedirs(dataset_path, exist_ok=True)
+    except OSError as e:
+        logging.error('Error creating {:}: {:}'.format(dataset_path, e))
+        return 'failed'
+
+    # Create the daily averaged GPS position track
+    track = latlon_to_geojson_track(positions.latitude, positions.longitude, positions.date)
+    track['properties'] = {'datasetd_id': dataset_id}
+
+    outputs = [('daily_track.json', json.dumps(track)),
+               ('deployment.json', json.dumps(record, default=str, sort_keys=True)),
+               (inputs_hash_file, digest)]
+
+    # The hash is written last so that a failed write is retried on the next build
+    for file_name, content in outputs:
+        if not _write_text(os.path.join(dataset_path, file_name), content):
+            return 'failed'
+
+    return 'written'
+
+
+def write_catalog(datasets, daily_positions, deployments, output_dir, status='active', max_workers=None,
+                  force=False):
+    """
+    Build the catalog in output_dir: {status}.json, {status}.csv and a datasets/{dataset_id} directory for each data
+    set.  Data set directories are written by a pool of max_workers threads and only if their inputs changed.
+
+    :param datasets: GdacClient.datasets DataFrame
+    :param daily_positions: GdacClient.daily_profile_positions DataFrame
+    :param deployments: list of DAC registered deployments returned by gdutils.apis.dac.fetch_dac_catalog_json
+    :param output_dir: catalog root directory
+    :param status: catalog name (i.e.: active, completed or all)
+    :param max_workers: number of threads writing data set directories
+    :param force: rewrite all data set directories
+    :return: list of catalog records written to {status}.json or None if the catalog could not be written
+    """
+    datasets_path = os.path.join(output_dir, 'datasets')
+    try:
+        os.makedirs(datasets_path, exist_ok=True)
+    except OSError as e:
+        logging.error('Error creating {:}: {:}'.format(datasets_path, e))
+        return
+
+    # Write the search results as a csv file
+    csv_status_path = os.path.join(output_dir, '{:}.csv'.format(status))
+    logging.info('Writing search results to {:}'.format(csv_status_path))
+    datasets.to_csv(csv_status_path)
+
+    records = build_catalog_records(datasets, deployments)
+    positions = group_daily_positions(daily_positions)
+
+    jobs = []
+    for dataset_id, record in records.items():
+        if dataset_id not in positions:
+            logging.warning('Dataset contains no profile GPS positions: {:}'.format(dataset_id))
+            continue
+        jobs.append(dataset_id)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(lambda dataset_id: write_dataset_catalog(os.path.join(datasets_path, dataset_id),
+                                                                             dataset_id,
+                                                                             records[dataset_id],
+                                                                             positions[dataset_id],
+                                                                             force=force), jobs))
+
+    catalog = []
+    for dataset_id, result in zip(jobs, results):
+        if result == 'failed':
+            continue
+
+        # The summary is only written to deployment.json
+        record = dict(records[dataset_id])
+        record.pop('summary', None)
+        catalog.append(record)
+
+    logging.info('Data set directories written: {:}, unchanged: {:}, failed: {:}'.format(results.count('written'),
+                                                                                        results.count('unchanged'),
+                                                                                        results.count('failed')))
+
+    status_path = os.path.join(output_dir, '{:}.json'.format(status))
+    catalog = sorted(catalog, key=itemgetter('end_date'), reverse=True)
+    if not _write_text(status_path, json.dumps(catalog, default=str, sort_keys=True)):
+        return
+
+    return catalog
+
+
+def _read_text(path):
+
+    if not os.path.isfile(path):
+        return
+
+    try:
+        with open(path, 'r') as fid:
+            return fid.read().strip()
+    except IOError:
+        return
+
+
+def _write_text(path, content):
+
+    tmp_path = '{:}.{:}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'w') as fid:
+            fid.write(content)
+        os.replace(tmp_path, path)
+    except (IOError, OSError) as e:
+        logging.error('Error writing {:}: {:}'.format(path, e))
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    return True
@@ -0,0 +1,486 @@
+"""gdutils command line interface.  Each subcommand accepts many dataset ids, or reads them from stdin, and shares a
+single GdacClient, DAC catalog and HTTP connection pool across all of them.
+
+    python -m gdutils track ru29-20200908T1623 ru30-20210503T1929
+    cat dataset_ids.txt | python -m gdutils map -d /tmp/maps -
+    python -m gdutils serve --port 8080
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+logging.getLogger(__file__)
+
+img_types = ['largePng', 'png', 'smallPng', 'largePdf', 'pdf', 'smallPdf', 'transparentPng']
+
+
+def read_dataset_ids(dataset_ids, stdin=None):
+    """
+    Dataset ids from the command line.  If no dataset ids are specified or dataset_ids is ['-'], whitespace separated
+    dataset ids are read from stdin.  Lines beginning with # are ignored.  Duplicates are removed, preserving order.
+
+    :param dataset_ids: list of command line dataset ids
+    :param stdin: file object to read from.  Defaults to sys.stdin
+    :return: list of dataset ids
+    """
+    stdin = stdin or sys.stdin
+
+    if not dataset_ids or dataset_ids == ['-']:
+        if stdin.isatty():
+            return []
+        dataset_ids = [d for line in stdin for d in line.split('#')[0].split()]
+
+    return list(dict.fromkeys(dataset_ids))
+
+
+def map_datasets(func, dataset_ids, max_workers=8):
+    """
+    Call func(dataset_id) for each dataset id in a pool of max_workers threads.  Failures are logged and reported as
+    None.
+
+    :param func: function taking a dataset id
+    :param dataset_ids: list of dataset ids
+    :param max_workers: number of threads
+    :return: list of results, in the same order as dataset_ids
+    """
+    def call(dataset_id):
+        try:
+            return func(dataset_id)
+        except (ValueError, KeyError, IOError, OSError) as e:
+            logging.error('{:}: {:}'.format(dataset_id, e))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(call, dataset_ids))
+
+
+def track(args, client, dataset_ids):
+    """Write the GeoJSON track of each dataset, one per line, or to DIRECTORY/{dataset_id}_track.json"""
+
+    def fetch_track(dataset_id):
+
+        if args.daily:
+            profiles_track = client.get_dataset_track(dataset_id)
+            if not profiles_track:
+                return
+            dataset_track = profiles_track.daily().to_geojson(include_points=True)
+        else:
+            dataset_track = client.get_dataset_track_geojson(dataset_id)
+
+        if not dataset_track:
+            return
+
+        if args.metadata:
+            properties = client.erddap_datasets.loc[dataset_id].to_dict()
+            properties['dataset_id'] = dataset_id
+            dataset_track['features'][0]['properties'] = properties
+
+        return dataset_track
+
+    status = 0
+    for dataset_id, dataset_track in zip(dataset_ids, map_datasets(fetch_track, dataset_ids, args.workers)):
+        if not dataset_track:
+            logging.warning('No track found for {:}'.format(dataset_id))
+            status = 1
+            continue
+
+        if args.directory:
+            json_path = os.path.join(args.directory, '{:}_track.json'.format(dataset_id))
+            with open(json_path, 'w') as fid:
+                json.dump(dataset_track, fid, default=str)
+            sys.stdout.write('{:}\n'.format(json_path))
+        else:
+            sys.stdout.write('{:}\n'.format(json.dumps(dataset_track, default=str)))
+
+    return status
+
+
+def profiles(args, client, dataset_ids):
+    """Write the profile times, positions and profile ids of all datasets as a single csv or json table"""
+
+    results = map_datasets(client.get_dataset_profiles, dataset_ids, args.workers)
+
+    tables = []
+    status = 0
+    for dataset_id, dataset_profiles in zip(dataset_ids, results):
+        if dataset_profiles is None or dataset_profiles.empty:
+            logging.warning('No profiles found for {:}'.format(dataset_id))
+            status = 1
+            continue
+        dataset_profiles = dataset_profiles.copy()
+        dataset_profiles['dataset_id'] = dataset_id
+        tables.append(dataset_profiles)
+
+    if not tables:
+        return 1
+
+    all_profiles = pd.concat(tables)
+    if args.format == 'json':
+        sys.stdout.write('{:}\n'.format(all_profiles.reset_index().to_json(orient='records')))
+    else:
+        sys.stdout.write(all_profiles.to_csv())
+
+    return status
+
+
+def dataset(args, client, dataset_ids):
+    """Write the DAC catalog record of each dataset, updated with the ERDDAP Advanced Search results"""
+    from gdutils.apis.dac import fetch_dac_catalog_json
+
+    deployments = {d['name']: d for d in fetch_dac_catalog_json() or []}
+    if not deployments:
+        return 1
+
+    # One search, and one harvest of the profiles, for all of the datasets
+    client.search_datasets(dataset_ids=dataset_ids, include_delayed_mode=True)
+    if client.datasets.empty:
+        logging.warning('No dataset(s) found.')
+        return 1
+
+    drop_columns = ['estimated_deploy_date',
+                    'estimated_deploy_location',
+                    'glider_name',
+                    'deployment_dir',
+                    'title']
+
+    status = 0
+    for dataset_id in dataset_ids:
+        if dataset_id not in client.datasets.index:
+            logging.warning('Dataset not found: {:}'.format(dataset_id))
+            status = 1
+
+    catalog = []
+    for dataset_id, ds in client.datasets.iterrows():
+        if dataset_id not in deployments:
+            logging.warning('Deployment not registered at the DAC: {:}'.format(dataset_id))
+            status = 1
+            continue
+
+        deployment = deployments[dataset_id]
+        deployment.update(ds.fillna(False).to_dict())
+
+        # Chop off the end of the summary
+        summary = deployment.get('summary')
+        end = summary.find('\\n\\ncdm_data_type') if isinstance(summary, str) else -1
+        if end > 0:
+            deployment['summary'] = summary[0:end - 1]
+
+        for col in drop_columns:
+            deployment.pop(col, None)
+        if args.exclude_summaries:
+            deployment.pop('summary', None)
+
+        catalog.append(deployment)
+
+    if not catalog:
+        logging.warning('No dataset(s) found.')
+        return 1
+
+    datasets = pd.DataFrame(catalog).set_index('name')
+    if args.format == 'json':
+        sys.stdout.write('{:}\n'.format(datasets.to_json(orient='records')))
+    else:
+        sys.stdout.write(datasets.to_csv())
+
+    return status
+
+
+def track_map(args, client, dataset_ids):
+    """Download a map of the profile positions of each dataset"""
+
+    plotter = _create_plotter(args, client)
+    plotter.set_y_range(ascending=False)
+    if args.zoom:
+        plotter.set_zoom(args.zoom)
+
+    ext = args.img_type[-3:].lower()
+
+    image_requests = []
+    for dataset_id in dataset_ids:
+        if args.color:
+            url = plotter.build_image_request(dataset_id, 'longitude', 'latitude')
+        else:
+            url = plotter.build_image_request(dataset_id, 'longitude', 'latitude', 'time')
+        if not url:
+            continue
+        image_requests.append((url, os.path.join(args.directory, '{:}_track_map_{:}.{:}'.format(dataset_id,
+                                                                                                 args.img_type,
+                                                                                                 ext))))
+
+    return _download(args, plotter, image_requests, len(dataset_ids))
+
+
+def variable(args, client, dataset_ids):
+    """Download time-series or profile plots of the specified variables for each dataset"""
+
+    plotter = _create_plotter(args, client)
+    plotter.set_y_range(min_val=0)
+
+    if not args.plot_all:
+        if not args.start_date and not args.end_date:
+            plotter.add_constraint('time>=', 'max(time)-{:}hours'.format(args.hours))
+        else:
+            if args.start_date:
+                plotter.add_constraint('time>=', args.start_date)
+            if args.end_date:
+                plotter.add_constraint('time<=', args.end_date)
+
+    ext = args.img_type[-3:].lower()
+
+    image_requests = []
+    for dataset_id in dataset_ids:
+        for dataset_variable in args.variables:
+            if args.profiles:
+                if args.color:
+                    url = plotter.build_image_request(dataset_id, dataset_variable, 'depth')
+                else:
+                    url = plotter.build_image_request(dataset_id, dataset_variable, 'depth', 'time')
+                image_name = '{:}_{:}_profiles_{:}.{:}'.format(dataset_id, dataset_variable, args.img_type, ext)
+            else:
+                url = plotter.build_image_request(dataset_id, 'time', 'depth', dataset_variable)
+                image_name = '{:}_{:}_ts_{:}.{:}'.format(dataset_id, dataset_variable, args.img_type, ext)
+            if not url:
+                break
+            image_requests.append((url, os.path.join(args.directory, image_name)))
+
+    return _download(args, plotter, image_requests, len(dataset_ids) * len(args.variables))
+
+
+def serve(args):
+    """Serve data set records, tracks and calendars as JSON from a warm GdacClient refreshed in the background"""
+    from gdutils.server import GdacService, create_server
+
+    service = GdacService(hours=args.hours, include_delayed_mode=args.delayed, refresh_interval=args.refresh)
+    service.start(wait=not args.no_wait)
+
+    server = create_server(service, host=args.host, port=args.port)
+    logging.info('Serving on http://{:}:{:}'.format(*server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info('Shutting down')
+    finally:
+        server.server_close()
+        service.stop()
+
+    return 0
+
+
+def _create_plotter(args, client):
+
+    from gdutils.plot.plotter import ErddapPlotter
+
+    plotter = ErddapPlotter(client.server, response=args.img_type, client=client)
+    plotter.set_colorbar(colorbar=args.colorbar)
+    if args.color:
+        plotter.set_marker_color(args.color)
+    if args.no_legend:
+        plotter.set_legend_loc('Off')
+        plotter.set_trim_pixels()
+
+    return plotter
+
+
+def _download(args, plotter, image_requests, num_expected):
+
+    if args.debug:
+        for url, image_path in image_requests:
+            logging.info('Image request: {:}'.format(url))
+        return 0
+
+    results = plotter.download_images(image_requests, max_workers=args.workers, max_per_server=args.max_per_server)
+    for result in results:
+        if result['success']:
+            sys.stdout.write('{:}\n'.format(result['path']))
+        else:
+            logging.error('Failed to download {:}: {:}'.format(result['path'], result['reason']))
+
+    return 0 if len([r for r in results if r['success']]) == num_expected else 1
+
+
+def _add_image_arguments(arg_parser):
+
+    arg_parser.add_argument('-d', '--directory',
+                            help='Directory to write the images',
+                            default=os.path.realpath(os.curdir))
+
+    arg_parser.add_argument('-f', '--format',
+                            help='Image type',
+                            dest='img_type',
+                            choices=img_types,
+                            default='largePng')
+
+    arg_parser.add_argument('-c', '--color',
+                            help='Plot the positions using the specified color instead of color coding by timestamp',
+                            type=str)
+
+    arg_parser.add_argument('--colorbar',
+                            help='Any valid ERDDAP plotting colorbar',
+                            type=str,
+                            default='Rainbow2')
+
+    arg_parser.add_argument('--no-legend',
+                            action='store_true',
+                            dest='no_legend',
+                            help='Do not include a legend')
+
+    arg_parser.add_argument('--max_per_server',
+                            help='Maximum number of concurrent requests sent to the ERDDAP server',
+                            type=int,
+                            default=4)
+
+    arg_parser.add_argument('-x', '--debug',
+                            help='Log the image requests but do not download any imagery',
+                            action='store_true')
+
+
+def build_arg_parser():
+
+    arg_parser = argparse.ArgumentParser(prog='gdutils',
+                                         description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='Number of datasets processed concurrently',
+                            type=int,
+                            default=8)
+
+    arg_parser.add_argument('-l', '--loglevel',
+                            help='Verbosity level',
+                            type=str,
+                            choices=['debug', 'info', 'warning', 'error', 'critical'],
+                            default='info')
+
+    subparsers = arg_parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    commands = [('track', track), ('profiles', profiles), ('dataset', dataset), ('map', track_map),
+                ('variable', variable)]
+    command_parsers = {}
+    for name, func in commands:
+        command_parser = subparsers.add_parser(name, help=func.__doc__, description=func.__doc__,
+                                               formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+        command_parser.set_defaults(func=func)
+        command_parser.add_argument('dataset_ids',
+                                    help='ERDDAP dataset ids.  Read from stdin if not specified or -',
+                                    nargs='*')
+        command_parsers[name] = command_parser
+
+    command_parsers['track'].add_argument('--daily',
+                                          help='Report one GPS fix per day, averaged from all fixes on that day',
+                                          action='store_true')
+    command_parsers['track'].add_argument('-m', '--metadata',
+                                          help='Include the ERDDAP Advanced Search data set record',
+                                          action='store_true')
+    command_parsers['track'].add_argument('-d', '--directory',
+                                          help='Write each track to DIRECTORY/{dataset_id}_track.json')
+
+    command_parsers['profiles'].add_argument('-f', '--format',
+                                             help='Response format',
+                                             choices=['json', 'csv'],
+                                             default='csv')
+
+    command_parsers['dataset'].add_argument('-f', '--format',
+                                            help='Response format',
+                                            choices=['json', 'csv'],
+                                            default='json')
+    command_parsers['dataset'].add_argument('--exclude_summaries',
+                                            action='store_true',
+                                            help='Exclude the summary global attribute')
+
+    serve_parser = subparsers.add_parser('serve', help=serve.__doc__, description=serve.__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    serve_parser.set_defaults(func=serve, dataset_ids=None)
+    serve_parser.add_argument('--host',
+                              help='Interface to listen on',
+                              default='127.0.0.1')
+    serve_parser.add_argument('-p', '--port',
+                              help='Port to listen on',
+                              type=int,
+                              default=8080)
+    serve_parser.add_argument('-r', '--refresh',
+                              help='Snapshot refresh interval in seconds',
+                              type=float,
+                              default=3600)
+    serve_parser.add_argument('--hours',
+                              help='Only include data sets with data within the last HOURS hours',
+                              type=float)
+    serve_parser.add_argument('-d', '--delayed',
+                              help='Include delayed mode data sets',
+                              action='store_true')
+    serve_parser.add_argument('--no_wait',
+                              help='Start serving before the first snapshot is built',
+                              action='store_true')
+
+    _add_image_arguments(command_parsers['map'])
+    command_parsers['map'].add_argument('--zoom',
+                                        help='Map zoom level',
+                                        choices=['in', 'in2', 'in8', 'out', 'out2', 'out8'])
+
+    _add_image_arguments(command_parsers['variable'])
+    command_parsers['variable'].add_argument('-v', '--variables',
+                                             help='Dataset variables to plot',
+                                             nargs='+',
+                                             required=True)
+    command_parsers['variable'].add_argument('-p', '--profiles',
+                                             help='Plot profiles',
+                                             action='store_true')
+    command_parsers['variable'].add_argument('-a', '--all',
+                                             dest='plot_all',
+                                             help='Plot the entire time series',
+                                             action='store_true')
+    command_parsers['variable'].add_argument('--hours',
+                                             help='Plot the last hours of the time series',
+                                             type=float,
+                                             default=24)
+    command_parsers['variable'].add_argument('--start_date',
+                                             help='Plot data >= the specified date')
+    command_parsers['variable'].add_argument('--end_date',
+                                             help='Plot data <= the specified date')
+
+    return arg_parser
+
+
+def main(argv=None):
+    """gdutils command line entry point"""
+
+    args = build_arg_parser().parse_args(argv)
+
+    log_level = getattr(logging, args.loglevel.upper())
+    log_format = '%(asctime)s:%(module)s:%(levelname)s:%(message)s [line %(lineno)d]'
+    logging.basicConfig(format=log_format, level=log_level)
+
+    if args.func is serve:
+        return serve(args)
+
+    dataset_ids = read_dataset_ids(args.dataset_ids)
+    if not dataset_ids:
+        logging.error('No dataset ids specified')
+        return 1
+
+    directory = getattr(args, 'directory', None)
+    if directory and not os.path.isdir(directory):
+        logging.error('Invalid directory specified: {:}'.format(directory))
+        return 1
+
+    from gdutils import GdacClient
+
+    # One client, and one catalog of the ERDDAP datasets, for all datasets
+    client = GdacClient()
+
+    valid_dataset_ids = []
+    for dataset_id in dataset_ids:
+        if not client.check_dataset_exists(dataset_id):
+            logging.warning('Dataset not found on {:}: {:}'.format(client.server, dataset_id))
+            continue
+        valid_dataset_ids.append(dataset_id)
+
+    if not valid_dataset_ids:
+        return 1
+
+    status = args.func(args, client, valid_dataset_ids)
+
+    return status or int(len(valid_dataset_ids) != len(dataset_ids))
@@ -0,0 +1,178 @@
+"""Space-time collocation of profiles and observations (i.e.: glider profiles from different data sets, or glider
+profiles and OSMC GTS observations from gdutils.osmc.DuoProfilesClient).  Observations are binned by time, with bins
+max_hours wide, and a KD-tree of the unit sphere positions is built for each bin.  Each bin tree is queried, in one
+vectorized call, with the observations from the same and adjacent bins, so the cost grows with the number of
+observations rather than the product of the two tables."""
+import logging
+import numpy as np
+import pandas as pd
+from gdutils.spatial import lonlat_to_xyz, km_to_chord, chord_to_km
+
+logging.getLogger(__file__)
+
+collocation_columns = ['left_index',
+                       'right_index',
+                       'distance_km',
+                       'time_diff_hours']
+
+
+def collocate(left, right=None, max_distance_km=10., max_hours=6., time_column='time', group_column=None):
+    """
+    Find all pairs of observations within max_distance_km (great circle) and max_hours of each other.
+
+    If right is not specified, left is collocated with itself and each pair is returned once.  If group_column is
+    specified (i.e.: dataset_id), pairs with the same group_column value are excluded, so that a glider is not
+    collocated with itself.
+
+    :param left: DataFrame containing latitude, longitude and time_column columns.  A DatetimeIndex is used if there is
+        no time_column column
+    :param right: DataFrame containing latitude, longitude and time_column columns
+    :param max_distance_km: maximum distance between collocated observations
+    :param max_hours: maximum time difference between collocated observations
+    :param time_column: name of the time column
+    :param group_column: pairs with the same value in this column are excluded
+    :return: DataFrame containing the left_index and right_index row positions, the distance_km and the
+        time_diff_hours (right - left) of each pair
+    """
+    if max_distance_km <= 0 or max_hours <= 0:
+        raise ValueError('max_distance_km and max_hours must be greater than 0')
+
+    self_collocation = right is None
+    right = left if self_collocation else right
+
+    left_rows, left_times, left_xyz = _observations(left, time_column)
+    right_rows, right_times, right_xyz = _observations(right, time_column)
+    if not left_rows.size or not right_rows.size:
+        return pd.DataFrame(columns=collocation_columns)
+
+    bin_seconds = int(max_hours * 3600)
+    chord = float(km_to_chord(max_distance_km))
+
+    left_bins = left_times // bin_seconds
+    left_order = np.argsort(left_bins, kind='stable')
+    sorted_left_bins = left_bins[left_order]
+
+    right_bins = right_times // bin_seconds
+    right_order = np.argsort(right_bins, kind='stable')
+    sorted_right_bins = right_bins[right_order]
+    bins, bin_starts = np.unique(sorted_right_bins, return_index=True)
+    bin_ends = np.append(bin_starts[1:], sorted_right_bins.size)
+
+    pairs = []
+    for b, i0, i1 in zip(bins, bin_starts, bin_ends):
+
+        # Left observations in the same and adjacent time bins
+        j0 = np.searchsorted(sorted_left_bins, b - 1, side='left')
+        j1 = np.searchsorted(sorted_left_bins, b + 1, side='right')
+        if j0 == j1:
+            continue
+
+        right_positions = right_order[i0:i1]
+        left_positions = left_order[j0:j1]
+
+        query_rows, tree_rows, chords = _radius_query(right_xyz[right_positions], left_xyz[left_positions], chord)
+        if not query_rows.size:
+            continue
+
+        lp = left_positions[query_rows]
+        rp = right_positions[tree_rows]
+        dt = right_times[rp] - left_times[lp]
+
+        keep = np.abs(dt) <= max_hours * 3600
+        pairs.append((lp[keep], rp[keep], chords[keep], dt[keep]))
+
+    if not pairs:
+        return pd.DataFrame(columns=collocation_columns)
+
+    lp, rp, chords, dt = [np.concatenate(p) for p in zip(*pairs)]
+
+    matches = pd.DataFrame({'left_index': left_rows[lp],
+                            'right_index': right_rows[rp],
+                            'distance_km': chord_to_km(chords),
+                            'time_diff_hours': dt / 3600.})
+
+    if self_collocation:
+        matches = matches[matches.left_index < matches.right_index]
+
+    if group_column:
+        left_groups = left[group_column].to_numpy()[matches.left_index.to_numpy()]
+        right_groups = right[group_column].to_numpy()[matches.right_index.to_numpy()]
+        matches = matches[left_groups != right_groups]
+
+    return matches.sort_values(['left_index', 'distance_km']).reset_index(drop=True)
+
+
+def join_collocations(left, matches, right=None, suffixes=('_left', '_right')):
+    """
+    Join the collocated rows of left and right side by side
+
+    :param left: left DataFrame passed to collocate
+    :param matches: DataFrame returned by collocate
+    :param right: right DataFrame passed to collocate.  Defaults to left
+    :param suffixes: suffixes appended to the left and right column names
+    :return: DataFrame containing the left columns, the right columns, distance_km and time_diff_hours
+    """
+    right = left if right is None else right
+
+    left_rows = left.reset_index().iloc[matches.left_index.to_numpy()].add_suffix(suffixes[0])
+    right_rows = right.reset_index().iloc[matches.right_index.to_numpy()].add_suffix(suffixes[1])
+
+    joined = pd.concat([left_rows.reset_index(drop=True), right_rows.reset_index(drop=True)], axis=1)
+    joined['distance_km'] = matches.distance_km.to_numpy()
+    joined['time_diff_hours'] = matches.time_diff_hours.to_numpy()
+
+    return joined
+
+
+def _observations(df, time_column):
+    """Row positions, epoch seconds and unit sphere positions of the rows with a valid time and position"""
+
+    if time_column in df.columns:
+        times = pd.to_datetime(df[time_column], utc=True, errors='coerce')
+    elif isinstance(df.index, pd.DatetimeIndex):
+        times = pd.Series(df.index, index=df.index)
+        times = times.dt.tz_localize('UTC') if times.dt.tz is None else times.dt.tz_convert('UTC')
+    else:
+        raise ValueError('DataFrame has no {:} column or DatetimeIndex'.format(time_column))
+
+    valid = (times.notnull() & df.latitude.notnull() & df.longitude.notnull()).to_numpy()
+    rows = np.flatnonzero(valid)
+
+    seconds = times[valid].dt.tz_localize(None).to_numpy().astype('datetime64[s]').astype('int64')
+    xyz = lonlat_to_xyz(df.longitude.to_numpy()[valid], df.latitude.to_numpy()[valid])
+
+    return rows, seconds, xyz
+
+
+def _radius_query(data, query, chord, k=16):
+    """
+    All (query row, data row) pairs within chord of each other.  pykdtree has no ball query, so rows with k
+    neighbors inside chord are queried again with twice as many neighbors until every row has found all of them.
+
+    :return: query rows, data rows and chord distances
+    """
+    from pykdtree.kdtree import KDTree
+
+    tree = KDTree(np.ascontiguousarray(data))
+    n = data.shape[0]
+    k = min(k, n)
+
+    results = []
+    pending = np.arange(query.shape[0])
+    while pending.size:
+        distances, positions = tree.query(query[pending], k=k, distance_upper_bound=chord)
+        distances = distances.reshape(pending.size, k)
+        positions = positions.reshape(pending.size, k)
+
+        incomplete = np.isfinite(distances[:, -1]) & (k < n)
+        complete = ~incomplete
+
+        rows, columns = np.nonzero(np.isfinite(distances[complete]))
+        results.append((pending[complete][rows],
+                        positions[complete][rows, columns].astype('int64'),
+                        distances[complete][rows, columns]))
+
+        pending = pending[incomplete]
+        k = min(k * 2, n)
+
+    return tuple(np.concatenate(r) for r in zip(*results))
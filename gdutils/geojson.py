@@ -1,7 +1,7 @@
-import requests
 import logging
+import numpy as np
 import pandas as pd
-from decimal import *
+from decimal import Decimal
 
 dac_catalog_url = 'https://gliders.ioos.us/providers/api/deployment'
 
@@ -43,18 +43,12 @@ def latlon_to_geojson_track(latitudes, longitudes, timestamps, include_points=Tr
 
 
 def latlon_to_linestring(latitudes, longitudes, timestamps, precision='0.001'):
-    dataset_gps = pd.DataFrame(index=timestamps)
-    dataset_gps['latitude'] = latitudes.values
-    dataset_gps['longitude'] = longitudes.values
+
+    coordinates = np.column_stack([_quantize(longitudes, precision), _quantize(latitudes, precision)])
 
     track = {'type': 'Feature',
              'geometry': {'type': 'LineString',
-                          'coordinates': [
-                              [float(Decimal(pos.longitude).quantize(Decimal(precision),
-                                                                     rounding=ROUND_HALF_DOWN)),
-                               float(Decimal(pos.latitude).quantize(Decimal(precision),
-                                                                    rounding=ROUND_HALF_DOWN))]
-                              for i, pos in dataset_gps.iterrows()]},
+                          'coordinates': coordinates.tolist()},
              'properties': {}
              }
 
@@ -62,25 +56,26 @@ def latlon_to_linestring(latitudes, longitudes, timestamps, precision='0.001'):
 
 
 def latlon_to_points(latitudes, longitudes, timestamps, precision='0.001'):
-    dataset_gps = pd.DataFrame(index=timestamps)
-    dataset_gps['latitude'] = latitudes.values
-    dataset_gps['longitude'] = longitudes.values
+
+    coordinates = np.column_stack([_quantize(longitudes, precision), _quantize(latitudes, precision)]).tolist()
+    ts = pd.DatetimeIndex(pd.to_datetime(timestamps)).strftime('%Y-%m-%dT%H:%M:%SZ')
 
     return [{'type': 'Feature',
-             'geometry': {'type': 'Point', 'coordinates': [float(Decimal(pos.longitude).quantize(Decimal(precision),
-                                                                                                 rounding=ROUND_HALF_DOWN)),
-                                                           float(Decimal(pos.latitude).quantize(Decimal(precision),
-                                                                                                rounding=ROUND_HALF_DOWN))]},
-             'properties': {'ts': i.strftime('%Y-%m-%dT%H:%M:%SZ')}}
-            for i, pos in dataset_gps.iterrows()]
+             'geometry': {'type': 'Point', 'coordinates': coordinate},
+             'properties': {'ts': t}}
+            for coordinate, t in zip(coordinates, ts)]
 
 
 def latlon_to_bbox(latitudes, longitudes, timestamps, precision='0.001'):
-    dataset_gps = pd.DataFrame(index=timestamps)
-    dataset_gps['latitude'] = latitudes.values
-    dataset_gps['longitude'] = longitudes.values
-
-    return [float(Decimal(dataset_gps.longitude.min()).quantize(Decimal(precision), rounding=ROUND_HALF_DOWN)),
-            float(Decimal(dataset_gps.latitude.min()).quantize(Decimal(precision), rounding=ROUND_HALF_DOWN)),
-            float(Decimal(dataset_gps.longitude.max()).quantize(Decimal(precision), rounding=ROUND_HALF_DOWN)),
-            float(Decimal(dataset_gps.latitude.max()).quantize(Decimal(precision), rounding=ROUND_HALF_DOWN))]
+
+    lons = _quantize(longitudes, precision)
+    lats = _quantize(latitudes, precision)
+
+    return [float(lons.min()), float(lats.min()), float(lons.max()), float(lats.max())]
+
+
+def _quantize(values, precision='0.001'):
+    """Round values to the number of decimal places in precision (i.e.: '0.001' -> 3)"""
+    decimals = -Decimal(precision).as_tuple().exponent
+
+    return np.round(np.asarray(values, dtype='float64'), decimals)
@@ -0,0 +1,274 @@
+"""Interval index over the time coverage of deployments.  Start and end times are stored as epoch seconds sorted
+independently, so the number of deployments active at an instant or overlapping a window is the difference of two
+binary searches: #(start <= t1) - #(end < t0).  Active deployments are found by slicing the start sorted array
+between t0 minus the longest deployment and t1, so a query only visits the deployments that started within one
+deployment length of the window rather than every deployment."""
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+logging.getLogger(__file__)
+
+_missing_start = np.iinfo('int64').max
+_missing_end = np.iinfo('int64').min
+
+
+class DeploymentIntervalIndex(object):
+
+    def __init__(self, dataset_ids, start_times, end_times):
+        """Sorted interval index of the time coverage of each data set.  Data sets with a missing start or end time
+        are kept but never match a query.
+
+        :param dataset_ids: list of dataset ids
+        :param start_times: start time of each data set
+        :param end_times: end time of each data set
+        """
+        self._logger = logging.getLogger(os.path.basename(__file__))
+
+        self._dataset_ids = np.asarray(dataset_ids, dtype='str')
+        num_datasets = self._dataset_ids.size
+
+        self._start_times = _epoch_seconds(start_times, num_datasets, _missing_start)
+        self._end_times = _epoch_seconds(end_times, num_datasets, _missing_end)
+        if self._start_times.size != num_datasets or self._end_times.size != num_datasets:
+            raise ValueError('dataset_ids, start_times and end_times must be the same length')
+
+        self._valid = (self._start_times != _missing_start) & (self._end_times != _missing_end)
+
+        # Only data sets with a valid time coverage are sorted, so counts are #(start <= t1) - #(end < t0)
+        valid_rows = np.flatnonzero(self._valid)
+        self._start_order = valid_rows[np.argsort(self._start_times[valid_rows], kind='stable')]
+        self._sorted_start_times = self._start_times[self._start_order]
+        self._sorted_end_times = np.sort(self._end_times[valid_rows])
+
+        durations = self._end_times[self._valid] - self._start_times[self._valid]
+        self._max_duration = int(durations.max()) if durations.size else 0
+
+    @classmethod
+    def from_datasets(cls, datasets, start_column='start_date', end_column='end_date'):
+        """
+        Index the time coverage of the data sets in a DataFrame indexed by dataset id (i.e.: GdacClient.datasets)
+
+        :param datasets: DataFrame indexed by dataset_id
+        :param start_column: name of the start time column
+        :param end_column: name of the end time column
+        :return: DeploymentIntervalIndex
+        """
+        if datasets.empty:
+            return cls([], [], [])
+
+        return cls(datasets.index.tolist(), datasets[start_column].values, datasets[end_column].values)
+
+    @classmethod
+    def from_datasets_days(cls, datasets_days):
+        """
+        Index the first and last day of each column of a date indexed DataFrame containing a 1 on each day a data set
+        was deployed (i.e.: GdacClient.datasets_days).  The last day covers the whole day.
+
+        :param datasets_days: DataFrame indexed by date with one column per dataset id
+        :return: DeploymentIntervalIndex
+        """
+        if datasets_days.empty:
+            return cls([], [], [])
+
+        deployed = datasets_days.fillna(0).astype('bool')
+        start_times = deployed.idxmax().where(deployed.any())
+        end_times = deployed.iloc[::-1].idxmax().where(deployed.any())
+
+        return cls(datasets_days.columns.tolist(), start_times.values,
+                   (pd.to_datetime(end_times) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)).values)
+
+    @property
+    def dataset_ids(self):
+        return self._dataset_ids.tolist()
+
+    @property
+    def time_coverage(self):
+        """DataFrame containing the start_time and end_time of each data set"""
+        return pd.DataFrame({'start_time': _to_datetime(self._start_times, self._valid),
+                             'end_time': _to_datetime(self._end_times, self._valid)},
+                            index=pd.Index(self._dataset_ids, name='dataset_id'))
+
+    def active_at(self, dt):
+        """
+        Dataset ids of the data sets active at dt (start time <= dt <= end time)
+
+        :param dt: datetime, Timestamp or ISO-8601 string
+        :return: list of dataset ids in start time order
+        """
+        return self.overlapping(dt, dt)
+
+    def overlapping(self, dt0, dt1):
+        """
+        Dataset ids of the data sets whose time coverage overlaps the dt0 to dt1 window (start time <= dt1 and end
+        time >= dt0)
+
+        :param dt0: window start
+        :param dt1: window end
+        :return: list of dataset ids in start time order
+        """
+        return self._dataset_ids[self._overlapping_positions(dt0, dt1)].tolist()
+
+    def days_active(self, dt0, dt1):
+        """
+        Number of days, starting at midnight between dt0 and dt1 inclusive, each data set overlapping the window was
+        active on (i.e.: the glider days of each deployment in a reporting period)
+
+        :param dt0: window start
+        :param dt1: window end
+        :return: Series indexed by dataset_id
+        """
+        positions = self._overlapping_positions(dt0, dt1)
+
+        # Days are counted from the first midnight on or after dt0
+        first_day = -(-_parse_time(dt0) // 86400)
+        last_day = _parse_time(dt1) // 86400
+
+        days = (np.minimum(self._end_times[positions] // 86400, last_day)
+                - np.maximum(self._start_times[positions] // 86400, first_day) + 1)
+
+        return pd.Series(np.maximum(days, 0), index=pd.Index(self._dataset_ids[positions], name='dataset_id'))
+
+    def count_active(self, times):
+        """
+        Number of data sets active at each of times
+
+        :param times: datetime or array of datetimes
+        :return: int64 array
+        """
+        seconds = _epoch_seconds(np.atleast_1d(times), np.size(times), _missing_start)
+
+        return self._count(seconds, seconds)
+
+    def count_overlapping(self, start_times, end_times):
+        """
+        Number of data sets overlapping each of the start_times to end_times windows
+
+        :param start_times: array of window starts
+        :param end_times: array of window ends
+        :return: int64 array
+        """
+        t0 = _epoch_seconds(np.atleast_1d(start_times), np.size(start_times), _missing_start)
+        t1 = _epoch_seconds(np.atleast_1d(end_times), np.size(end_times), _missing_start)
+
+        return self._count(t0, t1)
+
+    def period_counts(self, freq='D'):
+        """
+        Number of data sets active in each period (i.e.: day, month or year) between the first start time and the
+        last end time.  Periods with no active data sets are dropped.
+
+        :param freq: pandas period frequency ('D', 'M' or 'Y')
+        :return: Series indexed by the period start times
+        """
+        if not self._valid.any():
+            return pd.Series([], index=pd.DatetimeIndex([]), dtype='int64')
+
+        first = pd.Timestamp(int(self._start_times[self._valid].min()), unit='s')
+        last = pd.Timestamp(int(self._end_times[self._valid].max()), unit='s')
+
+        periods = pd.period_range(first.to_period(freq), last.to_period(freq), freq=freq)
+        counts = self.count_overlapping(periods.start_time.values, periods.end_time.floor('s').values)
+
+        counts = pd.Series(counts, index=periods.start_time)
+
+        return counts[counts > 0]
+
+    def month_day_counts(self):
+        """
+        Number of data sets active on each month and day of the year, in any year.  A data set spanning several years
+        is counted once for each month and day.
+
+        :return: Series indexed by (month, day)
+        """
+        rows, days = self.active_days()
+        if not rows.size:
+            return pd.Series([], index=pd.MultiIndex.from_arrays([[], []], names=['month', 'day']), dtype='int64')
+
+        days = pd.DatetimeIndex(days)
+        active = pd.DataFrame({'row': rows, 'month': days.month, 'day': days.day}).drop_duplicates()
+
+        return active.groupby(['month', 'day']).size()
+
+    def active_days(self):
+        """
+        Days, from the start day to the end day inclusive, on which each data set was active
+
+        :return: (row positions of self.dataset_ids, datetime64[D] days)
+        """
+        rows = np.flatnonzero(self._valid)
+        first_days = self._start_times[rows] // 86400
+        last_days = self._end_times[rows] // 86400
+        num_days = last_days - first_days + 1
+
+        offsets = np.arange(num_days.sum()) - np.repeat(np.cumsum(num_days) - num_days, num_days)
+        days = np.repeat(first_days, num_days) + offsets
+
+        return np.repeat(rows, num_days), days.astype('datetime64[D]')
+
+    def _overlapping_positions(self, dt0, dt1):
+
+        t0 = _parse_time(dt0)
+        t1 = _parse_time(dt1)
+        if t0 is None or t1 is None:
+            raise ValueError('Invalid time window: {:} - {:}'.format(dt0, dt1))
+
+        # Only data sets starting within the longest deployment of t0 can still be active at t0
+        i0 = np.searchsorted(self._sorted_start_times, t0 - self._max_duration, side='left')
+        i1 = np.searchsorted(self._sorted_start_times, t1, side='right')
+
+        candidates = self._start_order[i0:i1]
+
+        return candidates[self._end_times[candidates] >= t0]
+
+    def _count(self, t0, t1):
+
+        started = np.searchsorted(self._sorted_start_times, t1, side='right')
+        ended = np.searchsorted(self._sorted_end_times, t0, side='left')
+
+        return (started - ended).astype('int64')
+
+    def __len__(self):
+        return self._dataset_ids.size
+
+    def __repr__(self):
+        return '<DeploymentIntervalIndex(num_datasets={:})>'.format(self._dataset_ids.size)
+
+
+def _parse_time(value):
+    """Epoch seconds of value.  Naive times are UTC"""
+
+    try:
+        ts = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return
+
+    if pd.isnull(ts):
+        return
+
+    if ts.tzinfo:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+
+    return int(ts.value // 10 ** 9)
+
+
+def _epoch_seconds(times, size, missing):
+    """int64 epoch seconds of times.  Missing or invalid times are set to missing"""
+
+    if times is None:
+        return np.full(size, missing, dtype='int64')
+
+    times = pd.to_datetime(pd.Series(list(times), dtype='object'), utc=True, errors='coerce')
+    seconds = times.dt.tz_localize(None).values.astype('datetime64[s]').astype('int64')
+    seconds[times.isnull().values] = missing
+
+    return seconds
+
+
+def _to_datetime(seconds, valid):
+    """UTC DatetimeIndex of epoch seconds.  Times that are not valid are NaT"""
+
+    times = np.where(valid, seconds, np.datetime64('NaT').astype('int64')).astype('datetime64[s]')
+
+    return pd.to_datetime(times, utc=True)
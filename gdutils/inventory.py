@@ -0,0 +1,230 @@
+"""Data set x variable inventory.  Variable membership is stored as a boolean matrix, with sorted dataset id and
+variable name lookup tables, alongside the time coverage of each data set, so questions like "which data sets carry
+oxygen and were active in June 2021" are answered locally without info page requests or server searches."""
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+logging.getLogger(__file__)
+
+# Default location of the persisted inventory
+variable_inventory_path = os.path.join(os.getenv('GDUTILS_CACHE_DIR',
+                                                 os.path.join(os.path.expanduser('~'), '.cache', 'gdutils')),
+                                       'variable_inventory.npz')
+
+
+class VariableInventory(object):
+
+    def __init__(self, dataset_ids, variables, matrix, start_times=None, end_times=None):
+        """Boolean matrix, with one row per dataset id and one column per variable, that is True where the data set
+        contains the variable.  start_times and end_times are the time coverage of each data set.
+
+        :param dataset_ids: list of dataset ids labeling the matrix rows
+        :param variables: list of variable names labeling the matrix columns
+        :param matrix: boolean array of shape (len(dataset_ids), len(variables))
+        :param start_times: time_coverage_start of each data set
+        :param end_times: time_coverage_end of each data set
+        """
+        self._logger = logging.getLogger(os.path.basename(__file__))
+
+        self._dataset_ids = np.asarray(dataset_ids, dtype='str')
+        self._variables = np.asarray(variables, dtype='str')
+        self._matrix = np.asarray(matrix, dtype='bool').reshape(self._dataset_ids.size, self._variables.size)
+
+        self._start_times = _to_datetime64(start_times, self._dataset_ids.size)
+        self._end_times = _to_datetime64(end_times, self._dataset_ids.size)
+
+        self._dataset_rows = {d: i for i, d in enumerate(self._dataset_ids)}
+        self._variable_columns = {v: i for i, v in enumerate(self._variables)}
+
+    @classmethod
+    def from_metadata_index(cls, metadata_index, dataset_ids=None):
+        """
+        Build the inventory from the variables and the NC_GLOBAL time_coverage_start and time_coverage_end attributes
+        of the data sets in a gdutils.metadata.MetadataIndex
+
+        :param metadata_index: gdutils.metadata.MetadataIndex instance
+        :param dataset_ids: list of dataset ids.  Defaults to all data sets in the index
+        :return: VariableInventory
+        """
+        variables = metadata_index.dataset_variables(dataset_ids=dataset_ids)
+        if dataset_ids is None:
+            dataset_ids = metadata_index.dataset_ids
+
+        dataset_ids = sorted(set(dataset_ids).intersection(metadata_index.dataset_ids))
+        variable_names = sorted(variables.variable.unique())
+
+        rows = pd.Index(dataset_ids).get_indexer(variables.dataset_id)
+        columns = pd.Index(variable_names).get_indexer(variables.variable)
+        keep = rows >= 0
+
+        matrix = np.zeros((len(dataset_ids), len(variable_names)), dtype='bool')
+        matrix[rows[keep], columns[keep]] = True
+
+        coverage = metadata_index.global_attributes(['time_coverage_start', 'time_coverage_end'],
+                                                    dataset_ids=dataset_ids)
+
+        return cls(dataset_ids, variable_names, matrix,
+                   start_times=coverage.time_coverage_start.values,
+                   end_times=coverage.time_coverage_end.values)
+
+    @classmethod
+    def load(cls, path=None):
+        """
+        Load an inventory written by VariableInventory.save
+
+        :param path: inventory file.  Defaults to gdutils.inventory.variable_inventory_path
+        :return: VariableInventory or None if path could not be read
+        """
+        path = path or variable_inventory_path
+        try:
+            with np.load(path) as npz:
+                dataset_ids = npz['dataset_ids']
+                variables = npz['variables']
+                matrix = np.unpackbits(npz['matrix'], axis=1, count=variables.size).astype('bool')
+                return cls(dataset_ids, variables, matrix, start_times=npz['start_times'],
+                           end_times=npz['end_times'])
+        except (IOError, OSError, KeyError, ValueError) as e:
+            logging.error('Failed to load variable inventory {:}: {:}'.format(path, e))
+            return
+
+    @property
+    def dataset_ids(self):
+        return self._dataset_ids.tolist()
+
+    @property
+    def variables(self):
+        return self._variables.tolist()
+
+    @property
+    def matrix(self):
+        return self._matrix
+
+    @property
+    def time_coverage(self):
+        """DataFrame containing the start_time and end_time of each data set"""
+        return pd.DataFrame({'start_time': pd.to_datetime(self._start_times, utc=True),
+                             'end_time': pd.to_datetime(self._end_times, utc=True)},
+                            index=pd.Index(self._dataset_ids, name='dataset_id'))
+
+    def save(self, path=None):
+        """
+        Write the inventory to path as a compressed numpy archive.  The matrix rows are bit packed.
+
+        :param path: inventory file.  Defaults to gdutils.inventory.variable_inventory_path
+        :return: path or None if the write failed
+        """
+        path = path or variable_inventory_path
+        tmp_path = '{:}.{:}.tmp.npz'.format(path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(os.path.realpath(path)), exist_ok=True)
+            np.savez_compressed(tmp_path,
+                                dataset_ids=self._dataset_ids,
+                                variables=self._variables,
+                                matrix=np.packbits(self._matrix, axis=1),
+                                start_times=self._start_times,
+                                end_times=self._end_times)
+            os.replace(tmp_path, path)
+        except (IOError, OSError) as e:
+            logging.error('Failed to write variable inventory {:}: {:}'.format(path, e))
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        return path
+
+    def has_variable(self, dataset_id, variable):
+        """True if dataset_id contains variable, False if it does not and None if dataset_id is not in the inventory"""
+        row = self._dataset_rows.get(dataset_id)
+        if row is None:
+            return
+
+        column = self._variable_columns.get(variable)
+        if column is None:
+            return False
+
+        return bool(self._matrix[row, column])
+
+    def dataset_variables(self, dataset_id):
+        """Variables contained in dataset_id.  Empty if dataset_id is not in the inventory"""
+        row = self._dataset_rows.get(dataset_id)
+        if row is None:
+            return []
+
+        return self._variables[self._matrix[row]].tolist()
+
+    def filter_variables(self, dataset_id, variables):
+        """
+        The variables contained in dataset_id, in the order specified.  All variables are returned if dataset_id is not
+        in the inventory, since nothing is known about it.
+
+        :param dataset_id: dataset id
+        :param variables: list of variable names
+        :return: list of variable names
+        """
+        if dataset_id not in self._dataset_rows:
+            return list(variables)
+
+        return [v for v in variables if self.has_variable(dataset_id, v)]
+
+    def find_datasets(self, variables, min_time=None, max_time=None, match='all'):
+        """
+        Dataset ids containing the variables and, if min_time and/or max_time are specified, whose time coverage
+        overlaps the min_time to max_time window.  Data sets without a time coverage never match a time window.
+
+        :param variables: variable name or list of variable names
+        :param min_time: window start
+        :param max_time: window end
+        :param match: 'all' to require all variables or 'any' to require at least one
+        :return: list of dataset ids
+        """
+        if match not in ['all', 'any']:
+            raise ValueError('Invalid match specified: {:}'.format(match))
+
+        if not isinstance(variables, list):
+            variables = [variables]
+
+        columns = [self._variable_columns.get(v) for v in variables]
+        if match == 'all' and None in columns:
+            return []
+
+        columns = [c for c in columns if c is not None]
+        if not columns:
+            return [] if variables else self.dataset_ids
+
+        selected = self._matrix[:, columns]
+        mask = selected.all(axis=1) if match == 'all' else selected.any(axis=1)
+
+        if max_time is not None:
+            mask &= self._start_times <= _to_datetime64([max_time], 1)[0]
+        if min_time is not None:
+            mask &= self._end_times >= _to_datetime64([min_time], 1)[0]
+
+        return self._dataset_ids[mask].tolist()
+
+    def to_dataframe(self):
+        """Boolean DataFrame indexed by dataset_id with a column for each variable"""
+        return pd.DataFrame(self._matrix, index=pd.Index(self._dataset_ids, name='dataset_id'),
+                            columns=pd.Index(self._variables, name='variable'))
+
+    def __contains__(self, dataset_id):
+        return dataset_id in self._dataset_rows
+
+    def __len__(self):
+        return self._dataset_ids.size
+
+    def __repr__(self):
+        return '<VariableInventory(num_datasets={:}, num_variables={:})>'.format(self._dataset_ids.size,
+                                                                                  self._variables.size)
+
+
+def _to_datetime64(times, size):
+    """Naive UTC datetime64[s] array.  Missing or invalid times are NaT"""
+
+    if times is None:
+        return np.full(size, np.datetime64('NaT'), dtype='datetime64[s]')
+
+    times = pd.to_datetime(pd.Series(list(times), dtype='object'), utc=True, errors='coerce')
+
+    return times.dt.tz_localize(None).values.astype('datetime64[s]')
@@ -7,6 +7,10 @@ logging.getLogger(__file__)
 
 dataset_id_regex = re.compile(r'^.*-\d{8}T\d{4}')
 
+# Hive partition columns for the Parquet archives
+partition_cols = ['dataset_id',
+                  'year']
+
 
 def import_dac_profiles_csv_files(csv_files):
     datasets_daily_profiles = []
@@ -125,3 +129,208 @@ def daily_obs_to_md_calendar(obs):
     calendar.index.names = 'month'
 
     return calendar
+
+
+def dac_profiles_csv_files_to_parquet(csv_files, root_path):
+    """
+    Convert DAC profiles csv files (time, latitude, longitude, profile_id, wmo_id) to a Parquet archive partitioned by
+    dataset_id and year.  The dataset id is parsed from each csv file name.
+
+    :param csv_files: list of DAC profiles csv files
+    :param root_path: Parquet archive root directory
+    :return: list of dataset ids written to the archive
+    """
+    return _csv_files_to_parquet(csv_files, root_path)
+
+
+def gts_obs_csv_files_to_parquet(csv_files, root_path):
+    """
+    Convert GTS observations csv files (time, platform_code, platform_type, ...) to a Parquet archive partitioned by
+    dataset_id and year.  The dataset id is parsed from each csv file name.
+
+    :param csv_files: list of GTS observations csv files
+    :param root_path: Parquet archive root directory
+    :return: list of dataset ids written to the archive
+    """
+    return _csv_files_to_parquet(csv_files, root_path)
+
+
+def write_parquet_dataset(data, root_path, dataset_id=None):
+    """
+    Write a profiles or observations table to the Parquet archive at root_path, partitioned by dataset_id and year.
+    Existing partitions for the same dataset_id and year are replaced.
+
+    :param data: DataFrame containing a time column and, unless dataset_id is specified, a dataset_id column
+    :param root_path: Parquet archive root directory
+    :param dataset_id: dataset id to assign to all rows in data
+    :return: True if written, False otherwise
+    """
+    if data.empty:
+        logging.warning('No rows to write to {:}'.format(root_path))
+        return False
+
+    if 'time' not in data.columns:
+        logging.error('DataFrame is missing column time')
+        return False
+
+    data = data.copy()
+    if dataset_id:
+        data['dataset_id'] = dataset_id
+    elif 'dataset_id' not in data.columns:
+        logging.error('DataFrame is missing column dataset_id')
+        return False
+
+    # Times are always written as UTC so that read_parquet_dataset time windows compare with them
+    if not pd.api.types.is_datetime64_any_dtype(data.time):
+        data['time'] = pd.to_datetime(data.time, utc=True)
+    elif data.time.dt.tz is None:
+        data['time'] = data.time.dt.tz_localize('UTC')
+    else:
+        data['time'] = data.time.dt.tz_convert('UTC')
+
+    data['year'] = data.time.dt.year
+
+    try:
+        data.to_parquet(root_path,
+                        engine='pyarrow',
+                        partition_cols=partition_cols,
+                        index=False,
+                        existing_data_behavior='delete_matching')
+    except (ImportError, OSError) as e:
+        logging.error('Failed to write Parquet archive {:}: {:}'.format(root_path, e))
+        return False
+
+    return True
+
+
+def read_parquet_dataset(root_path, columns=None, filters=None, dataset_ids=None, years=None, min_time=None,
+                         max_time=None):
+    """
+    Read a profiles or observations table from the Parquet archive at root_path.  Only the partitions matching
+    dataset_ids, years and the min_time/max_time window are read.
+
+    :param root_path: Parquet archive root directory
+    :param columns: list of columns to read.  All columns are read if not specified
+    :param filters: list of additional pyarrow predicate tuples (i.e.: [('latitude', '>', 30.)])
+    :param dataset_ids: dataset id or list of dataset ids to read
+    :param years: year or list of years to read
+    :param min_time: minimum time value
+    :param max_time: maximum time value
+    :return: pandas DataFrame
+    """
+    if not os.path.isdir(root_path):
+        logging.error('Invalid Parquet archive specified: {:}'.format(root_path))
+        return pd.DataFrame()
+
+    predicates = list(filters or [])
+
+    if dataset_ids:
+        if not isinstance(dataset_ids, list):
+            dataset_ids = [dataset_ids]
+        predicates.append(('dataset_id', 'in', dataset_ids))
+
+    if years:
+        if not isinstance(years, list):
+            years = [years]
+        predicates.append(('year', 'in', [int(y) for y in years]))
+
+    # Time window predicates also prune the year partitions
+    if min_time is not None:
+        min_time = pd.Timestamp(min_time)
+        if not min_time.tzinfo:
+            min_time = min_time.tz_localize('UTC')
+        predicates.append(('year', '>=', min_time.year))
+        predicates.append(('time', '>=', min_time))
+    if max_time is not None:
+        max_time = pd.Timestamp(max_time)
+        if not max_time.tzinfo:
+            max_time = max_time.tz_localize('UTC')
+        predicates.append(('year', '<=', max_time.year))
+        predicates.append(('time', '<=', max_time))
+
+    try:
+        data = pd.read_parquet(root_path, engine='pyarrow', columns=columns, filters=predicates or None)
+    except (ImportError, OSError, ValueError) as e:
+        logging.error('Failed to read Parquet archive {:}: {:}'.format(root_path, e))
+        return pd.DataFrame()
+
+    # Partition columns are returned as categoricals
+    if 'dataset_id' in data.columns:
+        data['dataset_id'] = data.dataset_id.astype('str')
+    if 'year' in data.columns:
+        data['year'] = data.year.astype('int')
+
+    return data
+
+
+def import_dac_profiles_parquet(root_path, dataset_ids=None, years=None, min_time=None, max_time=None):
+    """
+    Daily profile counts read from the Parquet archive at root_path.  Equivalent to import_dac_profiles_csv_files, but
+    only the time, profile_id and dataset_id columns of the selected partitions are read.
+
+    :param root_path: Parquet archive root directory
+    :param dataset_ids: dataset id or list of dataset ids to read
+    :param years: year or list of years to read
+    :param min_time: minimum time value
+    :param max_time: maximum time value
+    :return: DataFrame containing the number of profiles per day (rows) for each dataset_id (columns)
+    """
+    data = read_parquet_dataset(root_path, columns=['time', 'profile_id', 'dataset_id'], dataset_ids=dataset_ids,
+                                years=years, min_time=min_time, max_time=max_time)
+
+    return _daily_counts(data, 'profile_id')
+
+
+def import_gts_obs_parquet(root_path, dataset_ids=None, years=None, min_time=None, max_time=None):
+    """
+    Daily GTS observation counts read from the Parquet archive at root_path.  Equivalent to import_gts_obs_csv_files,
+    but only the time, platform_type and dataset_id columns of the selected partitions are read.
+
+    :param root_path: Parquet archive root directory
+    :param dataset_ids: dataset id or list of dataset ids to read
+    :param years: year or list of years to read
+    :param min_time: minimum time value
+    :param max_time: maximum time value
+    :return: DataFrame containing the number of observations per day (rows) for each dataset_id (columns)
+    """
+    data = read_parquet_dataset(root_path, columns=['time', 'platform_type', 'dataset_id'], dataset_ids=dataset_ids,
+                                years=years, min_time=min_time, max_time=max_time)
+
+    return _daily_counts(data, 'platform_type')
+
+
+def _csv_files_to_parquet(csv_files, root_path):
+
+    dataset_ids = []
+    for csv_file in csv_files:
+
+        fname = os.path.basename(csv_file)
+        match = dataset_id_regex.search(fname)
+        if not match:
+            logging.warning('cannot find dataset id in filename: {:}'.format(fname))
+            continue
+
+        dataset_id = match.group()
+
+        logging.info('Archiving {:}: {:}'.format(dataset_id, csv_file))
+        data = pd.read_csv(csv_file, parse_dates=['time'])
+        if not write_parquet_dataset(data, root_path, dataset_id=dataset_id):
+            continue
+
+        dataset_ids.append(dataset_id)
+
+    return dataset_ids
+
+
+def _daily_counts(data, count_column):
+
+    if data.empty:
+        logging.warning('No rows found in Parquet archive')
+        return pd.DataFrame()
+
+    daily_counts = data.groupby(['dataset_id', data.time.dt.date])[count_column].count().unstack('dataset_id')
+    daily_counts = daily_counts.sort_index()
+    daily_counts.columns.name = 'dataset_id'
+    daily_counts.index.name = 'date'
+
+    return daily_counts
@@ -0,0 +1,329 @@
+"""Local SQLite index of the ERDDAP info page (variable and attribute metadata) of each data set.  Info pages are
+harvested concurrently and stored as (dataset_id, variable, attribute, data_type, value) rows, so attribute queries
+across the fleet (i.e.: all SECOORA data sets funded by NOAA) are indexed lookups rather than one request per data
+set."""
+import logging
+import os
+import io
+import time
+import sqlite3
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+logging.getLogger(__file__)
+
+# Default location of the metadata index
+metadata_index_path = os.path.join(os.getenv('GDUTILS_CACHE_DIR',
+                                             os.path.join(os.path.expanduser('~'), '.cache', 'gdutils')),
+                                   'metadata.sqlite')
+
+# Number of seconds before the info page of an active (not completed) data set is harvested again
+metadata_ttl = 86400
+
+_schema = ['CREATE TABLE IF NOT EXISTS datasets (dataset_id TEXT PRIMARY KEY, fetched REAL, completed INTEGER)',
+           'CREATE TABLE IF NOT EXISTS attributes (dataset_id TEXT, variable TEXT, attribute TEXT, data_type TEXT, '
+           'value TEXT)',
+           'CREATE INDEX IF NOT EXISTS attributes_dataset_id ON attributes (dataset_id)',
+           'CREATE INDEX IF NOT EXISTS attributes_attribute ON attributes (variable, attribute, value)']
+
+# Info page columns stored in the attributes table
+_info_columns = ['variable_name',
+                 'attribute_name',
+                 'data_type',
+                 'value']
+
+
+class MetadataIndex(object):
+
+    def __init__(self, db_path=None, erddap_url=None, max_workers=8, ttl=metadata_ttl):
+        """SQLite index of the ERDDAP info pages of data sets.
+
+        Completed data sets are harvested once and cached permanently.  Active data sets are harvested again once
+        their info page is older than ttl seconds.  Use ':memory:' as db_path for an index that is not persisted."""
+
+        self._logger = logging.getLogger(os.path.basename(__file__))
+
+        self._db_path = db_path or metadata_index_path
+        self._erddap_url = erddap_url or 'https://gliders.ioos.us/erddap'
+        self._max_workers = max_workers
+        self._ttl = ttl
+        self._timeout = (30, 120)
+
+        if self._db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.realpath(self._db_path)), exist_ok=True)
+
+        # The connection is shared by all threads and serialized with self._lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            for statement in _schema:
+                self._conn.execute(statement)
+
+    @property
+    def db_path(self):
+        return self._db_path
+
+    @property
+    def dataset_ids(self):
+        """Sorted list of the harvested dataset ids"""
+        return [r[0] for r in self._execute('SELECT dataset_id FROM datasets ORDER BY dataset_id')]
+
+    @property
+    def datasets(self):
+        """DataFrame containing the harvest time and completed status of each harvested data set"""
+        datasets = self._read_sql('SELECT dataset_id, fetched, completed FROM datasets ORDER BY dataset_id')
+        datasets['fetched'] = pd.to_datetime(datasets.fetched, unit='s', utc=True)
+        datasets['completed'] = datasets.completed.astype('bool')
+
+        return datasets.set_index('dataset_id')
+
+    def info_url(self, dataset_id):
+        return '{:}/info/{:}/index.csv'.format(self._erddap_url, dataset_id)
+
+    def stale_dataset_ids(self, dataset_ids, completed=None):
+        """
+        Dataset ids in dataset_ids that have not been harvested, or are not completed and were harvested more than ttl
+        seconds ago
+
+        :param dataset_ids: list of dataset ids
+        :param completed: list of completed dataset ids
+        :return: list of dataset ids
+        """
+        completed = set(completed or [])
+        harvested = {r[0]: (r[1], r[2]) for r in self._execute('SELECT dataset_id, fetched, completed FROM datasets')}
+
+        now = time.time()
+        stale = []
+        for dataset_id in dataset_ids:
+            if dataset_id not in harvested:
+                stale.append(dataset_id)
+                continue
+
+            fetched, was_completed = harvested[dataset_id]
+            if was_completed:
+                continue
+
+            # Data sets that completed since the last harvest are harvested one final time
+            if dataset_id in completed or now - fetched > self._ttl:
+                stale.append(dataset_id)
+
+        return stale
+
+    def harvest(self, dataset_ids, completed=None, force=False):
+        """
+        Fetch the info pages of the stale data sets in dataset_ids concurrently and store them in the index.
+
+        :param dataset_ids: dataset id or list of dataset ids
+        :param completed: list of completed dataset ids.  Defaults to the completed deployments in the DAC catalog
+        :param force: harvest all data sets, including completed data sets already in the index
+        :return: list of dataset ids harvested
+        """
+        if not isinstance(dataset_ids, list):
+            dataset_ids = [dataset_ids]
+
+        if completed is None:
+            from gdutils.apis.dac import fetch_dac_catalog_json
+            completed = [d['name'] for d in fetch_dac_catalog_json() if d.get('completed')]
+        completed = set(completed)
+
+        if not force:
+            dataset_ids = self.stale_dataset_ids(dataset_ids, completed=completed)
+
+        if not dataset_ids:
+            self._logger.info('Metadata index is up to date')
+            return []
+
+        self._logger.info('Harvesting {:} data set info pages'.format(len(dataset_ids)))
+
+        session = self._create_session()
+        harvested = []
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            for dataset_id, info in zip(dataset_ids,
+                                        executor.map(lambda d: self._fetch_info(session, d), dataset_ids)):
+                if info is None:
+                    continue
+                self._store(dataset_id, info, dataset_id in completed)
+                harvested.append(dataset_id)
+
+        session.close()
+
+        self._logger.info('Harvested {:}/{:} data set info pages'.format(len(harvested), len(dataset_ids)))
+
+        return harvested
+
+    def get_dataset_metadata(self, dataset_id):
+        """
+        Info page of dataset_id from the index
+
+        :param dataset_id: dataset id
+        :return: DataFrame containing the variable, attribute, data_type and value columns
+        """
+        return self._read_sql('SELECT variable, attribute, data_type, value FROM attributes WHERE dataset_id = ?',
+                              [dataset_id])
+
+    def dataset_variables(self, dataset_ids=None):
+        """
+        Variables contained in each data set
+
+        :param dataset_ids: list of dataset ids.  Defaults to all harvested data sets
+        :return: DataFrame containing the dataset_id and variable columns
+        """
+        sql = "SELECT dataset_id, variable FROM attributes WHERE attribute = '' AND variable != 'NC_GLOBAL'"
+        variables = self._read_sql(sql + ' ORDER BY dataset_id, variable')
+        if dataset_ids is not None:
+            variables = variables[variables.dataset_id.isin(dataset_ids)].reset_index(drop=True)
+
+        return variables
+
+    def variable_attributes(self, dataset_ids=None, include_global=False):
+        """
+        Variable rows and variable attributes of the harvested data sets
+
+        :param dataset_ids: list of dataset ids.  Defaults to all harvested data sets
+        :param include_global: include the NC_GLOBAL attributes
+        :return: DataFrame containing the dataset_id, variable, attribute and value columns
+        """
+        where = '' if include_global else " WHERE variable != 'NC_GLOBAL'"
+        attributes = self._read_sql('SELECT dataset_id, variable, attribute, value FROM attributes{:}'.format(where))
+        if dataset_ids is not None:
+            attributes = attributes[attributes.dataset_id.isin(dataset_ids)].reset_index(drop=True)
+
+        return attributes
+
+    def find_datasets(self, filters, variable='NC_GLOBAL'):
+        """
+        Dataset ids whose variable attributes match all filters.  Each filter is an (attribute, operator, value) tuple
+        where operator is one of =, !=, like or in (i.e.: [('ioos_regional_association', '=', 'SECOORA'),
+        ('acknowledg%', 'like', '%NOAA%')]).  Attribute names containing % are matched with LIKE.
+
+        :param filters: list of (attribute, operator, value) tuples
+        :param variable: variable name
+        :return: sorted list of dataset ids
+        """
+        operators = {'=': '=', '==': '=', '!=': '!=', 'like': 'LIKE', 'in': 'IN'}
+
+        queries = []
+        params = []
+        for attribute, operator, value in filters:
+            if operator.lower() not in operators:
+                raise ValueError('Invalid filter operator: {:}'.format(operator))
+
+            sql_operator = operators[operator.lower()]
+            if sql_operator == 'IN':
+                values = list(value)
+                value_clause = 'value IN ({:})'.format(','.join(['?'] * len(values)))
+            else:
+                values = [value]
+                value_clause = 'value {:} ?'.format(sql_operator)
+
+            queries.append('SELECT dataset_id FROM attributes WHERE variable = ? AND attribute {:} ? AND {:}'.format(
+                'LIKE' if '%' in attribute else '=', value_clause))
+            params += [variable, attribute] + values
+
+        if not queries:
+            return self.dataset_ids
+
+        return sorted([r[0] for r in self._execute(' INTERSECT '.join(queries), params)])
+
+    def global_attributes(self, attributes, dataset_ids=None, variable='NC_GLOBAL', sep=','):
+        """
+        Table of attribute values for each data set.  Attribute names containing % are matched with LIKE and multiple
+        matching values are joined with sep (i.e.: 'acknowledg%' matches acknowledgment and acknowledgement).
+
+        :param attributes: list of attribute names
+        :param dataset_ids: list of dataset ids.  Defaults to all harvested data sets
+        :param variable: variable name
+        :param sep: separator used to join multiple values
+        :return: DataFrame indexed by dataset_id with a column for each attribute
+        """
+        if not isinstance(attributes, list):
+            attributes = [attributes]
+
+        dataset_ids = self.dataset_ids if dataset_ids is None else dataset_ids
+        table = pd.DataFrame(index=pd.Index(dataset_ids, name='dataset_id'), columns=attributes, dtype='object')
+
+        for attribute in attributes:
+            values = self._read_sql('SELECT dataset_id, value FROM attributes WHERE variable = ? AND attribute {:} ? '
+                                    'ORDER BY dataset_id, attribute'.format('LIKE' if '%' in attribute else '='),
+                                    [variable, attribute])
+            if values.empty:
+                continue
+
+            values = values.dropna().groupby('dataset_id').value.agg(sep.join)
+            table[attribute] = values.reindex(table.index)
+
+        return table
+
+    def close(self):
+
+        with self._lock:
+            self._conn.close()
+
+    def _create_session(self):
+        import requests
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self._max_workers, pool_maxsize=self._max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        return session
+
+    def _fetch_info(self, session, dataset_id):
+        """Thread pool worker.  Returns the parsed info page or None if the request failed"""
+        import requests
+
+        url = self.info_url(dataset_id)
+        self._logger.debug('Fetching dataset info: {:}'.format(url))
+        try:
+            r = session.get(url, timeout=self._timeout)
+        except requests.exceptions.RequestException as e:
+            self._logger.error('Failed to fetch {:} info: {:}'.format(dataset_id, e))
+            return
+
+        if r.status_code != 200:
+            self._logger.error('Failed to fetch {:} info: {:} ({:})'.format(dataset_id, r.reason, r.status_code))
+            return
+
+        try:
+            info = pd.read_csv(io.StringIO(r.text), dtype='str', keep_default_na=False)
+        except (ValueError, pd.errors.ParserError) as e:
+            self._logger.error('Failed to parse {:} info: {:}'.format(dataset_id, e))
+            return
+
+        info.rename(columns={col: col.replace(' ', '_').lower() for col in info.columns}, inplace=True)
+
+        missing_columns = [col for col in _info_columns if col not in info.columns]
+        if missing_columns:
+            self._logger.error('{:} info is missing columns: {:}'.format(dataset_id, ', '.join(missing_columns)))
+            return
+
+        return info
+
+    def _store(self, dataset_id, info, completed):
+
+        rows = zip([dataset_id] * info.shape[0],
+                   info.variable_name,
+                   info.attribute_name,
+                   info.data_type,
+                   info.value)
+
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM attributes WHERE dataset_id = ?', [dataset_id])
+            self._conn.executemany('INSERT INTO attributes VALUES (?, ?, ?, ?, ?)', rows)
+            self._conn.execute('INSERT OR REPLACE INTO datasets VALUES (?, ?, ?)',
+                               [dataset_id, time.time(), int(completed)])
+
+    def _execute(self, sql, params=()):
+
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _read_sql(self, sql, params=()):
+
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def __repr__(self):
+        return '<MetadataIndex(db_path={:}, num_datasets={:})>'.format(self._db_path, len(self.dataset_ids))
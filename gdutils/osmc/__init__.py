@@ -212,9 +212,10 @@ class DuoProfilesClient(object):
 
         return profiles
 
-    def get_dataset_profiles(self, datasets):
+    def get_dataset_profiles(self, datasets, gps=False):
         """Fetch the GTS profiles for the specified dataset.  Profiles are searched by wmo ID (platform_code) and
-        dataset start_date and end_date.  Returns a pandas DataFrame"""
+        dataset start_date and end_date.  If gps is True, the latitude and longitude of each profile are included
+        (i.e.: for gdutils.collocation.collocate).  Returns a pandas DataFrame"""
 
         if isinstance(datasets, pd.Series):
             datasets = datasets.to_frame().T
@@ -229,7 +230,8 @@ class DuoProfilesClient(object):
                 self._logger.info('Fetching GTS obs for {:}'.format(dataset_id))
             dataset_profiles = self.get_profiles_by_wmo_id(row['wmo_id'],
                                                            row['start_date'],
-                                                           row['end_date'])
+                                                           row['end_date'],
+                                                           gps=gps)
 
             dataset_profiles['dataset_id'] = dataset_id
 
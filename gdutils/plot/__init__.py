@@ -1,6 +1,8 @@
-import seaborn as sns
-import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
 import logging
+from math import ceil
+from concurrent.futures import ProcessPoolExecutor
 
 logging.getLogger(__file__)
 
@@ -17,20 +19,51 @@ month_labels = ['January',
                 'November',
                 'December']
 
+# Fast mode calendars with more than this many non-empty cells are not annotated
+max_calendar_annotations = 1500
+
+# Maximum number of y tick labels drawn on fast mode calendars
+max_calendar_yticks = 48
+
+# Calendar figure sizes by calendar columns type
+calendar_figsizes = {'day': (11., 8.5),
+                     'month': (8.5, 8.5)}
+
+# Figures reused by each plot_calendars worker process, keyed by figure size
+_worker_figures = {}
+
+
+def plot_calendar(calendar, center=None, fast=False, max_annotations=max_calendar_annotations, **hm_kwargs):
+    """Plot heatmap calendar
+
+    Parameters
+    calendar: year/month, year/month/day or month/day calendar DataFrame
+
+    Options
+    center: value at which to center the colormap
+    fast: draw the calendar as a single pcolormesh, annotating only the non-empty cells, rather than with
+        seaborn.heatmap.  Much faster to draw and save for multi-year year/month/day calendars.  To reuse a figure for
+        a sequence of calendars, clear the axis (ax.cla()) and pass it as ax.
+    max_annotations: in fast mode, annotations are dropped if the calendar has more than max_annotations non-empty
+        cells
+    hm_kwargs: seaborn.heatmap keyword arguments.  In fast mode ax, annot, fmt, annot_kws, linewidths, linecolor, cmap,
+        vmin, vmax and square are supported
+    """
+    # seaborn and matplotlib are only imported when plotting
+    import seaborn as sns
+    import matplotlib.pyplot as plt
 
-def plot_calendar(calendar, center=None, **hm_kwargs):
-    """Plot heatmap calendar"""
     if not calendar.columns.name:
         logging.warning('Unknown calendar columns type')
         return
 
     fontsize = 10.
     if calendar.columns.name == 'day':
-        if 'ax' not in hm_kwargs:
-            _, hm_kwargs['ax'] = plt.subplots(figsize=(11., 8.5))
+        if hm_kwargs.get('ax') is None:
+            _, hm_kwargs['ax'] = plt.subplots(figsize=calendar_figsizes['day'])
     elif calendar.columns.name == 'month':
-        if 'ax' not in hm_kwargs:
-            _, hm_kwargs['ax'] = plt.subplots(figsize=(8.5, 8.5))
+        if hm_kwargs.get('ax') is None:
+            _, hm_kwargs['ax'] = plt.subplots(figsize=calendar_figsizes['month'])
         fontsize = 14.
     else:
         logging.error('Unrecognized calendar columns type: {:}'.format(calendar.columns.name))
@@ -44,6 +77,9 @@ def plot_calendar(calendar, center=None, **hm_kwargs):
                       'annot_kws': {'fontsize': fontsize}}
     heatmap_kwargs.update(hm_kwargs)
 
+    if fast:
+        return _plot_calendar_mesh(calendar, center=center, max_annotations=max_annotations, **heatmap_kwargs)
+
     if center is not None:
         ax = sns.heatmap(calendar, center=center, **heatmap_kwargs)
     else:
@@ -81,3 +117,171 @@ def plot_calendar(calendar, center=None, **hm_kwargs):
 
     return ax
 
+
+def plot_calendars(jobs, dpi=300, max_workers=None):
+    """Render many calendars to image files in parallel worker processes, using the fast plot_calendar mode.  Calendars
+    are sent to the workers as compact numpy arrays rather than pickled DataFrames and each worker reuses its figures.
+
+    Parameters
+    jobs: list of (calendar, title, image path) or (calendar, title, image path, plot_calendar kwargs dict) tuples
+
+    Options
+    dpi: image resolution
+    max_workers: number of processes.  Defaults to the number of CPUs
+
+    Returns a list of the image paths written, in the same order as jobs, with None for failed calendars
+    """
+    if not jobs:
+        return []
+
+    payloads = []
+    for job in jobs:
+        calendar, title, image_path = job[:3]
+        kwargs = job[3] if len(job) > 3 else {}
+        payloads.append((calendar_to_payload(calendar), title, image_path, kwargs or {}))
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_calendar_worker) as executor:
+        image_paths = list(executor.map(_plot_calendar_job, payloads, [dpi] * len(payloads)))
+
+    logging.info('{:}/{:} calendars written'.format(len([p for p in image_paths if p]), len(image_paths)))
+
+    return image_paths
+
+
+def calendar_to_payload(calendar):
+    """Convert a calendar DataFrame to a dict of compact numpy arrays: float32 values and int16 index and columns"""
+    index = calendar.index
+    if isinstance(index, pd.MultiIndex):
+        levels = [index.get_level_values(i).to_numpy(dtype='int16') for i in range(index.nlevels)]
+    else:
+        levels = [index.to_numpy(dtype='int16')]
+
+    return {'values': calendar.to_numpy(dtype='float32'),
+            'index': levels,
+            'index_names': list(index.names),
+            'columns': calendar.columns.to_numpy(dtype='int16'),
+            'columns_name': calendar.columns.name}
+
+
+def payload_to_calendar(payload):
+    """Rebuild the calendar DataFrame from gdutils.plot.calendar_to_payload"""
+    if len(payload['index']) > 1:
+        index = pd.MultiIndex.from_arrays(payload['index'], names=payload['index_names'])
+    else:
+        index = pd.Index(payload['index'][0], name=payload['index_names'][0])
+
+    return pd.DataFrame(payload['values'], index=index,
+                        columns=pd.Index(payload['columns'], name=payload['columns_name']))
+
+
+def _init_calendar_worker():
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _plot_calendar_job(job, dpi):
+    import matplotlib.pyplot as plt
+
+    payload, title, image_path, kwargs = job
+
+    calendar = payload_to_calendar(payload)
+    figsize = calendar_figsizes.get(calendar.columns.name)
+    if not figsize:
+        logging.error('Unrecognized calendar columns type: {:}'.format(calendar.columns.name))
+        return
+
+    if figsize not in _worker_figures:
+        _worker_figures[figsize] = plt.subplots(figsize=figsize)
+    fig, ax = _worker_figures[figsize]
+    ax.cla()
+
+    try:
+        ax = plot_calendar(calendar, fast=True, ax=ax, **kwargs)
+        if ax is None:
+            return
+        ax.set_title(title)
+        fig.savefig(image_path, bbox_inches='tight', dpi=dpi)
+    except (IOError, OSError, ValueError) as e:
+        logging.error('Failed to write {:}: {:}'.format(image_path, e))
+        return
+
+    return image_path
+
+
+def _plot_calendar_mesh(calendar, center=None, max_annotations=max_calendar_annotations, ax=None, annot=True,
+                        fmt='.0f', annot_kws=None, linewidths=0.5, linecolor='white', cmap=None, vmin=None, vmax=None,
+                        square=True, **kwargs):
+    """Fast plot_calendar: one QuadMesh artist and annotations for the non-empty cells only"""
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import Normalize
+
+    if kwargs:
+        logging.debug('Ignoring unsupported fast calendar options: {:}'.format(', '.join(kwargs.keys())))
+
+    values = np.ma.masked_invalid(calendar.to_numpy(dtype='float64'))
+    num_rows, num_cols = values.shape
+
+    # Same default colormaps and normalization as seaborn.heatmap
+    if values.count():
+        vmin = values.min() if vmin is None else vmin
+        vmax = values.max() if vmax is None else vmax
+    if center is not None and vmin is not None:
+        vrange = max(vmax - center, center - vmin)
+        vmin, vmax = center - vrange, center + vrange
+    if cmap is None:
+        cmap = sns.color_palette('icefire' if center is not None else 'rocket', as_cmap=True)
+    elif isinstance(cmap, str):
+        cmap = plt.get_cmap(cmap)
+    norm = Normalize(vmin=vmin, vmax=vmax)
+
+    ax.pcolormesh(values, cmap=cmap, norm=norm, edgecolors=linecolor, linewidth=linewidths)
+
+    ax.set_xlim(0, num_cols)
+    ax.set_ylim(num_rows, 0)
+    if square:
+        ax.set_aspect('equal')
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+
+    # Annotate the non-empty cells, with the text color chosen by cell luminance like seaborn
+    rows, cols = np.nonzero(~np.ma.getmaskarray(values))
+    if annot and rows.size > max_annotations:
+        logging.info('Not annotating calendar with {:} cells (max_annotations={:})'.format(rows.size,
+                                                                                          max_annotations))
+        annot = False
+    if annot and rows.size:
+        cell_values = values.data[rows, cols]
+        rgb = cmap(norm(cell_values))[:, :3]
+        rgb = np.where(rgb <= 0.03928, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+        luminance = rgb.dot([0.2126, 0.7152, 0.0722])
+        text_kws = {'ha': 'center', 'va': 'center'}
+        text_kws.update(annot_kws or {})
+        for r, c, value, lum in zip(rows, cols, cell_values, luminance):
+            ax.text(c + 0.5, r + 0.5, '{:{fmt}}'.format(value, fmt=fmt), color='.15' if lum > .408 else 'w',
+                    **text_kws)
+
+    # x tick labels
+    ax.set_xticks(np.arange(num_cols) + 0.5)
+    if calendar.columns.name == 'month':
+        ax.set_xticklabels([month_labels[int(m) - 1] for m in calendar.columns], rotation=90)
+    else:
+        ax.set_xticklabels([str(c) for c in calendar.columns])
+
+    # y tick labels
+    if calendar.index.names == ['month']:
+        y_labels = [month_labels[int(m) - 1][:3] for m in calendar.index]
+    elif calendar.index.names == ['year', 'month']:
+        y_labels = ['{:} {:}'.format(month_labels[int(m) - 1][0:3], y) for y, m in calendar.index]
+    else:
+        y_labels = [str(y) for y in calendar.index]
+    step = int(ceil(num_rows / float(max_calendar_yticks))) or 1
+    ax.set_yticks(np.arange(0, num_rows, step) + 0.5)
+    ax.set_yticklabels(y_labels[::step], rotation=0)
+
+    ax.tick_params(length=0)
+    ax.set_ylabel('')
+    ax.set_xlabel('')
+
+    return ax
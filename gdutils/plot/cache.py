@@ -0,0 +1,156 @@
+"""Content-addressed cache of ERDDAP images, keyed by the normalized request url and the data set's
+latest_file_mtime"""
+import logging
+import os
+import time
+import shutil
+import hashlib
+import threading
+import pandas as pd
+from urllib.parse import urlsplit, urlunsplit, unquote
+
+
+class ImageCache(object):
+
+    def __init__(self, cache_dir):
+        """Image cache located at cache_dir.  An image is reused as long as the normalized request url and the data
+        set's latest_file_mtime are unchanged."""
+
+        self._logger = logging.getLogger(os.path.basename(__file__))
+
+        self._cache_dir = cache_dir
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self._cache_dir, exist_ok=True)
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def stats(self):
+        """Cache hit and miss counts"""
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses}
+
+    def reset_stats(self):
+
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+
+    def key(self, image_url, latest_file_mtime):
+        """
+        Cache key for the image request
+        :param image_url: ERDDAP image request url
+        :param latest_file_mtime: data set latest_file_mtime
+        :return: sha1 hex digest
+        """
+        mtime = pd.Timestamp(latest_file_mtime)
+        if mtime.tzinfo:
+            mtime = mtime.tz_convert('UTC').tz_localize(None)
+
+        return hashlib.sha1('{:}|{:}'.format(normalize_image_url(image_url), mtime.isoformat()).encode()).hexdigest()
+
+    def get(self, image_url, latest_file_mtime):
+        """
+        Location of the cached image or None if the image is not cached.  Updates the hit and miss counts.
+        :param image_url: ERDDAP image request url
+        :param latest_file_mtime: data set latest_file_mtime
+        :return: cached image path or None
+        """
+        cached_path = self._cached_path(image_url, latest_file_mtime)
+        with self._lock:
+            if os.path.isfile(cached_path):
+                self._hits += 1
+                return cached_path
+
+            self._misses += 1
+
+    def put(self, image_url, latest_file_mtime, image_path):
+        """
+        Add the downloaded image located at image_path to the cache
+        :param image_url: ERDDAP image request url
+        :param latest_file_mtime: data set latest_file_mtime
+        :param image_path: downloaded image
+        :return: cached image path or None if the image could not be added
+        """
+        cached_path = self._cached_path(image_url, latest_file_mtime)
+        try:
+            os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+            link_file(image_path, cached_path)
+        except (IOError, OSError) as e:
+            self._logger.warning('Failed to cache {:}: {:}'.format(image_path, e))
+            return
+
+        return cached_path
+
+    def purge(self, max_age):
+        """
+        Remove images cached more than max_age seconds ago
+        :param max_age: maximum age in seconds
+        :return: number of images removed
+        """
+        cutoff = time.time() - max_age
+        count = 0
+        for root, dirs, files in os.walk(self._cache_dir):
+            for f in files:
+                cached_path = os.path.join(root, f)
+                try:
+                    if os.stat(cached_path).st_mtime < cutoff:
+                        os.remove(cached_path)
+                        count += 1
+                except OSError as e:
+                    self._logger.warning('Failed to remove {:}: {:}'.format(cached_path, e))
+
+        self._logger.info('{:} cached images removed'.format(count))
+
+        return count
+
+    def _cached_path(self, image_url, latest_file_mtime):
+
+        key = self.key(image_url, latest_file_mtime)
+        ext = os.path.splitext(urlsplit(image_url).path)[1]
+
+        return os.path.join(self._cache_dir, key[:2], '{:}{:}'.format(key, ext))
+
+    def __repr__(self):
+        return '<ImageCache(cache_dir={:}, hits={:}, misses={:})>'.format(self._cache_dir, self._hits, self._misses)
+
+
+def normalize_image_url(image_url):
+    """
+    Normalize an ERDDAP image request url so that equivalent requests have the same cache key.  The scheme and host are
+    lower-cased, the query is percent-decoded and the constraints and plot parameters following the variables list are
+    sorted.
+    :param image_url: ERDDAP image request url
+    :return: normalized url
+    """
+    url_pieces = urlsplit(image_url)
+    query = unquote(url_pieces.query).split('&')
+    query = '&'.join(query[:1] + sorted([q for q in query[1:] if q]))
+
+    return urlunsplit((url_pieces.scheme.lower(),
+                       url_pieces.netloc.lower(),
+                       url_pieces.path.rstrip('/'),
+                       query,
+                       ''))
+
+
+def link_file(src, dst):
+    """Atomically hard link (or copy, if linking is not possible) src to dst, replacing dst if it exists"""
+
+    tmp_path = os.path.join(os.path.dirname(dst), '.{:}.{:}.{:}.tmp'.format(os.path.basename(dst),
+                                                                            os.getpid(),
+                                                                            threading.get_ident()))
+    try:
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    finally:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
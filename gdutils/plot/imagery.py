@@ -0,0 +1,157 @@
+"""Map, profile and time-series imagery for DAC data sets, built from a single GdacClient and ErddapPlotter"""
+import logging
+import os
+
+logging.getLogger(__file__)
+
+# Variables plotted for each data set
+default_eovs = ['temperature',
+                'salinity',
+                'density',
+                'conductivity']
+
+
+def build_dataset_image_requests(plotter, dataset_id, dataset_path, eovs=None, hours=24, colorbar='Rainbow2',
+                                 latest_file_mtime=None, inventory=None):
+    """
+    Build the map, latest profiles, latest time-series and synoptic time-series image requests for dataset_id.
+    Images are written to the same locations as scripts/dac/download_recent_dac_imagery.sh:
+
+        dataset_path/imagery/maps
+        dataset_path/imagery/erddap/latest/profiles
+        dataset_path/imagery/erddap/latest/timeseries
+        dataset_path/imagery/erddap/synoptic/timeseries
+
+    :param plotter: gdutils.plot.plotter.ErddapPlotter instance.  The image type is taken from plotter.response
+    :param dataset_id: ERDDAP dataset id
+    :param dataset_path: data set imagery root directory
+    :param eovs: list of variables to plot.  Defaults to gdutils.plot.imagery.default_eovs
+    :param hours: number of hours plotted in the latest profiles and time-series images
+    :param colorbar: any valid ERDDAP plotting colorbar
+    :param latest_file_mtime: data set latest_file_mtime, used as the image cache key
+    :param inventory: gdutils.inventory.VariableInventory.  If specified, eovs the data set does not contain are not
+        requested
+    :return: list of (image url, image path, latest_file_mtime) tuples
+    """
+    eovs = eovs or default_eovs
+    if inventory is not None:
+        available = inventory.filter_variables(dataset_id, eovs)
+        missing = [eov for eov in eovs if eov not in available]
+        if missing:
+            logging.info('Skipping variables not found in {:}: {:}'.format(dataset_id, ', '.join(missing)))
+        eovs = available
+    img_type = plotter.response
+    ext = img_type[-3:].lower()
+
+    imagery_path = os.path.join(dataset_path, 'imagery')
+    maps_path = os.path.join(imagery_path, 'maps')
+    latest_profiles_path = os.path.join(imagery_path, 'erddap', 'latest', 'profiles')
+    latest_ts_path = os.path.join(imagery_path, 'erddap', 'latest', 'timeseries')
+    synoptic_ts_path = os.path.join(imagery_path, 'erddap', 'synoptic', 'timeseries')
+
+    image_requests = []
+
+    # Track map
+    plotter.reset_plot_params()
+    plotter.remove_constraint('time>=')
+    plotter.set_y_range(ascending=False)
+    plotter.set_colorbar(colorbar=colorbar)
+    url = plotter.build_image_request(dataset_id, 'longitude', 'latitude', 'time')
+    if not url:
+        return []
+    image_requests.append((url,
+                           os.path.join(maps_path, '{:}_track_map_{:}.{:}'.format(dataset_id, img_type, ext)),
+                           latest_file_mtime))
+
+    # Latest profiles and time-series
+    plotter.reset_plot_params()
+    plotter.set_colorbar(colorbar=colorbar)
+    plotter.set_y_range(min_val=0)
+    plotter.add_constraint('time>=', 'max(time)-{:}hours'.format(hours))
+    for eov in eovs:
+        url = plotter.build_image_request(dataset_id, eov, 'depth', 'time')
+        image_requests.append((url, os.path.join(latest_profiles_path,
+                                                 '{:}_{:}_profiles_{:}.{:}'.format(dataset_id, eov, img_type, ext)),
+                               latest_file_mtime))
+    for eov in eovs:
+        url = plotter.build_image_request(dataset_id, 'time', 'depth', eov)
+        image_requests.append((url, os.path.join(latest_ts_path,
+                                                 '{:}_{:}_ts_{:}.{:}'.format(dataset_id, eov, img_type, ext)),
+                               latest_file_mtime))
+
+    # Synoptic time-series
+    plotter.remove_constraint('time>=')
+    for eov in eovs:
+        url = plotter.build_image_request(dataset_id, 'time', 'depth', eov)
+        image_requests.append((url, os.path.join(synoptic_ts_path,
+                                                 '{:}_{:}_ts_{:}.{:}'.format(dataset_id, eov, img_type, ext)),
+                               latest_file_mtime))
+
+    plotter.reset_plot_params()
+
+    return image_requests
+
+
+def build_image_requests(client, plotter, dataset_ids, imagery_root, eovs=None, hours=24, colorbar='Rainbow2',
+                         latest_file_mtimes=None, inventory=None):
+    """
+    Build the image requests for all dataset_ids.  Data sets that do not exist on the ERDDAP server or do not have a
+    directory in imagery_root are skipped.
+    :param client: gdutils.GdacClient instance
+    :param plotter: gdutils.plot.plotter.ErddapPlotter instance
+    :param dataset_ids: list of ERDDAP dataset ids
+    :param imagery_root: parent directory containing a directory for each dataset id
+    :param eovs: list of variables to plot.  Defaults to gdutils.plot.imagery.default_eovs
+    :param hours: number of hours plotted in the latest profiles and time-series images
+    :param colorbar: any valid ERDDAP plotting colorbar
+    :param latest_file_mtimes: dict or Series mapping dataset ids to the data set latest_file_mtime, used as the image
+        cache key
+    :param inventory: gdutils.inventory.VariableInventory.  Defaults to client.variable_inventory.  If available, eovs
+        a data set does not contain are not requested
+    :return: list of (image url, image path, latest_file_mtime) tuples
+    """
+    inventory = inventory if inventory is not None else client.variable_inventory
+    latest_file_mtimes = latest_file_mtimes if latest_file_mtimes is not None else {}
+
+    image_requests = []
+    for dataset_id in dataset_ids:
+
+        if not client.check_dataset_exists(dataset_id):
+            logging.warning('Dataset not found on {:}: {:}'.format(client.server, dataset_id))
+            continue
+
+        dataset_path = os.path.join(imagery_root, dataset_id)
+        if not os.path.isdir(dataset_path):
+            logging.warning('Dataset path does not exist: {:}'.format(dataset_path))
+            continue
+
+        image_requests += build_dataset_image_requests(plotter, dataset_id, dataset_path, eovs=eovs, hours=hours,
+                                                       colorbar=colorbar,
+                                                       latest_file_mtime=latest_file_mtimes.get(dataset_id),
+                                                       inventory=inventory)
+
+    return image_requests
+
+
+def download_image_requests(plotter, image_requests, max_workers=8, max_per_server=4, return_content=False):
+    """
+    Download the image requests concurrently with plotter.download_images, creating the image directories as needed.
+    No more than max_per_server requests are sent to the same server at once.
+    :param plotter: gdutils.plot.plotter.ErddapPlotter instance
+    :param image_requests: list of (image url, image path[, latest_file_mtime]) tuples
+    :param max_workers: number of download threads
+    :param max_per_server: maximum number of concurrent requests per server
+    :param return_content: include the downloaded image bytes in the results (i.e.: for
+        gdutils.plot.thumbnails.create_download_thumbnails)
+    :return: list of per-image download status dicts (see ErddapPlotter.download_images)
+    """
+    for image_dir in sorted(set([os.path.dirname(image_request[1]) for image_request in image_requests])):
+        if not os.path.isdir(image_dir):
+            logging.info('Creating image path: {:}'.format(image_dir))
+            try:
+                os.makedirs(image_dir, mode=0o755, exist_ok=True)
+            except OSError as e:
+                logging.error('Error creating {:}: {:}'.format(image_dir, e))
+
+    return plotter.download_images(image_requests, max_workers=max_workers, max_per_server=max_per_server,
+                                   return_content=return_content)
@@ -1,14 +1,30 @@
-from erddapy import ERDDAP
 import pandas as pd
-import requests
 import logging
 import os
-from urllib.parse import quote
+import time
+import threading
+import urllib
+from urllib.parse import quote, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from gdutils.plot.cache import link_file
+
+# ERDDAP Advanced Search results shared by all ErddapPlotter instances, keyed by server url
+_erddap_datasets_cache = {}
+_erddap_datasets_lock = threading.Lock()
 
 
 class ErddapPlotter(object):
 
-    def __init__(self, erddap_url, protocol='tabledap', response='png'):
+    def __init__(self, erddap_url, protocol='tabledap', response='png', datasets=None, client=None, image_cache=None):
+        """ERDDAP image request builder and downloader.
+
+        Dataset ids are validated against the server's Advanced Search results.  These are taken from client (a
+        gdutils.GdacClient instance), datasets (a DataFrame indexed by dataset_id) or, if neither is specified,
+        fetched on first use and shared by all ErddapPlotter instances for the same server.
+
+        If image_cache (a gdutils.plot.cache.ImageCache instance) is specified, downloads that include the data set's
+        latest_file_mtime are served from the cache until the data set changes.
+        """
 
         self._img_types = ['smallPdf',
                            'pdf',
@@ -41,10 +57,19 @@ class ErddapPlotter(object):
 
         self._logger = logging.getLogger(os.path.basename(__file__))
 
+        # Pooled HTTP session used for image downloads, created on first use
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._pool_size = 10
+        self._chunk_size = 1024 * 1024
+        self._timeout = (30, 300)
+        self._image_cache = image_cache
+
+        from erddapy import ERDDAP
         self._e = ERDDAP(self._erddap_url, protocol=self._protocol, response=self._response)
 
-        self._datasets = pd.DataFrame([])
-        self.fetch_erddap_datasets()
+        self._gdac_client = client
+        self._datasets = datasets
 
         self._constraints = {}
         self._plot_parameters = self._default_plot_parameters.copy()
@@ -199,6 +224,12 @@ class ErddapPlotter(object):
 
     @property
     def datasets(self):
+        if self._gdac_client is not None:
+            return self._gdac_client.erddap_datasets
+
+        if self._datasets is None:
+            self.fetch_erddap_datasets()
+
         return self._datasets
 
     @property
@@ -233,31 +264,58 @@ class ErddapPlotter(object):
     def image_url(self):
         return self._image_url
 
+    @property
+    def image_cache(self):
+        return self._image_cache
+
+    @image_cache.setter
+    def image_cache(self, image_cache):
+        self._image_cache = image_cache
+
+    @property
+    def cache_stats(self):
+        """Image cache hit and miss counts"""
+        if not self._image_cache:
+            return {'hits': 0, 'misses': 0}
+
+        return self._image_cache.stats
+
     @property
     def colorbars(self):
         return self._colorbars
 
-    def fetch_erddap_datasets(self):
+    def fetch_erddap_datasets(self, refresh=False):
+        import requests
 
-        try:
+        with _erddap_datasets_lock:
 
-            self._logger.info('Fetching available server datasets: {:}'.format(self._erddap_url))
-            url = self._e.get_search_url(response='csv')
+            if not refresh and self._erddap_url in _erddap_datasets_cache:
+                self._datasets = _erddap_datasets_cache[self._erddap_url]
+                return
+
+            url = self._e.get_search_url(response='csv', items_per_page=1e6)
             self._last_request = url
 
-            self._logger.debug('Server info: {:}'.format(self._last_request))
-            self._datasets = pd.read_csv(url)
+            try:
 
-            # rename columns more friendly
-            columns = {s: s.replace(' ', '_').lower() for s in self._datasets.columns}
-            self._datasets.rename(columns=columns, inplace=True)
+                self._logger.info('Fetching available server datasets: {:}'.format(self._erddap_url))
+                self._logger.debug('Server info: {:}'.format(self._last_request))
+                datasets = pd.read_csv(url)
 
-            # Use dataset_id as the index
-            self._datasets.set_index('dataset_id', inplace=True)
+                # rename columns more friendly
+                columns = {s: s.replace(' ', '_').lower() for s in datasets.columns}
+                datasets.rename(columns=columns, inplace=True)
 
-        except requests.exceptions.HTTPError as e:
-            self._logger.error('Failed to fetch/parse ERDDAP server datasets info: {:} ({:})'.format(url, e))
-            return
+                # Use dataset_id as the index
+                datasets.set_index('dataset_id', inplace=True)
+
+            except (requests.exceptions.HTTPError, urllib.error.URLError) as e:
+                self._logger.error('Failed to fetch/parse ERDDAP server datasets info: {:} ({:})'.format(url, e))
+                self._datasets = pd.DataFrame([])
+                return
+
+            _erddap_datasets_cache[self._erddap_url] = datasets
+            self._datasets = datasets
 
     def set_bg_color(self, color='white'):
         #   .bgColor:   value (0xAARRGGBB)
@@ -458,7 +516,7 @@ class ErddapPlotter(object):
 
     def build_image_request(self, dataset_id, x, y, c=None):
 
-        if dataset_id not in self._datasets.index:
+        if dataset_id not in self.datasets.index:
             self._logger.error('Dataset ID {:} does not exist'.format(dataset_id))
             return
 
@@ -489,27 +547,184 @@ class ErddapPlotter(object):
 
         return self._image_url
 
-    def download_image(self, image_url, image_path):
+    def download_image(self, image_url, image_path, latest_file_mtime=None):
+
+        result = self._fetch_image(image_url, image_path, latest_file_mtime=latest_file_mtime)
+        if not result['success']:
+            return
+
+        return image_path
+
+    def download_images(self, image_requests, max_workers=8, max_per_server=4, return_content=False):
+        """
+        Download many images concurrently using a pooled HTTP session.  Each image is written to a temporary file and
+        renamed to its destination once complete.
+
+        :param image_requests: list of (image url, image path) or (image url, image path, latest_file_mtime) tuples.
+            Images with a latest_file_mtime are served from the image cache, if set, until the data set changes
+        :param max_workers: number of download threads
+        :param max_per_server: maximum number of concurrent requests sent to the same server
+        :param return_content: if True, the downloaded image bytes are included in the results as content.  content is
+            None for cached and failed downloads
+        :return: list of dicts, in the same order as image_requests, containing the url, path, success, cached,
+            status_code, reason, bytes and elapsed (seconds) of each download.  Requests that raise an error are
+            returned as failed downloads with the error as the reason
+        """
+        if not image_requests:
+            return []
+
+        server_slots = {}
+        for image_request in image_requests:
+            server_slots.setdefault(urlsplit(image_request[0]).netloc, threading.BoundedSemaphore(max_per_server))
+
+        # Grow the connection pool so that no download thread waits for, or discards, a connection
+        self._get_session(pool_size=max_workers)
+
+        def download(image_request):
+            image_url, image_path = image_request[:2]
+            latest_file_mtime = image_request[2] if len(image_request) > 2 else None
+            with server_slots[urlsplit(image_url).netloc]:
+                try:
+                    return self._fetch_image(image_url, image_path, latest_file_mtime=latest_file_mtime,
+                                             return_content=return_content)
+                except Exception as e:
+                    # One bad request (i.e.: an unparseable latest_file_mtime) must not abort the other downloads
+                    self._logger.error('Failed to fetch {:}: {:}'.format(image_path, e))
+                    result = self._new_download_result(image_url, image_path)
+                    result['reason'] = str(e)
+                    return result
+
+        t0 = time.time()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(download, image_requests))
+
+        num_downloaded = len([result for result in results if result['success'] and not result['cached']])
+        num_cached = len([result for result in results if result['cached']])
+        self._logger.info('{:}/{:} images downloaded, {:} cached in {:0.1f} seconds'.format(num_downloaded,
+                                                                                           len(results),
+                                                                                           num_cached,
+                                                                                           time.time() - t0))
+
+        return results
+
+    def _get_session(self, pool_size=0):
+        """Pooled requests.Session.  The adapters are remounted with a larger pool if pool_size exceeds the current
+        pool size"""
+        import requests
+
+        with self._session_lock:
+            grow = pool_size > self._pool_size
+            self._pool_size = max(self._pool_size, pool_size)
+
+            if not self._session:
+                self._session = requests.Session()
+            elif not grow:
+                return self._session
+
+            adapter = requests.adapters.HTTPAdapter(pool_connections=self._pool_size, pool_maxsize=self._pool_size)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+
+            return self._session
+
+    def _fetch_image(self, image_url, image_path, latest_file_mtime=None, return_content=False):
+
+        if not self._image_cache or latest_file_mtime is None or pd.isnull(latest_file_mtime):
+            return self._download_image(image_url, image_path, return_content=return_content)
+
+        t0 = time.time()
+        cached_path = self._image_cache.get(image_url, latest_file_mtime)
+        if cached_path:
+            result = self._new_download_result(image_url, image_path)
+            result['cached'] = True
+            try:
+                # Nothing to do if the image is already the cached copy
+                if not os.path.isfile(image_path) or not os.path.samefile(cached_path, image_path):
+                    link_file(cached_path, image_path)
+                result['success'] = True
+                result['bytes'] = os.path.getsize(image_path)
+                self._logger.debug('Using cached image: {:}'.format(image_path))
+            except (IOError, OSError) as e:
+                self._logger.error('Failed to copy cached image to {:}: {:}'.format(image_path, e))
+                result['reason'] = str(e)
+            result['elapsed'] = time.time() - t0
+            return result
+
+        result = self._download_image(image_url, image_path, return_content=return_content)
+        if result['success']:
+            self._image_cache.put(image_url, latest_file_mtime, image_path)
+
+        return result
+
+    @staticmethod
+    def _new_download_result(image_url, image_path):
+
+        return {'url': image_url,
+                'path': image_path,
+                'success': False,
+                'cached': False,
+                'status_code': None,
+                'reason': '',
+                'bytes': 0,
+                'elapsed': 0.,
+                'content': None}
+
+    def _download_image(self, image_url, image_path, return_content=False):
+        import requests
+
+        result = self._new_download_result(image_url, image_path)
+        chunks = []
 
         image_dir = os.path.dirname(image_path)
         if not os.path.isdir(image_dir):
             self._logger.error('Invalid image destination specified: {:}'.format(image_dir))
-            return
+            result['reason'] = 'Invalid image destination'
+            return result
 
         self._logger.debug('Image url: {:}'.format(image_url))
 
         self._logger.info('Fetching and writing image: {:}'.format(image_path))
-        r = requests.get(image_url, stream=True)
-        if r.status_code != 200:
-            self._logger.error('{:} (code={:}'.format(r.reason, r.status_code))
-            return
-        with open(image_path, 'wb') as f:
-            for chunk in r.iter_content():
-                f.write(chunk)
-
-            return image_path
+        t0 = time.time()
+        tmp_path = os.path.join(image_dir, '.{:}.{:}.{:}.tmp'.format(os.path.basename(image_path),
+                                                                     os.getpid(),
+                                                                     threading.get_ident()))
+        try:
+            with self._get_session().get(image_url, stream=True, timeout=self._timeout) as r:
+                result['status_code'] = r.status_code
+                result['reason'] = r.reason
+                if r.status_code != 200:
+                    self._logger.error('{:} (code={:}'.format(r.reason, r.status_code))
+                    return result
+
+                with open(tmp_path, 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=self._chunk_size):
+                        f.write(chunk)
+                        result['bytes'] += len(chunk)
+                        if return_content:
+                            chunks.append(chunk)
+
+            os.replace(tmp_path, image_path)
+            result['success'] = True
+            if return_content:
+                result['content'] = b''.join(chunks)
+
+        except (requests.exceptions.RequestException, IOError, OSError) as e:
+            self._logger.error('Failed to download {:}: {:}'.format(image_path, e))
+            result['reason'] = str(e)
+        finally:
+            result['elapsed'] = time.time() - t0
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+
+        return result
 
     def __repr__(self):
+        num_datasets = 0
+        if self._gdac_client is not None:
+            num_datasets = len(self._gdac_client.erddap_datasets)
+        elif self._datasets is not None:
+            num_datasets = len(self._datasets)
+
         return '<ErddapPlotter(server={:}, response={:}, num_datasets={:})>'.format(self._e.server,
                                                                                     self._e.response,
-                                                                                    len(self._datasets))
+                                                                                    num_datasets)
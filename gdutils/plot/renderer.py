@@ -0,0 +1,382 @@
+"""Local matplotlib rendering of the ERDDAP time-series and profile plots from GdacClient.get_dataset_time_series
+data.  Plots are configured with the same graph parameters used by gdutils.plot.plotter.ErddapPlotter"""
+import logging
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+logging.getLogger(__file__)
+
+# Default ERDDAP graph parameters (ErddapPlotter.plot_parameters)
+default_plot_parameters = {'.bgColor=': '0xFFFFFF',
+                           '.color=': '0x000000',
+                           '.colorBar=': 'Rainbow2|C|Linear|||',
+                           '.draw=': 'markers',
+                           '.legend=': 'Bottom',
+                           '.marker=': '6|5',
+                           '.xRange=': '||true|Linear',
+                           '.yRange=': '||false|Linear'}
+
+# ERDDAP colorbars mapped to matplotlib colormaps.  Colorbars without a matplotlib equivalent are built from their
+# color stops.  The KT_ colorbars are the cmocean colormaps.
+colorbar_cmaps = {'BlackBlueWhite': ['#000000', '#0000ff', '#ffffff'],
+                  'BlackGreenWhite': ['#000000', '#00ff00', '#ffffff'],
+                  'BlackRedWhite': ['#000000', '#ff0000', '#ffffff'],
+                  'BlackWhite': 'gray',
+                  'BlueWhiteRed': 'bwr',
+                  'BlueWideWhiteRed': ['#0000ff', '#ffffff', '#ffffff', '#ff0000'],
+                  'LightRainbow': ['#9999ff', '#99ffff', '#99ff99', '#ffff99', '#ff9999'],
+                  'Ocean': 'ocean',
+                  'OceanDepth': 'ocean_r',
+                  'Rainbow': 'rainbow',
+                  'Rainbow2': 'jet',
+                  'Rainfall': ['#ffffff', '#99ccff', '#0000ff', '#00ff00', '#ffff00', '#ff0000'],
+                  'ReverseRainbow': 'rainbow_r',
+                  'RedWhiteBlue': 'bwr_r',
+                  'RedWhiteBlue2': 'RdBu',
+                  'RedWideWhiteBlue': ['#ff0000', '#ffffff', '#ffffff', '#0000ff'],
+                  'Spectrum': 'Spectral_r',
+                  'Topography': 'terrain',
+                  'TopographyDepth': 'terrain_r',
+                  'WhiteBlueBlack': ['#ffffff', '#0000ff', '#000000'],
+                  'WhiteGreenBlack': ['#ffffff', '#00ff00', '#000000'],
+                  'WhiteRedBlack': ['#ffffff', '#ff0000', '#000000'],
+                  'WhiteBlack': 'gray_r',
+                  'YellowRed': 'YlOrRd'}
+
+# ERDDAP marker types (index of the .marker graph parameter) mapped to (matplotlib marker, filled)
+marker_styles = [('', True),
+                 ('+', True),
+                 ('x', True),
+                 ('.', True),
+                 ('s', False),
+                 ('s', True),
+                 ('o', False),
+                 ('o', True),
+                 ('^', False),
+                 ('^', True)]
+
+# Approximate ERDDAP image sizes in pixels
+image_sizes = {'smallPng': (480, 360),
+               'png': (640, 480),
+               'largePng': (1080, 810),
+               'transparentPng': (640, 480),
+               'smallPdf': (480, 360),
+               'pdf': (640, 480),
+               'largePdf': (1080, 810)}
+
+# Axis names that refer to the data time index
+time_names = ['time', 'precise_time']
+
+# Columns of the worker process data payload
+_worker_data = {}
+
+
+def data_to_payload(data):
+    """
+    Convert GdacClient.get_dataset_time_series data (indexed by precise_time) to a dict of numpy arrays.  The time index
+    is stored as datetime64 under time and the remaining columns as float64.
+
+    :param data: DataFrame indexed by precise_time
+    :return: dict mapping column names to numpy arrays
+    """
+    times = pd.to_datetime(data.index, utc=True, errors='coerce').tz_convert(None)
+
+    payload = {'time': times.to_numpy(dtype='datetime64[ns]')}
+    for column in data.columns:
+        payload[column] = pd.to_numeric(data[column], errors='coerce').to_numpy(dtype='float64')
+
+    return payload
+
+
+def parse_plot_parameters(plot_parameters=None):
+    """
+    Parse the ERDDAP graph parameters (i.e.: ErddapPlotter.plot_parameters) into matplotlib plotting options
+
+    :param plot_parameters: dict of ERDDAP graph parameters.  Missing parameters take the ErddapPlotter defaults
+    :return: dict of plotting options
+    """
+    params = default_plot_parameters.copy()
+    params.update(plot_parameters or {})
+
+    colorbar = (params['.colorBar='].split('|') + [''] * 6)[:6]
+    marker = (params['.marker='].split('|') + [''] * 2)[:2]
+
+    options = {'bg_color': _parse_color(params['.bgColor=']),
+               'color': _parse_color(params['.color=']),
+               'colorbar': colorbar[0] or 'Rainbow2',
+               'continuous': colorbar[1] != 'D',
+               'color_scale': colorbar[2] or 'Linear',
+               'vmin': _parse_limit(colorbar[3]),
+               'vmax': _parse_limit(colorbar[4]),
+               'num_sections': int(_parse_float(colorbar[5]) or 0),
+               'draw': params['.draw='],
+               'legend': params['.legend='],
+               'marker': marker_styles[int(_parse_float(marker[0]) or 0) % len(marker_styles)],
+               'marker_size': _parse_float(marker[1]) or 5.,
+               'x_range': _parse_range(params['.xRange=']),
+               'y_range': _parse_range(params['.yRange='])}
+
+    return options
+
+
+def colorbar_to_cmap(colorbar, num_sections=0):
+    """
+    matplotlib colormap for the ERDDAP colorbar name
+
+    :param colorbar: ERDDAP colorbar name
+    :param num_sections: number of discrete colors.  0 for a continuous colormap
+    :return: matplotlib colormap
+    """
+    import matplotlib
+    from matplotlib.colors import LinearSegmentedColormap
+
+    if colorbar.startswith('KT_'):
+        import cmocean
+        cmap = getattr(cmocean.cm, colorbar[3:], None)
+        if cmap is None:
+            logging.warning('Unknown cmocean colorbar {:}: using jet'.format(colorbar))
+            cmap = matplotlib.colormaps['jet']
+    else:
+        cmap = colorbar_cmaps.get(colorbar, 'jet')
+        if isinstance(cmap, list):
+            cmap = LinearSegmentedColormap.from_list(colorbar, cmap)
+        else:
+            cmap = matplotlib.colormaps[cmap]
+
+    if num_sections:
+        cmap = cmap.resampled(num_sections)
+
+    return cmap
+
+
+def render_image(data, x, y, color, image_path, plot_parameters=None, img_type='largePng', title=None):
+    """
+    Render an ERDDAP style scatter plot of the x, y and color variables in data to image_path.  Equivalent to the image
+    returned by ErddapPlotter.build_image_request(dataset_id, x, y, color) with the same plot_parameters.
+
+    :param data: GdacClient.get_dataset_time_series DataFrame or gdutils.plot.renderer.data_to_payload dict
+    :param x: x-axis variable (time, precise_time or a data column)
+    :param y: y-axis variable
+    :param color: color variable or None
+    :param image_path: image destination
+    :param plot_parameters: dict of ERDDAP graph parameters (i.e.: ErddapPlotter.plot_parameters)
+    :param img_type: ERDDAP image type used to size the image
+    :param title: plot title
+    :return: image_path or None if the plot could not be rendered
+    """
+    if isinstance(data, pd.DataFrame):
+        data = data_to_payload(data)
+
+    # Figures are created without pyplot so that rendering neither changes the current backend nor leaks figures
+    from matplotlib.figure import Figure
+
+    options = parse_plot_parameters(plot_parameters)
+
+    try:
+        x_values = _axis_values(data, x)
+        y_values = _axis_values(data, y)
+        c_values = _axis_values(data, color) if color else None
+    except KeyError as e:
+        logging.error('Variable not found in data: {:}'.format(e))
+        return
+
+    width, height = image_sizes.get(img_type, image_sizes['largePng'])
+    fig = Figure(figsize=(width / 100., height / 100.), dpi=100)
+    ax = fig.subplots()
+    fig.patch.set_facecolor(options['bg_color'])
+
+    try:
+        marker, filled = options['marker']
+        kwargs = {'marker': marker or 'o',
+                  's': options['marker_size'] ** 2}
+
+        if c_values is not None:
+            cmap = colorbar_to_cmap(options['colorbar'],
+                                    num_sections=0 if options['continuous'] else options['num_sections'] or 10)
+            norm = _color_norm(c_values, options)
+            if not filled:
+                kwargs['facecolors'] = 'none'
+                kwargs['edgecolors'] = cmap(norm(c_values))
+                sc = ax.scatter(x_values, y_values, **kwargs)
+                sc.set_cmap(cmap)
+                sc.set_norm(norm)
+            else:
+                sc = ax.scatter(x_values, y_values, c=c_values, cmap=cmap, norm=norm, linewidths=0, **kwargs)
+            if options['legend'] != 'Off':
+                cb = fig.colorbar(sc, ax=ax, orientation='horizontal', pad=0.1, aspect=50)
+                cb.set_label(color)
+                if color in time_names:
+                    _format_date_axis(cb.ax.xaxis)
+        elif options['draw'] in ['lines', 'linesAndMarkers']:
+            ax.plot(x_values, y_values, color=options['color'],
+                    marker=marker if options['draw'] == 'linesAndMarkers' else None)
+        else:
+            ax.scatter(x_values, y_values, color=options['color'], **kwargs)
+
+        _set_axis_range(ax, 'x', x_values, options['x_range'])
+        _set_axis_range(ax, 'y', y_values, options['y_range'])
+        if x in time_names:
+            _format_date_axis(ax.xaxis)
+        if y in time_names:
+            _format_date_axis(ax.yaxis)
+
+        ax.set_xlabel(x)
+        ax.set_ylabel(y)
+        if title:
+            ax.set_title(title)
+        ax.grid(True, linestyle=':')
+
+        fig.savefig(image_path, format=img_type[-3:].lower(), facecolor=fig.get_facecolor(),
+                    transparent=img_type == 'transparentPng')
+    except (IOError, OSError, ValueError) as e:
+        logging.error('Failed to render {:}: {:}'.format(image_path, e))
+        return
+
+    return image_path
+
+
+def render_time_series(data, variable, image_path, plot_parameters=None, img_type='largePng', title=None):
+    """Render the time/depth scatter plot of variable.  See gdutils.plot.renderer.render_image"""
+
+    return render_image(data, 'time', 'depth', variable, image_path, plot_parameters=plot_parameters,
+                        img_type=img_type, title=title)
+
+
+def render_profiles(data, variable, image_path, plot_parameters=None, img_type='largePng', title=None):
+    """Render the variable profiles, colored by time.  See gdutils.plot.renderer.render_image"""
+
+    return render_image(data, variable, 'depth', 'time', image_path, plot_parameters=plot_parameters,
+                        img_type=img_type, title=title)
+
+
+def render_images(data, render_requests, img_type='largePng', max_workers=None):
+    """
+    Render many plots of the same data in a pool of max_workers processes using the Agg backend.  The data is converted
+    to numpy arrays and sent once to each worker process rather than with every request.
+
+    :param data: GdacClient.get_dataset_time_series DataFrame
+    :param render_requests: list of (x, y, color, image path) or (x, y, color, image path, plot_parameters) tuples
+    :param img_type: ERDDAP image type used to size the images
+    :param max_workers: number of processes.  Defaults to the number of CPUs
+    :return: list of rendered image paths, in the same order as render_requests, with None for failed plots
+    """
+    if not render_requests:
+        return []
+
+    if data.empty:
+        logging.warning('No data to render')
+        return [None] * len(render_requests)
+
+    payload = data_to_payload(data)
+    render_requests = [tuple(r) + (None,) * (5 - len(r)) for r in render_requests]
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(payload,)) as executor:
+        image_paths = list(executor.map(_render_request, render_requests, [img_type] * len(render_requests)))
+
+    logging.info('{:}/{:} images rendered'.format(len([p for p in image_paths if p]), len(image_paths)))
+
+    return image_paths
+
+
+def _init_worker(payload):
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+    _worker_data.clear()
+    _worker_data.update(payload)
+
+
+def _render_request(render_request, img_type):
+
+    x, y, color, image_path, plot_parameters = render_request
+
+    return render_image(_worker_data, x, y, color, image_path, plot_parameters=plot_parameters, img_type=img_type)
+
+
+def _axis_values(data, name):
+
+    if name in time_names:
+        import matplotlib.dates as mdates
+        return mdates.date2num(data['time'])
+
+    return data[name]
+
+
+def _color_norm(values, options):
+
+    from matplotlib.colors import Normalize, LogNorm
+
+    vmin = options['vmin'] if options['vmin'] is not None else np.nanmin(values)
+    vmax = options['vmax'] if options['vmax'] is not None else np.nanmax(values)
+    if options['color_scale'] == 'Log':
+        vmin = vmin if vmin > 0 else np.nanmin(values[values > 0]) if (values > 0).any() else 1.
+        return LogNorm(vmin=vmin, vmax=vmax)
+
+    return Normalize(vmin=vmin, vmax=vmax)
+
+
+def _set_axis_range(ax, axis, values, axis_range):
+
+    min_val, max_val, ascending, scale = axis_range
+
+    if scale == 'Log':
+        getattr(ax, 'set_{:}scale'.format(axis))('log')
+
+    if min_val is not None or max_val is not None:
+        lim_min, lim_max = getattr(ax, 'get_{:}lim'.format(axis))()
+        getattr(ax, 'set_{:}lim'.format(axis))(min_val if min_val is not None else lim_min,
+                                               max_val if max_val is not None else lim_max)
+
+    if not ascending:
+        getattr(ax, 'invert_{:}axis'.format(axis))()
+
+
+def _format_date_axis(axis):
+
+    import matplotlib.dates as mdates
+
+    locator = mdates.AutoDateLocator()
+    axis.set_major_locator(locator)
+    axis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+
+def _parse_range(axis_range):
+
+    min_val, max_val, ascending, scale = (axis_range.split('|') + [''] * 4)[:4]
+
+    return _parse_limit(min_val), _parse_limit(max_val), ascending != 'false', scale or 'Linear'
+
+
+def _parse_color(color):
+
+    # 0xRRGGBB or 0xAARRGGBB
+    color = color.lower().replace('0x', '')[-6:]
+
+    return '#{:}'.format(color.rjust(6, '0'))
+
+
+def _parse_limit(value):
+
+    # Numeric or ISO-8601 time limits
+    limit = _parse_float(value)
+    if limit is None and value:
+        import matplotlib.dates as mdates
+        try:
+            timestamp = pd.Timestamp(value)
+        except ValueError:
+            return None
+        if timestamp.tzinfo:
+            timestamp = timestamp.tz_convert(None)
+        limit = mdates.date2num(timestamp)
+
+    return limit
+
+
+def _parse_float(value):
+
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,169 @@
+"""Thumbnails of ERDDAP imagery, created with Pillow in a process pool.  Replaces scripts/dac/create_thumbnails.sh"""
+import logging
+import os
+import io
+import glob
+import fnmatch
+from concurrent.futures import ProcessPoolExecutor
+
+logging.getLogger(__file__)
+
+# Images that get a thumbnail
+thumbnail_pattern = '*_largePng.png'
+
+# Maximum thumbnail width and height
+thumbnail_size = (200, 200)
+
+
+def thumbnail_path(image_path, thumb_dir=None):
+    """
+    Thumbnail location for image_path.  The trailing image type is replaced with tn (i.e.: ru29-20200908T1623_track_map_
+    largePng.png -> ru29-20200908T1623_track_map_tn.png).
+
+    :param image_path: source image
+    :param thumb_dir: thumbnail directory.  Defaults to the directory containing image_path
+    :return: thumbnail path
+    """
+    image_dir, image_name = os.path.split(image_path)
+    img_name, ext = os.path.splitext(image_name)
+    if img_name.endswith('largePng'):
+        thumb_name = '{:}tn.png'.format(img_name[:-8])
+    else:
+        thumb_name = '{:}_tn.png'.format(img_name)
+
+    return os.path.join(thumb_dir or image_dir, thumb_name)
+
+
+def thumbnail_is_stale(image_path, thumb_path):
+    """True if thumb_path does not exist or is older than image_path"""
+    if not os.path.isfile(thumb_path):
+        return True
+
+    return os.path.getmtime(image_path) > os.path.getmtime(thumb_path)
+
+
+def find_thumbnail_images(image_dir, pattern=thumbnail_pattern):
+    """Recursively find the images in image_dir matching pattern"""
+
+    return sorted(glob.glob(os.path.join(image_dir, '**', pattern), recursive=True))
+
+
+def create_thumbnails(images, thumb_dir=None, size=thumbnail_size, max_workers=None, force=False):
+    """
+    Create thumbnails for images using a pool of max_workers processes.  Thumbnails are only created if they do not
+    exist or are older than the source image, unless force is True.
+
+    Each element of images is either an image path or an (image path, image bytes) tuple.  Thumbnails for the latter
+    are created from the in-memory bytes and are always (re)created, since the bytes are assumed to be a new download.
+
+    :param images: list of image paths or (image path, image bytes) tuples
+    :param thumb_dir: thumbnail directory.  Defaults to the directory containing each image
+    :param size: (width, height) maximum thumbnail size
+    :param max_workers: number of processes.  Defaults to the number of CPUs
+    :param force: create all thumbnails, even if they are up to date
+    :return: list of thumbnail paths created
+    """
+    thumbnail_requests = []
+    for image in images:
+        image_path, content = image if isinstance(image, (tuple, list)) else (image, None)
+
+        thumb_path = thumbnail_path(image_path, thumb_dir=thumb_dir)
+        if content is None:
+            if not os.path.isfile(image_path):
+                logging.warning('Image does not exist: {:}'.format(image_path))
+                continue
+            if not force and not thumbnail_is_stale(image_path, thumb_path):
+                logging.debug('Thumbnail is up to date: {:}'.format(thumb_path))
+                continue
+
+        thumbnail_requests.append((image_path, thumb_path, content))
+
+    if not thumbnail_requests:
+        logging.info('No thumbnails to create')
+        return []
+
+    logging.info('Creating {:} thumbnails'.format(len(thumbnail_requests)))
+    if len(thumbnail_requests) == 1:
+        results = [_create_thumbnail(thumbnail_requests[0], size)]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_create_thumbnail, thumbnail_requests, [size] * len(thumbnail_requests)))
+
+    thumb_paths = []
+    for (image_path, thumb_path, content), reason in zip(thumbnail_requests, results):
+        if reason:
+            logging.error('Failed to create thumbnail for {:}: {:}'.format(image_path, reason))
+            continue
+        thumb_paths.append(thumb_path)
+
+    return thumb_paths
+
+
+def create_directory_thumbnails(image_dir, pattern=thumbnail_pattern, size=thumbnail_size, max_workers=None,
+                                force=False):
+    """
+    Create thumbnails, in image_dir, for all images in image_dir and its subdirectories matching pattern.  Equivalent
+    to scripts/dac/create_thumbnails.sh image_dir.
+
+    :param image_dir: image directory
+    :param pattern: image file name pattern
+    :param size: (width, height) maximum thumbnail size
+    :param max_workers: number of processes.  Defaults to the number of CPUs
+    :param force: create all thumbnails, even if they are up to date
+    :return: list of thumbnail paths created
+    """
+    if not os.path.isdir(image_dir):
+        logging.error('Invalid image directory specified: {:}'.format(image_dir))
+        return []
+
+    image_paths = find_thumbnail_images(image_dir, pattern=pattern)
+    if not image_paths:
+        logging.warning('No {:} images found in {:}'.format(pattern, image_dir))
+        return []
+
+    return create_thumbnails(image_paths, thumb_dir=image_dir, size=size, max_workers=max_workers, force=force)
+
+
+def create_download_thumbnails(download_results, pattern=thumbnail_pattern, size=thumbnail_size, max_workers=None):
+    """
+    Create thumbnails for the successful ErddapPlotter.download_images results whose path matches pattern.  Images
+    downloaded with return_content=True are thumbnailed from the in-memory bytes rather than read back from disk.
+
+    :param download_results: list of ErddapPlotter.download_images results
+    :param pattern: image file name pattern
+    :param size: (width, height) maximum thumbnail size
+    :param max_workers: number of processes.  Defaults to the number of CPUs
+    :return: list of thumbnail paths created
+    """
+    images = []
+    for result in download_results:
+        if not result['success'] or not fnmatch.fnmatch(os.path.basename(result['path']), pattern):
+            continue
+
+        if result.get('content') is not None:
+            images.append((result['path'], result['content']))
+        else:
+            images.append(result['path'])
+
+    return create_thumbnails(images, size=size, max_workers=max_workers)
+
+
+def _create_thumbnail(thumbnail_request, size):
+    """Process pool worker.  Returns an error message or None if the thumbnail was created"""
+
+    from PIL import Image
+
+    image_path, thumb_path, content = thumbnail_request
+
+    tmp_path = os.path.join(os.path.dirname(thumb_path), '.{:}.{:}.tmp'.format(os.path.basename(thumb_path),
+                                                                               os.getpid()))
+    try:
+        with Image.open(io.BytesIO(content) if content is not None else image_path) as img:
+            img.thumbnail(size)
+            img.save(tmp_path, format='PNG')
+        os.replace(tmp_path, thumb_path)
+    except (IOError, OSError, ValueError) as e:
+        return str(e)
+    finally:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,209 @@
+"""Tag profile positions with the regions (i.e.: EEZs, sanctuaries, IOOS regional association boundaries) they fall in.
+Positions are binned into grid cells and the occupied cells are matched to the regions with one bulk STRtree query.
+Positions in cells within a region are tagged without further tests and only positions in cells crossing a region
+boundary are tested against the prepared region geometry.  The in-region profiles of each data set are grouped into
+visits with entry and exit times and profile counts."""
+import logging
+import os
+import json
+import numpy as np
+import pandas as pd
+
+logging.getLogger(__file__)
+
+visit_columns = ['dataset_id',
+                 'region',
+                 'visit',
+                 'entry_time',
+                 'exit_time',
+                 'num_profiles']
+
+
+class RegionIndex(object):
+
+    def __init__(self, geometries, names=None, cell_size=1.):
+        """STRtree of prepared region geometries.
+
+        :param geometries: list of shapely (multi)polygons or dictionary mapping region names to geometries
+        :param names: list of region names.  Defaults to the dictionary keys or the geometry positions
+        :param cell_size: size, in degrees, of the grid cells positions are binned into
+        """
+        import shapely
+        from shapely import STRtree
+
+        self._logger = logging.getLogger(os.path.basename(__file__))
+
+        if isinstance(geometries, dict):
+            names = list(geometries.keys())
+            geometries = list(geometries.values())
+
+        self._names = np.asarray(names if names is not None else range(len(geometries)), dtype='object')
+        if self._names.size != len(geometries):
+            raise ValueError('names and geometries must be the same length')
+
+        self._geometries = np.asarray(geometries, dtype='object')
+        shapely.prepare(self._geometries)
+
+        self._tree = STRtree(self._geometries)
+
+        self._cell_size = cell_size
+        self._num_columns = int(np.ceil(360. / cell_size))
+
+    @classmethod
+    def from_geojson(cls, geojson, name_property='name'):
+        """
+        Create the index from a GeoJSON FeatureCollection
+
+        :param geojson: GeoJSON file or FeatureCollection dictionary
+        :param name_property: feature property containing the region name.  The feature id, or the feature position,
+            is used for features without it
+        :return: RegionIndex
+        """
+        from shapely.geometry import shape
+
+        if isinstance(geojson, str):
+            with open(geojson, 'r') as fid:
+                geojson = json.load(fid)
+
+        features = geojson.get('features', [geojson] if geojson.get('type') == 'Feature' else [])
+
+        names = []
+        geometries = []
+        for i, feature in enumerate(features):
+            if not feature.get('geometry'):
+                logging.warning('Skipping feature {:}: no geometry'.format(i))
+                continue
+            names.append((feature.get('properties') or {}).get(name_property, feature.get('id', i)))
+            geometries.append(shape(feature['geometry']))
+
+        return cls(geometries, names=names)
+
+    @property
+    def names(self):
+        return self._names.tolist()
+
+    @property
+    def geometries(self):
+        return self._geometries.tolist()
+
+    def tag(self, positions, longitude_column='longitude', latitude_column='latitude'):
+        """
+        Regions containing each position.  Positions on a region boundary are included.
+
+        :param positions: DataFrame containing longitude and latitude columns
+        :param longitude_column: name of the longitude column
+        :param latitude_column: name of the latitude column
+        :return: DataFrame containing the row position of each tagged position and the region name.  Positions inside
+            several overlapping regions appear once for each region
+        """
+        import shapely
+
+        longitudes = positions[longitude_column].to_numpy(dtype='float64')
+        latitudes = positions[latitude_column].to_numpy(dtype='float64')
+        valid = np.flatnonzero(np.isfinite(longitudes) & np.isfinite(latitudes))
+        # Longitudes outside of [-180, 180] are wrapped
+        x = longitudes[valid]
+        x = np.where((x >= -180.) & (x <= 180.), x, (x + 180.) % 360. - 180.)
+        y = latitudes[valid]
+
+        # Group the positions by grid cell
+        cells = self._cell_ids(x, y)
+        order = np.argsort(cells, kind='stable')
+        cell_ids, starts = np.unique(cells[order], return_index=True)
+        ends = np.append(starts[1:], order.size)
+
+        # Cells touching each region and cells entirely within each region
+        boxes = self._cell_boxes(cell_ids)
+        box_rows, region_rows = self._tree.query(boxes, predicate='intersects')
+        within_rows, within_regions = self._tree.query(boxes, predicate='within')
+        within = np.isin(box_rows * len(self) + region_rows, within_rows * len(self) + within_regions)
+
+        pair_order = np.lexsort((box_rows, region_rows))
+        regions, region_starts = np.unique(region_rows[pair_order], return_index=True)
+        region_ends = np.append(region_starts[1:], pair_order.size)
+
+        rows = []
+        tagged_regions = []
+        for region, i0, i1 in zip(regions, region_starts, region_ends):
+            pairs = pair_order[i0:i1]
+
+            inside = [order[starts[b]:ends[b]] for b in box_rows[pairs[within[pairs]]]]
+            boundary = [order[starts[b]:ends[b]] for b in box_rows[pairs[~within[pairs]]]]
+            if boundary:
+                candidates = np.concatenate(boundary)
+                inside.append(candidates[shapely.intersects_xy(self._geometries[region], x[candidates],
+                                                               y[candidates])])
+
+            region_positions = np.sort(np.concatenate(inside))
+            rows.append(valid[region_positions])
+            tagged_regions.append(np.full(region_positions.size, region))
+
+        if not rows:
+            return pd.DataFrame({'row': np.array([], dtype='int64'), 'region': np.array([], dtype='object')})
+
+        return pd.DataFrame({'row': np.concatenate(rows), 'region': self._names[np.concatenate(tagged_regions)]})
+
+    def region_visits(self, positions, time_column='time', group_column='dataset_id', split_visits=True):
+        """
+        Entry time, exit time and number of profiles of each visit of each data set to each region.  A visit is a run of
+        consecutive (in time) profiles of a data set inside the region.
+
+        :param positions: DataFrame containing longitude, latitude, time_column and group_column columns (i.e.:
+            GdacClient.daily_profile_positions with time_column='date' or a Parquet profiles archive)
+        :param time_column: name of the time column
+        :param group_column: name of the column identifying the data set
+        :param split_visits: if False, a single record spanning all visits is returned for each data set and region
+        :return: DataFrame containing dataset_id, region, visit, entry_time, exit_time and num_profiles columns
+        """
+        tags = self.tag(positions)
+        if tags.empty:
+            return pd.DataFrame(columns=visit_columns)
+
+        # Rank of each position within its data set, ordered by time
+        times = pd.to_datetime(positions[time_column])
+        ordered = pd.DataFrame({'group': positions[group_column].to_numpy(), 'time': times.to_numpy()})
+        order = np.lexsort((ordered.time.to_numpy(), ordered.group.to_numpy()))
+        ranks = np.empty(order.size, dtype='int64')
+        ranks[order] = np.arange(order.size)
+
+        visits = pd.DataFrame({'dataset_id': ordered.group.to_numpy()[tags.row.to_numpy()],
+                               'region': tags.region.to_numpy(),
+                               'rank': ranks[tags.row.to_numpy()],
+                               'time': ordered.time.to_numpy()[tags.row.to_numpy()]})
+        visits = visits.sort_values(['region', 'dataset_id', 'rank']).reset_index(drop=True)
+
+        # A new visit starts when the previous in-region profile of the same data set is not the previous profile
+        new_track = (visits.region != visits.region.shift()) | (visits.dataset_id != visits.dataset_id.shift())
+        if split_visits:
+            new_visit = new_track | (visits['rank'] != visits['rank'].shift() + 1)
+        else:
+            new_visit = new_track
+        visits['visit'] = new_visit.astype('int64').groupby(new_track.cumsum()).cumsum()
+
+        summary = visits.groupby(['dataset_id', 'region', 'visit'], sort=True).agg(
+            entry_time=('time', 'min'), exit_time=('time', 'max'), num_profiles=('time', 'size')).reset_index()
+
+        return summary[visit_columns]
+
+    def _cell_ids(self, longitudes, latitudes):
+
+        # Longitude 180 is binned into the last column rather than spilling into the next grid row
+        columns = np.floor((longitudes + 180.) / self._cell_size).astype('int64')
+        columns = np.clip(columns, 0, self._num_columns - 1)
+        rows = np.floor((latitudes + 90.) / self._cell_size).astype('int64')
+
+        return rows * self._num_columns + columns
+
+    def _cell_boxes(self, cell_ids):
+        import shapely
+
+        lon0 = (cell_ids % self._num_columns) * self._cell_size - 180.
+        lat0 = (cell_ids // self._num_columns) * self._cell_size - 90.
+
+        return shapely.box(lon0, lat0, lon0 + self._cell_size, lat0 + self._cell_size)
+
+    def __len__(self):
+        return self._names.size
+
+    def __repr__(self):
+        return '<RegionIndex(num_regions={:})>'.format(self._names.size)
@@ -0,0 +1,347 @@
+"""Local ERDDAP Advanced Search over the cached server catalog.  Bounding box and time constraints are answered with
+sorted coverage arrays and free text with a token index, so repeated searches do not require a request to the ERDDAP
+server.  Searches the local catalog cannot answer (i.e.: search_for or standard_name without a metadata index)
+return None and should be sent to the server."""
+import logging
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+logging.getLogger(__file__)
+
+# allDatasets variables providing the geospatial and time coverage of each data set
+all_datasets_columns = {'datasetID': 'dataset_id',
+                        'minLongitude': 'min_lon',
+                        'maxLongitude': 'max_lon',
+                        'minLatitude': 'min_lat',
+                        'maxLatitude': 'max_lat',
+                        'minTime': 'min_time',
+                        'maxTime': 'max_time'}
+
+# Catalog columns indexed, along with all global and variable metadata, for free text searches
+text_columns = ['title',
+                'summary',
+                'institution']
+
+# Search parameters matched against the attributes of the data set variables
+variable_search_kwargs = ['ioos_category',
+                          'long_name',
+                          'standard_name',
+                          'variable_name']
+
+# Search parameters ignored by the local search
+ignored_search_kwargs = ['response',
+                         'items_per_page',
+                         'page']
+
+_token_regex = re.compile(r'[a-z0-9_]+')
+_relative_time_regex = re.compile(r'^now(?:-(\d+)(second|minute|hour|day)s?)?$')
+
+_missing_start = np.iinfo('int64').max
+_missing_end = np.iinfo('int64').min
+
+
+def fetch_all_datasets(erddap_url):
+    """
+    Fetch the geospatial and time coverage of all data sets from the ERDDAP allDatasets table
+
+    :param erddap_url: ERDDAP server url
+    :return: DataFrame indexed by dataset_id containing the min/max lon, lat and time columns
+    """
+    url = '{:}/tabledap/allDatasets.csv?{:}'.format(erddap_url, ','.join(all_datasets_columns.keys()))
+
+    try:
+        all_datasets = pd.read_csv(url, skiprows=[1])
+    except (IOError, ValueError) as e:
+        logging.error('Failed to fetch allDatasets: {:} ({:})'.format(url, e))
+        return pd.DataFrame()
+
+    all_datasets = all_datasets.rename(columns=all_datasets_columns)
+    all_datasets = all_datasets[all_datasets.dataset_id != 'allDatasets'].set_index('dataset_id')
+
+    return all_datasets
+
+
+class DatasetSearchEngine(object):
+
+    def __init__(self, catalog, variable_attributes=None, max_cached=1024):
+        """Local search engine over catalog.
+
+        :param catalog: DataFrame indexed by dataset_id containing title, summary, institution, min_lon, max_lon,
+            min_lat, max_lat, min_time and max_time columns
+        :param variable_attributes: DataFrame containing dataset_id, variable, attribute and value columns (i.e.:
+            the attributes table of a gdutils.metadata.MetadataIndex), including the NC_GLOBAL attributes, of every data
+            set.  Required for search_for, ioos_category, long_name, standard_name and variable_name searches, since
+            ERDDAP matches search_for against all of the data set metadata
+        :param max_cached: number of search results cached
+        """
+        self._logger = logging.getLogger(os.path.basename(__file__))
+
+        self._created = time.time()
+        self._dataset_ids = np.asarray(catalog.index, dtype='str')
+        self._num_datasets = self._dataset_ids.size
+
+        # Geospatial coverage.  Missing bounds never match a bounding box
+        self._bounds = {}
+        for column in ['min_lon', 'max_lon', 'min_lat', 'max_lat']:
+            values = catalog[column] if column in catalog.columns else pd.Series(np.nan, index=catalog.index)
+            self._bounds[column] = pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64')
+        self._has_bounds = 'min_lon' in catalog.columns
+
+        # Time coverage as sorted epoch seconds and the corresponding row positions.  Missing start times sort last and
+        # missing end times sort first so that they never match a time constraint
+        start_times = _epoch_seconds(catalog.get('min_time'), self._num_datasets, _missing_start)
+        end_times = _epoch_seconds(catalog.get('max_time'), self._num_datasets, _missing_end)
+        self._start_order = np.argsort(start_times, kind='stable')
+        self._sorted_start_times = start_times[self._start_order]
+        self._end_order = np.argsort(end_times, kind='stable')
+        self._sorted_end_times = end_times[self._end_order]
+        self._has_times = 'min_time' in catalog.columns
+
+        # Free text token -> row positions
+        texts = [' '.join([dataset_id] + [v for v in values if isinstance(v, str)])
+                 for dataset_id, values in zip(self._dataset_ids, catalog.reindex(columns=text_columns).values)]
+        tokens = [_tokenize(text) for text in texts]
+
+        # Institution (case insensitive) -> row positions
+        institutions = catalog.get('institution', pd.Series('', index=catalog.index)).fillna('').astype('str')
+        self._institutions = _build_index([[i.lower()] for i in institutions])
+
+        # (attribute, lowercase value) -> row positions
+        self._variable_attributes = None
+        self._has_metadata = False
+        if variable_attributes is not None:
+            rows = pd.Index(self._dataset_ids).get_indexer(variable_attributes.dataset_id)
+            attributes = variable_attributes.assign(row=rows)
+            attributes = attributes[attributes.row >= 0]
+
+            keys = [[] for _ in range(self._num_datasets)]
+            for row, variable, attribute, value in zip(attributes.row, attributes.variable, attributes.attribute,
+                                                       attributes.value):
+                # Variable names, attribute names and attribute values are all searched by search_for
+                tokens[row].update(_tokenize(' '.join([variable, attribute or '', str(value or '')])))
+                if variable == 'NC_GLOBAL':
+                    continue
+                if not attribute:
+                    keys[row].append(('variable_name', variable.lower()))
+                elif attribute in variable_search_kwargs:
+                    keys[row].append((attribute, str(value).lower()))
+            self._variable_attributes = _build_index(keys)
+
+            # search_for and the variable attributes are only answered locally if every data set's metadata is indexed
+            self._has_metadata = np.unique(attributes.row).size == self._num_datasets
+
+        self._tokens = _build_index(tokens)
+
+        self._cache = OrderedDict()
+        self._max_cached = max_cached
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def from_client(cls, client, metadata_index=None, max_cached=1024):
+        """
+        Build the search engine from the GdacClient.erddap_datasets catalog and the ERDDAP allDatasets coverage table.
+
+        :param client: gdutils.GdacClient instance
+        :param metadata_index: gdutils.metadata.MetadataIndex used for variable attribute searches
+        :param max_cached: number of search results cached
+        :return: DatasetSearchEngine or None if the server catalog is not available
+        """
+        if client.erddap_datasets.empty:
+            logging.error('No ERDDAP data sets available to search')
+            return
+
+        all_datasets = fetch_all_datasets(client.server)
+        if all_datasets.empty:
+            return
+
+        catalog = client.erddap_datasets.drop(index='allDatasets', errors='ignore')
+        catalog = catalog.join(all_datasets[[c for c in all_datasets.columns if c not in catalog.columns]])
+
+        variable_attributes = None
+        if metadata_index is not None:
+            variable_attributes = metadata_index.variable_attributes(include_global=True)
+
+        return cls(catalog, variable_attributes=variable_attributes, max_cached=max_cached)
+
+    @property
+    def created(self):
+        return self._created
+
+    @property
+    def dataset_ids(self):
+        return self._dataset_ids.tolist()
+
+    @property
+    def stats(self):
+        return {'num_datasets': self._num_datasets,
+                'cached': len(self._cache),
+                'hits': self._hits,
+                'misses': self._misses}
+
+    def can_search(self, params):
+        """True if all params can be answered from the local catalog"""
+
+        for key, value in params.items():
+            if key in ignored_search_kwargs or value is None or value == '':
+                continue
+
+            if key in ['min_lon', 'max_lon', 'min_lat', 'max_lat']:
+                if not self._has_bounds:
+                    return False
+            elif key in ['min_time', 'max_time']:
+                if not self._has_times or _parse_time(value) is None:
+                    return False
+            elif key == 'search_for' or key in variable_search_kwargs:
+                if not self._has_metadata:
+                    return False
+            elif key != 'institution':
+                return False
+
+        return True
+
+    def search(self, params=None):
+        """
+        Local equivalent of ERDDAP's Advanced Search (gdutils.GdacClient.search_datasets params).  Data sets match
+        if their coverage overlaps the bounding box and time window, all search_for words (words prefixed with - are
+        excluded) appear in the dataset id, title, summary or institution and the institution and variable attributes
+        match exactly, ignoring case.
+
+        :param params: dictionary of search parameters
+        :return: sorted list of matching dataset ids or None if params cannot be answered locally
+        """
+        params = {k: v for k, v in (params or {}).items()
+                  if k not in ignored_search_kwargs and v is not None and v != ''}
+
+        key = tuple(sorted((k, str(v)) for k, v in params.items()))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self._hits += 1
+            return list(self._cache[key])
+
+        if not self.can_search(params):
+            self._misses += 1
+            return
+
+        # Relative times (i.e.: now-1day) change with each call and are not cached
+        cacheable = not any([isinstance(params.get(k), str) and params[k].startswith('now')
+                             for k in ['min_time', 'max_time']])
+
+        dataset_ids = self._search(params)
+
+        if cacheable:
+            self._cache[key] = tuple(dataset_ids)
+            while len(self._cache) > self._max_cached:
+                self._cache.popitem(last=False)
+
+        return dataset_ids
+
+    def _search(self, params):
+
+        mask = np.ones(self._num_datasets, dtype='bool')
+
+        # Data set coverage must overlap the bounding box
+        with np.errstate(invalid='ignore'):
+            if 'min_lon' in params:
+                mask &= self._bounds['max_lon'] >= float(params['min_lon'])
+            if 'max_lon' in params:
+                mask &= self._bounds['min_lon'] <= float(params['max_lon'])
+            if 'min_lat' in params:
+                mask &= self._bounds['max_lat'] >= float(params['min_lat'])
+            if 'max_lat' in params:
+                mask &= self._bounds['min_lat'] <= float(params['max_lat'])
+
+        # Data sets ending on or after min_time and starting on or before max_time
+        if 'min_time' in params:
+            i = np.searchsorted(self._sorted_end_times, _parse_time(params['min_time']), side='left')
+            mask &= self._rows_mask(self._end_order[i:])
+        if 'max_time' in params:
+            i = np.searchsorted(self._sorted_start_times, _parse_time(params['max_time']), side='right')
+            mask &= self._rows_mask(self._start_order[:i])
+
+        if 'institution' in params:
+            mask &= self._rows_mask(self._institutions.get(str(params['institution']).lower()))
+
+        for kwarg in variable_search_kwargs:
+            if kwarg in params:
+                mask &= self._rows_mask(self._variable_attributes.get((kwarg, str(params[kwarg]).lower())))
+
+        if 'search_for' in params:
+            for word in str(params['search_for']).replace('"', ' ').split():
+                exclude = word.startswith('-')
+                tokens = _tokenize(word[1:] if exclude else word)
+                if not tokens:
+                    continue
+                word_mask = np.ones(self._num_datasets, dtype='bool')
+                for token in tokens:
+                    word_mask &= self._rows_mask(self._tokens.get(token))
+                mask &= ~word_mask if exclude else word_mask
+
+        return sorted(self._dataset_ids[mask].tolist())
+
+    def _rows_mask(self, rows):
+
+        mask = np.zeros(self._num_datasets, dtype='bool')
+        if rows is not None:
+            mask[rows] = True
+
+        return mask
+
+    def __repr__(self):
+        return '<DatasetSearchEngine(num_datasets={:}, cached={:})>'.format(self._num_datasets, len(self._cache))
+
+
+def _tokenize(text):
+
+    return set(_token_regex.findall(text.lower()))
+
+
+def _build_index(row_keys):
+    """Map each key to the sorted array of row positions it appears in"""
+
+    index = {}
+    for row, keys in enumerate(row_keys):
+        for key in keys:
+            index.setdefault(key, []).append(row)
+
+    return {key: np.asarray(rows, dtype='int64') for key, rows in index.items()}
+
+
+def _parse_time(value):
+    """Epoch seconds of value, which may be a datetime, ISO-8601 string or relative time (i.e.: now-7days)"""
+
+    if isinstance(value, str):
+        match = _relative_time_regex.match(value.strip().lower())
+        if match:
+            seconds = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+            offset = int(match.group(1)) * seconds[match.group(2)] if match.group(1) else 0
+            return int(time.time()) - offset
+
+    try:
+        ts = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return
+
+    if pd.isnull(ts):
+        return
+
+    if not ts.tzinfo:
+        ts = ts.tz_localize('UTC')
+
+    return int(ts.timestamp())
+
+
+def _epoch_seconds(times, size, missing):
+
+    if times is None:
+        return np.full(size, missing, dtype='int64')
+
+    times = pd.to_datetime(times, utc=True, errors='coerce')
+    seconds = times.dt.tz_localize(None).values.astype('datetime64[s]').astype('int64')
+    seconds[times.isnull().values] = missing
+
+    return seconds
@@ -0,0 +1,369 @@
+"""Lightweight JSON API service fronting a warm GdacClient.  The data sets, DAC catalog, calendars and daily tracks are
+held in an immutable snapshot that is rebuilt in the background and swapped in when complete, so a refresh never
+blocks a request.
+
+Endpoints:
+
+    /status                     snapshot time, refresh count, last refresh error and number of data sets
+    /datasets                   all data set records (?ids=id1,id2 to select data sets)
+    /datasets/{dataset_id}      data set record merged with the DAC catalog record
+    /tracks/{dataset_id}        GeoJSON track (?daily=true for the daily averaged positions)
+    /calendars                  available calendar names
+    /calendars/{name}           calendar (i.e.: ymd_profiles) as {index, columns, data}
+    /yearly_counts              deployments, glider days and profiles per year
+"""
+import logging
+import os
+import json
+import time
+import threading
+import pandas as pd
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+logging.getLogger(__file__)
+
+# GdacClient calendar properties served by /calendars/{name}
+calendar_names = ['ymd_deployments',
+                  'ym_deployments',
+                  'md_deployments',
+                  'ymd_glider_days',
+                  'ym_glider_days',
+                  'md_glider_days',
+                  'ymd_profiles',
+                  'ym_profiles',
+                  'md_profiles']
+
+
+class GdacSnapshot(object):
+
+    def __init__(self, client, catalog=None):
+        """Read-only view of a GdacClient search and the DAC catalog.  Responses that do not depend on the request
+        are serialized once, when the snapshot is built."""
+
+        self._logger = logging.getLogger(os.path.basename(__file__))
+
+        self._client = client
+        self._created = pd.Timestamp.utcnow()
+        self._catalog = {d['name']: d for d in catalog or [] if 'name' in d}
+
+        self._datasets = client.datasets
+        self._daily_positions = client.daily_profile_positions
+
+        records = self._datasets_records(self._datasets)
+        self._responses = {'/datasets': _to_json(records),
+                           '/calendars': _to_json(calendar_names)}
+
+        for dataset_id, record in zip(self._datasets.index, records):
+            dataset_record = dict(self._catalog.get(dataset_id, {}))
+            dataset_record.update(record)
+            self._responses['/datasets/{:}'.format(dataset_id)] = _to_json(dataset_record)
+
+        for name in calendar_names:
+            self._responses['/calendars/{:}'.format(name)] = _calendar_to_json(
+                getattr(client, '{:}_calendar'.format(name)))
+
+        if not self._datasets.empty:
+            self._responses['/yearly_counts'] = _to_json(client.yearly_counts.reset_index().to_dict(orient='records'))
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def created(self):
+        return self._created
+
+    @property
+    def datasets(self):
+        return self._datasets
+
+    @property
+    def num_datasets(self):
+        return self._datasets.shape[0]
+
+    def response(self, path):
+        """Serialized response for path or None if path does not have a precomputed response"""
+        return self._responses.get(path)
+
+    def datasets_response(self, dataset_ids):
+        """Serialized records for the specified dataset ids"""
+        datasets = self._datasets[self._datasets.index.isin(dataset_ids)]
+
+        return _to_json(self._datasets_records(datasets))
+
+    def daily_track(self, dataset_id):
+        """GeoJSON track of the daily averaged profile positions or None if dataset_id is not in the snapshot"""
+        from gdutils.geojson import latlon_to_geojson_track
+
+        if dataset_id not in self._datasets.index or self._daily_positions.empty:
+            return
+
+        positions = self._daily_positions[self._daily_positions.dataset_id == dataset_id]
+        if positions.empty:
+            return
+
+        return latlon_to_geojson_track(positions.latitude, positions.longitude, pd.to_datetime(positions.date),
+                                       include_points=True)
+
+    def _datasets_records(self, datasets):
+
+        return json.loads(datasets.reset_index().to_json(orient='records', date_format='iso'))
+
+    def __repr__(self):
+        return '<GdacSnapshot(created={:}, num_datasets={:})>'.format(self._created.isoformat(), self.num_datasets)
+
+
+class GdacService(object):
+
+    def __init__(self, erddap_url=None, search_params=None, hours=None, include_delayed_mode=False,
+                 refresh_interval=3600, max_tracks=500):
+        """Warm GdacClient search refreshed every refresh_interval seconds in a background thread.
+
+        search_params are passed to GdacClient.search_datasets.  If hours is specified, min_time is set to hours
+        before each refresh.  Full resolution tracks are fetched on first request and up to max_tracks are cached,
+        keyed by dataset id and end_date, so that tracks are only fetched again when a data set updates."""
+
+        self._logger = logging.getLogger(os.path.basename(__file__))
+
+        self._erddap_url = erddap_url
+        self._search_params = search_params or {}
+        self._hours = hours
+        self._include_delayed_mode = include_delayed_mode
+        self._refresh_interval = refresh_interval
+
+        # Replaced, never modified, by refresh.  Readers take a reference once per request.
+        self._snapshot = None
+
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._refreshes = 0
+        self._last_refresh_seconds = None
+        self._last_refresh_time = None
+        self._last_error = None
+        self._last_error_time = None
+
+        self._max_tracks = max_tracks
+        self._tracks = OrderedDict()
+        self._tracks_lock = threading.Lock()
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def status(self):
+        snapshot = self._snapshot
+        return {'ready': snapshot is not None,
+                'snapshot_time': snapshot.created.isoformat() if snapshot else None,
+                'num_datasets': snapshot.num_datasets if snapshot else 0,
+                'refreshes': self._refreshes,
+                'last_refresh_seconds': self._last_refresh_seconds,
+                'last_refresh_time': _isoformat(self._last_refresh_time),
+                'last_error': self._last_error,
+                'last_error_time': _isoformat(self._last_error_time),
+                'refresh_interval': self._refresh_interval,
+                'cached_tracks': len(self._tracks)}
+
+    def refresh(self):
+        """Build a new snapshot and swap it in.  The current snapshot is kept if the search fails.
+
+        :return: True if the snapshot was replaced, False otherwise
+        """
+        from gdutils import GdacClient
+        from gdutils.apis.dac import fetch_dac_catalog_json
+
+        with self._refresh_lock:
+            t0 = time.time()
+
+            params = dict(self._search_params)
+            if self._hours:
+                dt0 = pd.Timestamp.utcnow() - pd.Timedelta(hours=self._hours)
+                params['min_time'] = dt0.strftime('%Y-%m-%dT%H:%M')
+
+            self._logger.info('Refreshing GdacClient snapshot')
+            client = GdacClient(erddap_url=self._erddap_url)
+            if client.erddap_datasets.empty:
+                self._logger.error('Failed to fetch ERDDAP data sets. Keeping the current snapshot')
+                self._set_error('Failed to fetch ERDDAP data sets')
+                return False
+
+            client.search_datasets(params=params, include_delayed_mode=self._include_delayed_mode)
+            if client.datasets.empty:
+                self._logger.warning('No data sets found matching {:}. Keeping the current snapshot'.format(params))
+                self._set_error('No data sets found matching {:}'.format(params))
+                return False
+
+            snapshot = GdacSnapshot(client, catalog=fetch_dac_catalog_json())
+
+            self._snapshot = snapshot
+            self._refreshes += 1
+            self._last_refresh_seconds = time.time() - t0
+            self._last_refresh_time = pd.Timestamp.utcnow()
+            self._last_error = None
+
+            self._logger.info('Snapshot refreshed in {:0.1f} seconds: {:}'.format(self._last_refresh_seconds,
+                                                                                 snapshot))
+
+        return True
+
+    def start(self, wait=True):
+        """Start the background refresh thread.  If wait is True, the first snapshot is built before returning"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        if wait:
+            self._refresh()
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(not wait,), name='gdac-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def track(self, dataset_id):
+        """Full resolution GeoJSON track for dataset_id from the current snapshot, fetched on first request"""
+        snapshot = self._snapshot
+        if snapshot is None or dataset_id not in snapshot.datasets.index:
+            return
+
+        key = (dataset_id, str(snapshot.datasets.loc[dataset_id].get('end_date')))
+        with self._tracks_lock:
+            if key in self._tracks:
+                self._tracks.move_to_end(key)
+                return self._tracks[key]
+
+        dataset_track = snapshot.client.get_dataset_track_geojson(dataset_id)
+        if not dataset_track:
+            return
+
+        track_json = _to_json(dataset_track)
+        with self._tracks_lock:
+            self._tracks[key] = track_json
+            while len(self._tracks) > self._max_tracks:
+                self._tracks.popitem(last=False)
+
+        return track_json
+
+    def _run(self, refresh_now):
+
+        if refresh_now:
+            self._refresh()
+
+        while not self._stop_event.wait(self._refresh_interval):
+            self._refresh()
+
+    def _refresh(self):
+        """refresh that logs, rather than raises, errors so the refresh thread keeps running"""
+
+        try:
+            return self.refresh()
+        except Exception as e:
+            self._logger.error('Snapshot refresh failed. Keeping the current snapshot: {:}'.format(e))
+            self._set_error('{:}: {:}'.format(e.__class__.__name__, e))
+            return False
+
+    def _set_error(self, error):
+
+        self._last_error = error
+        self._last_error_time = pd.Timestamp.utcnow()
+
+    def __repr__(self):
+        return '<GdacService(snapshot={:}, refreshes={:})>'.format(self._snapshot, self._refreshes)
+
+
+class GdacRequestHandler(BaseHTTPRequestHandler):
+    """Routes GET requests to the GdacService attached to the server"""
+
+    def do_GET(self):
+
+        url = urlsplit(self.path)
+        path = '/' + '/'.join([unquote(p) for p in url.path.split('/') if p])
+        query = parse_qs(url.query)
+
+        service = self.server.service
+        if path == '/status':
+            return self._send(200, _to_json(service.status))
+
+        snapshot = service.snapshot
+        if snapshot is None:
+            return self._send(503, _to_json({'error': 'Service is starting'}))
+
+        body = None
+        if path == '/datasets' and 'ids' in query:
+            body = snapshot.datasets_response([d for ids in query['ids'] for d in ids.split(',')])
+        elif path.startswith('/tracks/'):
+            dataset_id = path[len('/tracks/'):]
+            if query.get('daily', ['false'])[0].lower() in ['true', '1']:
+                track = snapshot.daily_track(dataset_id)
+                body = _to_json(track) if track else None
+            else:
+                body = service.track(dataset_id)
+        else:
+            body = snapshot.response(path)
+
+        if body is None:
+            return self._send(404, _to_json({'error': 'Not found: {:}'.format(path)}))
+
+        self._send(200, body, snapshot)
+
+    def _send(self, code, body, snapshot=None):
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if snapshot:
+            self.send_header('X-Snapshot-Time', snapshot.created.isoformat())
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug('{:} - {:}'.format(self.address_string(), format % args))
+
+
+def create_server(service, host='127.0.0.1', port=8080):
+    """
+    Create the threaded HTTP server for service.  Call serve_forever() on the returned server to handle requests.
+
+    :param service: gdutils.server.GdacService instance
+    :param host: interface to listen on
+    :param port: port to listen on.  0 selects a free port
+    :return: http.server.ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer((host, port), GdacRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+
+    return server
+
+
+def _isoformat(ts):
+
+    return ts.isoformat() if ts is not None else None
+
+
+def _to_json(obj):
+
+    return json.dumps(obj, default=str).encode()
+
+
+def _calendar_to_json(calendar):
+
+    if calendar is None or calendar.empty:
+        return _to_json({'index': [], 'columns': [], 'data': []})
+
+    index = [list(i) if isinstance(i, tuple) else i for i in calendar.index.tolist()]
+    data = calendar.astype('object').where(calendar.notnull(), None).values.tolist()
+
+    return _to_json({'index_names': list(calendar.index.names),
+                     'columns_name': calendar.columns.name,
+                     'index': index,
+                     'columns': calendar.columns.tolist(),
+                     'data': data})
@@ -0,0 +1,239 @@
+"""Spatial index over profile positions.  Positions are converted to 3D unit sphere coordinates and indexed with a
+pykdtree KDTree, so radius and nearest neighbor queries use great circle distances and work across the poles and the
+antimeridian.  Bounding box queries use a latitude sorted array.  Queries are answered for all indexed profiles, from
+any number of data sets, at once."""
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+logging.getLogger(__file__)
+
+# Mean earth radius
+earth_radius_km = 6371.0088
+
+
+def lonlat_to_xyz(longitudes, latitudes):
+    """
+    Convert longitudes and latitudes, in degrees, to 3D unit sphere coordinates
+
+    :param longitudes: array of longitudes
+    :param latitudes: array of latitudes
+    :return: (n, 3) float64 array
+    """
+    lon = np.radians(np.asarray(longitudes, dtype='float64'))
+    lat = np.radians(np.asarray(latitudes, dtype='float64'))
+
+    cos_lat = np.cos(lat)
+
+    return np.ascontiguousarray(np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)]))
+
+
+def km_to_chord(distance_km):
+    """Great circle distance, in km, to the straight line distance between two points on the unit sphere"""
+
+    return 2 * np.sin(np.minimum(np.asarray(distance_km, dtype='float64') / earth_radius_km, np.pi) / 2)
+
+
+def chord_to_km(chord):
+    """Straight line distance between two points on the unit sphere to great circle distance, in km"""
+
+    return 2 * np.arcsin(np.clip(np.asarray(chord, dtype='float64') / 2, 0, 1)) * earth_radius_km
+
+
+class ProfileSpatialIndex(object):
+
+    def __init__(self, profiles, leafsize=16):
+        """KD-tree index of the latitude and longitude of profiles.  Rows with missing positions are not indexed.
+
+        :param profiles: DataFrame containing latitude and longitude columns and any other profile columns (i.e.:
+            dataset_id, time, profile_id)
+        :param leafsize: KD-tree leaf size
+        """
+        from pykdtree.kdtree import KDTree
+
+        self._logger = logging.getLogger(os.path.basename(__file__))
+
+        valid = profiles.latitude.notnull() & profiles.longitude.notnull()
+        self._profiles = profiles[valid].reset_index(drop=profiles.index.name is None)
+
+        self._longitudes = (self._profiles.longitude.to_numpy(dtype='float64') + 180) % 360 - 180
+        self._latitudes = self._profiles.latitude.to_numpy(dtype='float64')
+
+        self._tree = None
+        if self.num_profiles:
+            self._tree = KDTree(lonlat_to_xyz(self._longitudes, self._latitudes), leafsize=leafsize)
+
+        # Latitude sorted positions for bounding box queries
+        self._lat_order = np.argsort(self._latitudes, kind='stable')
+        self._sorted_latitudes = self._latitudes[self._lat_order]
+
+    @classmethod
+    def from_daily_positions(cls, client, dataset_ids=None):
+        """
+        Index the daily averaged profile positions of a GdacClient search
+
+        :param client: gdutils.GdacClient instance
+        :param dataset_ids: list of dataset ids.  Defaults to all data sets in client.daily_profile_positions
+        :return: ProfileSpatialIndex
+        """
+        positions = client.daily_profile_positions
+        if positions.empty:
+            logging.warning('No daily profile positions found')
+            return cls(pd.DataFrame(columns=['dataset_id', 'date', 'latitude', 'longitude']))
+
+        if dataset_ids:
+            positions = positions[positions.dataset_id.isin(dataset_ids)]
+
+        return cls(positions)
+
+    @classmethod
+    def from_parquet(cls, root_path, dataset_ids=None, years=None, min_time=None, max_time=None):
+        """
+        Index the profiles in a Parquet archive written by gdutils.io.write_parquet_dataset
+
+        :param root_path: Parquet archive root directory
+        :param dataset_ids: dataset id or list of dataset ids to read
+        :param years: year or list of years to read
+        :param min_time: minimum time value
+        :param max_time: maximum time value
+        :return: ProfileSpatialIndex
+        """
+        import importlib
+        gdutils_io = importlib.import_module('gdutils.io')
+
+        profiles = gdutils_io.read_parquet_dataset(root_path,
+                                                   columns=['dataset_id', 'time', 'profile_id', 'latitude',
+                                                            'longitude'],
+                                                   dataset_ids=dataset_ids,
+                                                   years=years,
+                                                   min_time=min_time,
+                                                   max_time=max_time)
+        if profiles.empty:
+            return cls(pd.DataFrame(columns=['dataset_id', 'time', 'profile_id', 'latitude', 'longitude']))
+
+        return cls(profiles)
+
+    @classmethod
+    def from_profiles(cls, dataset_profiles):
+        """
+        Index the profile tables of several data sets (i.e.: GdacClient.get_dataset_profiles)
+
+        :param dataset_profiles: dictionary mapping dataset ids to time indexed profile DataFrames
+        :return: ProfileSpatialIndex
+        """
+        profiles = [p.reset_index().assign(dataset_id=dataset_id) for dataset_id, p in dataset_profiles.items()
+                    if not p.empty]
+        if not profiles:
+            return cls(pd.DataFrame(columns=['dataset_id', 'time', 'latitude', 'longitude']))
+
+        return cls(pd.concat(profiles, ignore_index=True))
+
+    @property
+    def profiles(self):
+        """DataFrame containing the indexed profiles.  Query positions refer to the rows of this DataFrame"""
+        return self._profiles
+
+    @property
+    def num_profiles(self):
+        return self._profiles.shape[0]
+
+    def bbox_positions(self, min_lon, min_lat, max_lon, max_lat):
+        """
+        Row positions of the profiles inside the bounding box.  If min_lon is greater than max_lon, the box crosses
+        the antimeridian.
+
+        :return: sorted array of row positions
+        """
+        i0 = np.searchsorted(self._sorted_latitudes, min_lat, side='left')
+        i1 = np.searchsorted(self._sorted_latitudes, max_lat, side='right')
+        candidates = self._lat_order[i0:i1]
+
+        min_lon = (min_lon + 180) % 360 - 180 if min_lon != 180 else min_lon
+        max_lon = (max_lon + 180) % 360 - 180 if max_lon != 180 else max_lon
+
+        lons = self._longitudes[candidates]
+        if min_lon <= max_lon:
+            inside = (lons >= min_lon) & (lons <= max_lon)
+        else:
+            inside = (lons >= min_lon) | (lons <= max_lon)
+
+        return np.sort(candidates[inside])
+
+    def radius_positions(self, lon, lat, radius_km):
+        """
+        Row positions and great circle distances of the profiles within radius_km of lon, lat, nearest first
+
+        :return: (positions, distances in km)
+        """
+        if not self.num_profiles:
+            return np.array([], dtype='int64'), np.array([], dtype='float64')
+
+        query = lonlat_to_xyz([lon], [lat])
+        upper_bound = float(km_to_chord(radius_km))
+
+        # pykdtree has no ball query, so the number of neighbors is doubled until some are beyond the radius
+        k = min(64, self.num_profiles)
+        while True:
+            distances, positions = self._query(query, k, upper_bound)
+            found = np.isfinite(distances)
+            if not found.all() or k == self.num_profiles:
+                break
+            k = min(k * 2, self.num_profiles)
+
+        return positions[found].astype('int64'), chord_to_km(distances[found])
+
+    def nearest_positions(self, lon, lat, k=1, max_distance_km=None):
+        """
+        Row positions and great circle distances of the k profiles nearest to lon, lat, nearest first
+
+        :return: (positions, distances in km)
+        """
+        if not self.num_profiles:
+            return np.array([], dtype='int64'), np.array([], dtype='float64')
+
+        upper_bound = float(km_to_chord(max_distance_km)) if max_distance_km is not None else None
+        distances, positions = self._query(lonlat_to_xyz([lon], [lat]), min(k, self.num_profiles), upper_bound)
+        found = np.isfinite(distances)
+
+        return positions[found].astype('int64'), chord_to_km(distances[found])
+
+    def query_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """
+        Profiles inside the bounding box
+
+        :return: DataFrame of the matching rows of self.profiles
+        """
+        return self._profiles.iloc[self.bbox_positions(min_lon, min_lat, max_lon, max_lat)]
+
+    def query_radius(self, lon, lat, radius_km):
+        """
+        Profiles within radius_km of lon, lat, nearest first
+
+        :return: DataFrame of the matching rows of self.profiles with a distance_km column
+        """
+        return self._to_results(*self.radius_positions(lon, lat, radius_km))
+
+    def query_nearest(self, lon, lat, k=1, max_distance_km=None):
+        """
+        The k profiles nearest to lon, lat, nearest first, optionally limited to max_distance_km
+
+        :return: DataFrame of the matching rows of self.profiles with a distance_km column
+        """
+        return self._to_results(*self.nearest_positions(lon, lat, k=k, max_distance_km=max_distance_km))
+
+    def _query(self, query, k, upper_bound):
+
+        distances, positions = self._tree.query(query, k=k, distance_upper_bound=upper_bound)
+
+        return np.atleast_1d(distances[0]), np.atleast_1d(positions[0])
+
+    def _to_results(self, positions, distances):
+
+        results = self._profiles.iloc[positions].copy()
+        results['distance_km'] = distances
+
+        return results
+
+    def __repr__(self):
+        return '<ProfileSpatialIndex(num_profiles={:})>'.format(self.num_profiles)
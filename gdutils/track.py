@@ -0,0 +1,234 @@
+"""Compact, time sorted profile track of a single data set.  Tracks are stored as parallel arrays (int64 epoch seconds,
+float32 longitude/latitude pairs and int32 profile ids) rather than DataFrames, so time slicing is a binary search,
+daily averages and interpolation are single numpy reductions and the longitude/latitude array, already in GeoJSON
+coordinate order, is exposed without copying."""
+import logging
+import numpy as np
+import pandas as pd
+from gdutils.geojson import latlon_to_geojson_track
+
+logging.getLogger(__file__)
+
+_missing_profile_id = -1
+
+
+class DatasetTrack(object):
+
+    __slots__ = ('dataset_id', '_times', '_lonlat', '_profile_ids')
+
+    def __init__(self, times, longitudes, latitudes, profile_ids=None, dataset_id=None):
+        """Profile positions of a data set, sorted by time.  Profiles with a missing time or position are dropped.
+
+        :param times: profile times
+        :param longitudes: profile longitudes
+        :param latitudes: profile latitudes
+        :param profile_ids: profile ids.  Missing profile ids are stored as -1
+        :param dataset_id: dataset id
+        """
+        self.dataset_id = dataset_id
+
+        times = pd.to_datetime(pd.Series(np.asarray(times)), utc=True, errors='coerce')
+        seconds = times.dt.tz_localize(None).values.astype('datetime64[s]').astype('int64')
+
+        lonlat = np.column_stack([np.asarray(longitudes, dtype='float32'), np.asarray(latitudes, dtype='float32')])
+        if lonlat.shape[0] != seconds.size:
+            raise ValueError('times, longitudes and latitudes must be the same length')
+
+        if profile_ids is None:
+            profile_ids = np.full(seconds.size, _missing_profile_id, dtype='int32')
+        else:
+            profile_ids = pd.to_numeric(pd.Series(np.asarray(profile_ids)), errors='coerce')
+            profile_ids = profile_ids.fillna(_missing_profile_id).to_numpy(dtype='int32')
+
+        valid = times.notnull().to_numpy() & np.isfinite(lonlat).all(axis=1)
+        order = np.flatnonzero(valid)
+        order = order[np.argsort(seconds[order], kind='stable')]
+
+        self._times = seconds[order]
+        self._lonlat = np.ascontiguousarray(lonlat[order])
+        self._profile_ids = profile_ids[order]
+
+    @classmethod
+    def from_profiles(cls, profiles, dataset_id=None, time_column='time'):
+        """
+        Create the track from a profiles DataFrame (i.e.: GdacClient.get_dataset_profiles)
+
+        :param profiles: DataFrame containing latitude, longitude and, optionally, profile_id columns and a time_column
+            column or DatetimeIndex
+        :param dataset_id: dataset id
+        :param time_column: name of the time column
+        :return: DatasetTrack
+        """
+        times = profiles[time_column] if time_column in profiles.columns else profiles.index
+
+        return cls(times, profiles.longitude.values, profiles.latitude.values,
+                   profile_ids=profiles.profile_id.values if 'profile_id' in profiles.columns else None,
+                   dataset_id=dataset_id)
+
+    @classmethod
+    def _from_arrays(cls, times, lonlat, profile_ids, dataset_id):
+        """Track sharing already sorted and validated arrays"""
+
+        track = cls.__new__(cls)
+        track.dataset_id = dataset_id
+        track._times = times
+        track._lonlat = lonlat
+        track._profile_ids = profile_ids
+
+        return track
+
+    @property
+    def epoch_seconds(self):
+        """int64 profile times in seconds since 1970-01-01"""
+        return self._times
+
+    @property
+    def times(self):
+        """datetime64[s] view of the profile times"""
+        return self._times.view('datetime64[s]')
+
+    @property
+    def longitudes(self):
+        return self._lonlat[:, 0]
+
+    @property
+    def latitudes(self):
+        return self._lonlat[:, 1]
+
+    @property
+    def lonlat(self):
+        """float32 (n, 2) array of longitude, latitude pairs, in GeoJSON coordinate order.  Not a copy"""
+        return self._lonlat
+
+    @property
+    def profile_ids(self):
+        return self._profile_ids
+
+    @property
+    def start_time(self):
+        return pd.Timestamp(int(self._times[0]), unit='s', tz='UTC') if self._times.size else None
+
+    @property
+    def end_time(self):
+        return pd.Timestamp(int(self._times[-1]), unit='s', tz='UTC') if self._times.size else None
+
+    @property
+    def bbox(self):
+        """[min_lon, min_lat, max_lon, max_lat]"""
+        if not self._times.size:
+            return []
+
+        mins = self._lonlat.min(axis=0)
+        maxs = self._lonlat.max(axis=0)
+
+        return [float(mins[0]), float(mins[1]), float(maxs[0]), float(maxs[1])]
+
+    @property
+    def nbytes(self):
+        return self._times.nbytes + self._lonlat.nbytes + self._profile_ids.nbytes
+
+    def slice(self, dt0=None, dt1=None):
+        """
+        Profiles between dt0 and dt1 inclusive.  The returned track shares the arrays of this track.
+
+        :param dt0: window start.  Defaults to the start of the track
+        :param dt1: window end.  Defaults to the end of the track
+        :return: DatasetTrack
+        """
+        i0 = np.searchsorted(self._times, _epoch_seconds(dt0), side='left') if dt0 is not None else 0
+        i1 = np.searchsorted(self._times, _epoch_seconds(dt1), side='right') if dt1 is not None else self._times.size
+
+        return self._from_arrays(self._times[i0:i1], self._lonlat[i0:i1], self._profile_ids[i0:i1], self.dataset_id)
+
+    def daily(self):
+        """
+        Daily averaged profile positions.  Times are the start of each day and the profile ids are the number of
+        profiles averaged.
+
+        :return: DatasetTrack
+        """
+        if not self._times.size:
+            return self._from_arrays(self._times, self._lonlat, self._profile_ids, self.dataset_id)
+
+        # Times are sorted, so each day is a contiguous run of profiles
+        days = self._times // 86400
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(days)) + 1])
+        counts = np.diff(np.append(starts, days.size))
+
+        means = np.add.reduceat(self._lonlat.astype('float64'), starts, axis=0) / counts[:, None]
+
+        return self._from_arrays(days[starts] * 86400, means.astype('float32'), counts.astype('int32'),
+                                 self.dataset_id)
+
+    def interpolate(self, times):
+        """
+        Linearly interpolated positions at times.  Longitudes are unwrapped so tracks crossing the antimeridian are
+        interpolated the short way around.  Times outside of the track are NaN.
+
+        :param times: datetime or array of datetimes
+        :return: float64 (n, 2) array of longitude, latitude pairs
+        """
+        seconds = np.atleast_1d(_epoch_seconds(times))
+        positions = np.full((seconds.size, 2), np.nan)
+        if not self._times.size:
+            return positions
+
+        longitudes = np.unwrap(self._lonlat[:, 0].astype('float64'), period=360)
+        inside = (seconds >= self._times[0]) & (seconds <= self._times[-1])
+
+        positions[inside, 0] = (np.interp(seconds[inside], self._times, longitudes) + 180) % 360 - 180
+        positions[inside, 1] = np.interp(seconds[inside], self._times, self._lonlat[:, 1])
+
+        return positions
+
+    def to_records(self):
+        """Structured array of the profile times, longitudes, latitudes and profile ids"""
+        track = np.empty(self._times.size, dtype=[('time', 'datetime64[s]'), ('longitude', 'float32'),
+                                                   ('latitude', 'float32'), ('profile_id', 'int32')])
+        track['time'] = self.times
+        track['longitude'] = self.longitudes
+        track['latitude'] = self.latitudes
+        track['profile_id'] = self._profile_ids
+
+        return track
+
+    def to_dataframe(self):
+        """Time indexed DataFrame of the latitude, longitude and profile_id of each profile"""
+        return pd.DataFrame({'latitude': self.latitudes,
+                             'longitude': self.longitudes,
+                             'profile_id': self._profile_ids},
+                            index=pd.DatetimeIndex(pd.to_datetime(self.times, utc=True), name='time'))
+
+    def to_geojson(self, include_points=True, precision='0.001'):
+        """
+        GeoJSON FeatureCollection containing the track LineString and, optionally, a Point for each profile
+
+        :param include_points: include the profile Points
+        :param precision: coordinate precision
+        :return: dictionary or {} if the track has no profiles
+        """
+        if not self._times.size:
+            return {}
+
+        return latlon_to_geojson_track(self.latitudes, self.longitudes, self.times, include_points=include_points,
+                                       precision=precision)
+
+    def __len__(self):
+        return self._times.size
+
+    def __repr__(self):
+        return '<DatasetTrack(dataset_id={:}, num_profiles={:})>'.format(self.dataset_id, self._times.size)
+
+
+def _epoch_seconds(value):
+    """int64 epoch seconds of a datetime or array of datetimes.  Naive times are UTC"""
+
+    if np.ndim(value):
+        times = pd.to_datetime(pd.Series(np.asarray(value)), utc=True, format='ISO8601')
+        return times.dt.tz_localize(None).values.astype('datetime64[s]').astype('int64')
+
+    ts = pd.Timestamp(value)
+    if ts.tzinfo:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+
+    return int(ts.value // 10 ** 9)
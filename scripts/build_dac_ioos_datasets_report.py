@@ -6,6 +6,7 @@ import argparse
 import sys
 import re
 from gdutils import GdacClient
+from gdutils.metadata import MetadataIndex, metadata_index_path
 
 
 def main(args):
@@ -16,6 +17,12 @@ def main(args):
     client = GdacClient()
     client.search_datasets(include_delayed_mode=True)
 
+    # Harvest the info pages of all real-time data sets into the local metadata index
+    dataset_ids = [did for did in client.dataset_ids if not did.endswith('-delayed')]
+    index = MetadataIndex(db_path=args.metadata_db, max_workers=args.workers)
+    index.harvest(dataset_ids)
+    global_attributes = index.global_attributes(['ioos_regional_association', 'acknowledg%'], dataset_ids=dataset_ids)
+
     datasets_report = []
 
     glider_regex = re.compile(r'^(.*)-(\d{8}T\d{4,})')
@@ -37,17 +44,8 @@ def main(args):
                'profiles': '',
                'wmo_id': None}
 
-        url = client.e.get_info_url(dataset_id)
-
-        logging.info('Fetching dataset info: {:}'.format(url))
-        dataset_description = pd.read_csv(url)
-        dataset_description.rename(columns={col: col.replace(' ', '_').lower() for col in dataset_description.columns},
-                                   inplace=True)
-
-        globals = dataset_description.loc[dataset_description.variable_name == 'NC_GLOBAL']
-
-        funding = globals.loc[globals.attribute_name.str.startswith('acknowledg')]
-        ra = globals.loc[globals.attribute_name == 'ioos_regional_association']
+        ra = global_attributes.loc[dataset_id, 'ioos_regional_association']
+        funding = global_attributes.loc[dataset_id, 'acknowledg%']
 
         glider_match = glider_regex.match(dataset_id)
 
@@ -56,11 +54,11 @@ def main(args):
         if '{:}-delayed'.format(row['dataset']) in client.dataset_ids:
             row['delayed'] = 'yes'
 
-        if not ra.empty:
-            row['ioos_ra'] = ra.iloc[0]['value']
+        if not pd.isnull(ra):
+            row['ioos_ra'] = ra
 
-        if not funding.empty:
-            row['funding'] = ','.join(list(funding.value))
+        if not pd.isnull(funding):
+            row['funding'] = funding
 
         row['days'] = dataset_metadata.days
         row['profiles'] = dataset_metadata.num_profiles
@@ -76,6 +74,15 @@ if __name__ == '__main__':
     arg_parser = argparse.ArgumentParser(description=main.__doc__,
                                          formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
+    arg_parser.add_argument('-m', '--metadata_db',
+                            help='Data set metadata index',
+                            default=metadata_index_path)
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='Number of concurrent info page requests',
+                            type=int,
+                            default=8)
+
     arg_parser.add_argument('-l', '--loglevel',
                             help='Verbosity level',
                             type=str,
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import json
+from statistics import median
+
+# Modules imported by the headless command line tools
+default_modules = ['gdutils',
+                   'gdutils.apis.dac',
+                   'gdutils.apis.watch',
+                   'gdutils.plot.plotter',
+                   'gdutils.plot.imagery']
+
+# Packages that must not be loaded by a headless import
+heavy_packages = ['matplotlib',
+                  'seaborn',
+                  'scipy',
+                  'erddapy']
+
+
+def import_time(module, python=sys.executable):
+    """Cumulative import time, in milliseconds, of module in a fresh interpreter, as reported by python -X importtime"""
+
+    p = subprocess.run([python, '-X', 'importtime', '-c', 'import {:}'.format(module)],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if p.returncode != 0:
+        logging.error('Failed to import {:}: {:}'.format(module, p.stderr.strip().split('\n')[-1]))
+        return
+
+    for line in p.stderr.strip().split('\n')[::-1]:
+        fields = [f.strip() for f in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000.
+
+    logging.error('Import time not found for {:}'.format(module))
+
+
+def loaded_packages(module, packages, python=sys.executable):
+    """The packages loaded as a side effect of importing module in a fresh interpreter"""
+
+    code = 'import sys, json, {:}; print(json.dumps([p for p in {:} if p in sys.modules]))'.format(module,
+                                                                                                 json.dumps(packages))
+    p = subprocess.run([python, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if p.returncode != 0:
+        return []
+
+    return json.loads(p.stdout)
+
+
+def main(args):
+    """Benchmark the import time of the gdutils modules used by the headless command line tools.  Exits with status 1
+    if the median import time of any module exceeds TARGET milliseconds or any module loads a plotting package"""
+
+    log_level = getattr(logging, args.loglevel.upper())
+    log_format = '%(asctime)s:%(module)s:%(levelname)s:%(message)s [line %(lineno)d]'
+    logging.basicConfig(format=log_format, level=log_level)
+
+    # Import gdutils from this repository rather than an installed copy
+    env_path = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+    os.environ['PYTHONPATH'] = os.pathsep.join([env_path] + [p for p in [os.environ.get('PYTHONPATH')] if p])
+
+    status = 0
+    for module in args.modules or default_modules:
+
+        times = [import_time(module) for _ in range(args.repeat)]
+        if None in times:
+            status = 1
+            continue
+
+        t = median(times)
+        heavy = loaded_packages(module, heavy_packages)
+
+        passed = t <= args.target and not heavy
+        sys.stdout.write('{:<6} {:<30} median={:8.1f} ms  min={:8.1f} ms{:}\n'.format('OK' if passed else 'FAIL',
+                                                                                     module,
+                                                                                     t,
+                                                                                     min(times),
+                                                                                     '  loads: {:}'.format(
+                                                                                         ', '.join(heavy)) if heavy
+                                                                                     else ''))
+        if not passed:
+            status = 1
+
+    return status
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=main.__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('modules',
+                            help='Modules to benchmark. Defaults to the modules used by the headless scripts',
+                            nargs='*')
+
+    arg_parser.add_argument('-t', '--target',
+                            help='Maximum median import time in milliseconds',
+                            type=float,
+                            default=750.)
+
+    arg_parser.add_argument('-n', '--repeat',
+                            help='Number of times each module is imported',
+                            type=int,
+                            default=5)
+
+    arg_parser.add_argument('-l', '--loglevel',
+                            help='Verbosity level',
+                            type=str,
+                            choices=['debug', 'info', 'warning', 'error', 'critical'],
+                            default='info')
+
+    parsed_args = arg_parser.parse_args()
+
+    # print(parsed_args)
+    # sys.exit(13)
+
+    sys.exit(main(parsed_args))
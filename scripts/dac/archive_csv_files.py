@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import os
+import sys
+from gdutils.io import dac_profiles_csv_files_to_parquet, gts_obs_csv_files_to_parquet
+
+
+def main(args):
+    """Write DAC profiles or GTS observations csv files to a Parquet archive partitioned by dataset_id and year"""
+
+    log_level = getattr(logging, args.loglevel.upper())
+    log_format = '%(asctime)s:%(module)s:%(levelname)s:%(message)s [line %(lineno)d]'
+    logging.basicConfig(format=log_format, level=log_level)
+
+    csv_files = args.csv_files
+    archive_path = args.archive_path
+
+    if not os.path.isdir(archive_path):
+        logging.error('Invalid archive destination specified: {:}'.format(archive_path))
+        return 1
+
+    if args.gts:
+        dataset_ids = gts_obs_csv_files_to_parquet(csv_files, archive_path)
+    else:
+        dataset_ids = dac_profiles_csv_files_to_parquet(csv_files, archive_path)
+
+    if not dataset_ids:
+        logging.warning('No csv files archived')
+        return 1
+
+    logging.info('{:} datasets archived to {:}'.format(len(dataset_ids), archive_path))
+
+    return 0
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=main.__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('csv_files',
+                            help='DAC profiles or GTS observations csv files',
+                            nargs='+')
+
+    arg_parser.add_argument('-o', '--archive_path',
+                            help='Parquet archive root directory (must exist)',
+                            default=os.path.realpath(os.curdir))
+
+    arg_parser.add_argument('-g', '--gts',
+                            help='csv files contain GTS observations',
+                            action='store_true')
+
+    arg_parser.add_argument('-l', '--loglevel',
+                            help='Verbosity level',
+                            type=str,
+                            choices=['debug', 'info', 'warning', 'error', 'critical'],
+                            default='info')
+
+    parsed_args = arg_parser.parse_args()
+
+    # print(parsed_args)
+    # sys.exit(13)
+
+    sys.exit(main(parsed_args))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import os
+import sys
+from gdutils.apis.changes import fetch_dac_catalog_changes
+
+
+def main(args):
+    """Print the ids of the IOOS Glider DAC data sets that have been added or updated since the last time this script
+    was run with the same snapshot file"""
+
+    log_level = getattr(logging, args.loglevel.upper())
+    log_format = '%(asctime)s:%(module)s:%(levelname)s:%(message)s [line %(lineno)d]'
+    logging.basicConfig(format=log_format, level=log_level)
+
+    snapshot_path = args.snapshot
+    response = args.format
+
+    snapshot_dir = os.path.dirname(os.path.realpath(snapshot_path))
+    if not os.path.isdir(snapshot_dir):
+        logging.error('Invalid snapshot destination specified: {:}'.format(snapshot_dir))
+        return 1
+
+    changes = fetch_dac_catalog_changes(snapshot_path)
+    if changes is None:
+        return 1
+
+    logging.info('Catalog changes: {:}'.format(changes))
+
+    if response == 'csv':
+        sys.stdout.write('{:}'.format(changes.to_frame().to_csv(index=False)))
+    elif response == 'json':
+        sys.stdout.write('{:}\n'.format(changes.to_frame().to_json(orient='records', default_handler=str)))
+    else:
+        dataset_ids = changes.changed_dataset_ids
+        if args.removed:
+            dataset_ids = dataset_ids + changes.removed
+        if dataset_ids:
+            sys.stdout.write('{:}\n'.format('\n'.join(dataset_ids)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=main.__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-s', '--snapshot',
+                            help='Catalog snapshot file from the previous run',
+                            default=os.path.join(os.path.realpath(os.curdir), 'dac_catalog_snapshot.pkl'))
+
+    arg_parser.add_argument('-r', '--removed',
+                            help='Include removed data sets in stdout',
+                            action='store_true')
+
+    arg_parser.add_argument('-f', '--format',
+                            help='Response format',
+                            choices=['json', 'csv', 'stdout'],
+                            default='stdout')
+
+    arg_parser.add_argument('-l', '--loglevel',
+                            help='Verbosity level',
+                            type=str,
+                            choices=['debug', 'info', 'warning', 'error', 'critical'],
+                            default='info')
+
+    parsed_args = arg_parser.parse_args()
+
+    # print(parsed_args)
+    # sys.exit(13)
+
+    sys.exit(main(parsed_args))
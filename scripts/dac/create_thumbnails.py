@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import os
+import sys
+from gdutils.plot.thumbnails import create_directory_thumbnails, thumbnail_pattern
+
+
+def main(args):
+    """Create thumbnails of all images matching PATTERN in each image directory and its subdirectories.  Thumbnails
+    are written to the image directory and are only recreated if the source image is newer"""
+
+    log_level = getattr(logging, args.loglevel.upper())
+    log_format = '%(asctime)s:%(module)s:%(levelname)s:%(message)s [line %(lineno)d]'
+    logging.basicConfig(format=log_format, level=log_level)
+
+    status = 0
+    for image_dir in args.image_dirs:
+        if not os.path.isdir(image_dir):
+            logging.error('Invalid image directory specified: {:}'.format(image_dir))
+            status = 1
+            continue
+
+        thumb_paths = create_directory_thumbnails(image_dir,
+                                                  pattern=args.pattern,
+                                                  size=(args.size, args.size),
+                                                  max_workers=args.workers,
+                                                  force=args.force)
+        logging.info('{:} thumbnails created in {:}'.format(len(thumb_paths), image_dir))
+
+    return status
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=main.__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('image_dirs',
+                            help='Image directories',
+                            nargs='+')
+
+    arg_parser.add_argument('-p', '--pattern',
+                            help='Image file name pattern',
+                            default=thumbnail_pattern)
+
+    arg_parser.add_argument('-s', '--size',
+                            help='Maximum thumbnail width and height in pixels',
+                            type=int,
+                            default=200)
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='Number of processes. Defaults to the number of CPUs',
+                            type=int)
+
+    arg_parser.add_argument('-f', '--force',
+                            help='Recreate all thumbnails, even if they are up to date',
+                            action='store_true')
+
+    arg_parser.add_argument('-l', '--loglevel',
+                            help='Verbosity level',
+                            type=str,
+                            choices=['debug', 'info', 'warning', 'error', 'critical'],
+                            default='info')
+
+    parsed_args = arg_parser.parse_args()
+
+    # print(parsed_args)
+    # sys.exit(13)
+
+    sys.exit(main(parsed_args))
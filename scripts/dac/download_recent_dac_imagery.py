@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import os
+import sys
+import datetime
+import pandas as pd
+from gdutils import GdacClient
+from gdutils.apis.dac import fetch_dac_catalog_dataframe
+from gdutils.plot.plotter import ErddapPlotter
+from gdutils.plot.cache import ImageCache
+from gdutils.plot.imagery import default_eovs, build_image_requests, download_image_requests
+from gdutils.plot.thumbnails import create_download_thumbnails
+
+
+def main(args):
+    """Download map, profile and time-series imagery for IOOS Glider DAC datasets that have updated within the last
+    MINUTES minutes, or for the specified dataset ids"""
+
+    log_level = getattr(logging, args.loglevel.upper())
+    log_format = '%(asctime)s:%(module)s:%(levelname)s:%(message)s [line %(lineno)d]'
+    logging.basicConfig(format=log_format, level=log_level)
+
+    imagery_root = args.imagery_root
+    img_type = args.img_type
+    eovs = args.eovs or default_eovs
+
+    if not os.path.isdir(imagery_root):
+        logging.error('Invalid imagery root specified: {:}'.format(imagery_root))
+        return 1
+
+    # The catalog latest_file_mtime is the image cache key, so fetch it even if dataset ids were specified
+    catalog = fetch_dac_catalog_dataframe()
+    if catalog.empty and (not args.dataset_ids or args.cache_dir):
+        return 1
+
+    dataset_ids = args.dataset_ids
+    if not dataset_ids:
+        dt0 = pd.Timestamp(datetime.datetime.utcnow() - datetime.timedelta(minutes=args.minutes), tz='UTC')
+        catalog = catalog[(catalog.latest_file_mtime >= dt0) & ~catalog.index.str.endswith('delayed')]
+        dataset_ids = sorted(catalog.index)
+        if not dataset_ids:
+            logging.warning('No datasets found that have updated within the last {:} minutes'.format(args.minutes))
+            return 0
+
+    if args.debug:
+        for dataset_id in dataset_ids:
+            logging.info('Dataset ID: {:}'.format(dataset_id))
+        return 0
+
+    # One client and one plotter for all datasets
+    client = GdacClient()
+    image_cache = None
+    if args.cache_dir:
+        image_cache = ImageCache(args.cache_dir)
+    if args.inventory:
+        client.load_variable_inventory(args.inventory)
+    plotter = ErddapPlotter(client.server, response=img_type, client=client, image_cache=image_cache)
+
+    latest_file_mtimes = catalog.latest_file_mtime if not catalog.empty else None
+    image_requests = build_image_requests(client, plotter, dataset_ids, imagery_root, eovs=eovs, hours=args.hours,
+                                          latest_file_mtimes=latest_file_mtimes)
+    if not image_requests:
+        logging.warning('No image requests created')
+        return 1
+
+    logging.info('Downloading {:} images for {:} datasets'.format(len(image_requests), len(dataset_ids)))
+    results = download_image_requests(plotter, image_requests, max_workers=args.workers,
+                                      max_per_server=args.max_per_server, return_content=not args.no_thumbnails)
+    for result in results:
+        if not result['success']:
+            logging.error('Failed to download {:}: {:}'.format(result['path'], result['reason']))
+    if image_cache:
+        logging.info('Image cache: {:}'.format(image_cache.stats))
+
+    # Create thumbnails from the downloaded image bytes
+    if not args.no_thumbnails:
+        thumb_paths = create_download_thumbnails(results)
+        logging.info('{:} thumbnails created'.format(len(thumb_paths)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=main.__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('dataset_ids',
+                            help='ERDDAP dataset ids. If not specified, datasets are selected by update time',
+                            nargs='*')
+
+    arg_parser.add_argument('-r', '--imagery_root',
+                            help='Parent directory containing a directory for each dataset id',
+                            default=os.path.realpath(os.curdir))
+
+    arg_parser.add_argument('-m', '--minutes',
+                            help='Select datasets that have updated within the last MINUTES minutes',
+                            type=float,
+                            default=60)
+
+    arg_parser.add_argument('--hours',
+                            help='Number of hours plotted in the latest profiles and time-series imagery',
+                            type=int,
+                            default=24)
+
+    arg_parser.add_argument('-v', '--eovs',
+                            help='Variables to plot',
+                            nargs='+')
+
+    arg_parser.add_argument('-f', '--format',
+                            help='Image type',
+                            dest='img_type',
+                            choices=['largePng', 'png', 'smallPng', 'largePdf', 'pdf', 'smallPdf', 'transparentPng'],
+                            default='largePng')
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='Number of download threads',
+                            type=int,
+                            default=8)
+
+    arg_parser.add_argument('--max_per_server',
+                            help='Maximum number of concurrent requests sent to the ERDDAP server',
+                            type=int,
+                            default=4)
+
+    arg_parser.add_argument('--no_thumbnails',
+                            help='Do not create thumbnails of the downloaded imagery',
+                            action='store_true')
+
+    arg_parser.add_argument('-c', '--cache_dir',
+                            help='Image cache directory.  Images are only requested from the ERDDAP server if the '
+                                 'dataset has updated since they were cached')
+
+    arg_parser.add_argument('-i', '--inventory',
+                            help='Variable inventory written by GdacClient.build_variable_inventory.  Variables a '
+                                 'dataset does not contain are not requested')
+
+    arg_parser.add_argument('-x', '--debug',
+                            help='Print the dataset ids but do not download any imagery',
+                            action='store_true')
+
+    arg_parser.add_argument('-l', '--loglevel',
+                            help='Verbosity level',
+                            type=str,
+                            choices=['debug', 'info', 'warning', 'error', 'critical'],
+                            default='info')
+
+    parsed_args = arg_parser.parse_args()
+
+    # print(parsed_args)
+    # sys.exit(13)
+
+    sys.exit(main(parsed_args))
@@ -5,7 +5,7 @@ import logging
 import sys
 import pandas as pd
 from gdutils import GdacClient
-from gdutils.dac import fetch_dac_catalog
+from gdutils.apis.dac import fetch_dac_catalog_json
 
 
 def main(args):
@@ -20,7 +20,7 @@ def main(args):
     response = args.format
 
     # Fetch the DAC registered deployments
-    deployments = fetch_dac_catalog()
+    deployments = fetch_dac_catalog_json()
     if not deployments:
         return 1
 
@@ -33,7 +33,7 @@ def main(args):
         return 1
 
     # Create the ploter
-    plotter = ErddapPlotter(client.server, response=img_type)
+    plotter = ErddapPlotter(client.server, response=img_type, client=client)
 
     # Configure the plot parameters
     plotter.set_y_range(ascending=False)
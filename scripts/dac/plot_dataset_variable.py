@@ -38,7 +38,7 @@ def main(args):
         return 1
 
     # Create the ploter
-    plotter = ErddapPlotter(client.server, response=img_type)
+    plotter = ErddapPlotter(client.server, response=img_type, client=client)
 
     # Configure the plot parameters
     plotter.set_colorbar(colorbar=colorbar)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import os
+import sys
+import pandas as pd
+from gdutils import GdacClient
+from gdutils.plot.plotter import ErddapPlotter
+from gdutils.plot.imagery import default_eovs
+from gdutils.plot.renderer import render_images
+
+
+def main(args):
+    """Fetch the time-series of the specified variables for dataset_id once and render the latest and synoptic
+    time-series and profile plots locally, rather than requesting each image from the ERDDAP server"""
+    # Set up logger
+    log_level = getattr(logging, args.loglevel.upper())
+    log_format = '%(asctime)s:%(module)s:%(levelname)s:%(message)s [line %(lineno)d]'
+    logging.basicConfig(format=log_format, level=log_level)
+
+    dataset_id = args.dataset_id
+    img_path = args.directory or os.path.realpath(os.curdir)
+    img_type = args.img_type
+    eovs = args.eovs or default_eovs
+    hours = args.hours
+
+    if not os.path.isdir(img_path):
+        logging.error('Invalid image directory specified: {:}'.format(img_path))
+        return 1
+
+    # Connect to the GDAC ERDDAP server
+    client = GdacClient()
+    client.search_datasets(dataset_ids=dataset_id)
+    if client.datasets.empty:
+        logging.error('Dataset not found: {:}'.format(dataset_id))
+        return 1
+
+    # The plotter is only used to build the graph parameters
+    plotter = ErddapPlotter(client.server, response=img_type, client=client)
+    plotter.set_colorbar(colorbar=args.colorbar)
+    plotter.set_y_range(min_val=0)
+    if args.no_legend:
+        plotter.set_legend_loc('Off')
+    plot_parameters = plotter.plot_parameters.copy()
+
+    if args.debug:
+        logging.info('Plot parameters: {:}'.format(plot_parameters))
+        return 0
+
+    logging.info('Fetching {:} time-series: {:}'.format(dataset_id, ', '.join(eovs)))
+    data = client.get_dataset_time_series(dataset_id, eovs, min_time=args.start_date, max_time=args.end_date)
+    if data is None or data.empty:
+        logging.error('No data found for {:}'.format(dataset_id))
+        return 1
+
+    ext = img_type[-3:].lower()
+    times = pd.to_datetime(data.index, utc=True, errors='coerce')
+
+    # Latest hours of the time series, equivalent to the ERDDAP max(time)-{hours}hours constraint
+    latest = data[times >= times.max() - pd.Timedelta(hours=hours)]
+
+    jobs = {'latest': latest, 'synoptic': data}
+    for label, plot_data in jobs.items():
+        render_requests = []
+        for eov in eovs:
+            render_requests.append(('time', 'depth', eov,
+                                    os.path.join(img_path,
+                                                 '{:}_{:}_{:}_ts_{:}.{:}'.format(dataset_id, eov, label, img_type,
+                                                                                 ext)),
+                                    plot_parameters))
+            render_requests.append((eov, 'depth', 'time',
+                                    os.path.join(img_path,
+                                                 '{:}_{:}_{:}_profiles_{:}.{:}'.format(dataset_id, eov, label, img_type,
+                                                                                       ext)),
+                                    plot_parameters))
+
+        image_paths = render_images(plot_data, render_requests, img_type=img_type, max_workers=args.workers)
+        for image_path in image_paths:
+            if image_path:
+                sys.stdout.write('{:}\n'.format(image_path))
+
+    return 0
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=main.__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('dataset_id',
+                            help='ERDDAP glider dataset id',
+                            type=str)
+
+    arg_parser.add_argument('-v', '--eovs',
+                            help='Variables to plot',
+                            nargs='+')
+
+    arg_parser.add_argument('--hours',
+                            help='Number of hours plotted in the latest imagery',
+                            type=float,
+                            default=24)
+
+    arg_parser.add_argument('--start_date',
+                            help='Fetch data >= the specified date')
+
+    arg_parser.add_argument('--end_date',
+                            help='Fetch data <= the specified date')
+
+    arg_parser.add_argument('-d', '--directory',
+                            help='Directory to write the images',
+                            type=str)
+
+    arg_parser.add_argument('-f', '--format',
+                            help='Image type',
+                            dest='img_type',
+                            choices=['largePng', 'png', 'smallPng', 'largePdf', 'pdf', 'smallPdf', 'transparentPng'],
+                            default='largePng')
+
+    arg_parser.add_argument('--colorbar',
+                            help='Any valid ERDDAP plotting colorbar',
+                            type=str,
+                            default='Rainbow2')
+
+    arg_parser.add_argument('--no-legend',
+                            action='store_true',
+                            dest='no_legend',
+                            help='Do not include a legend')
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='Number of rendering processes. Defaults to the number of CPUs',
+                            type=int)
+
+    arg_parser.add_argument('-x', '--debug',
+                            help='Debug mode. No operations performed',
+                            action='store_true')
+
+    arg_parser.add_argument('-l', '--loglevel',
+                            help='Verbosity level',
+                            type=str,
+                            choices=['debug', 'info', 'warning', 'error', 'critical'],
+                            default='info')
+
+    parsed_args = arg_parser.parse_args()
+
+    # print(parsed_args)
+    # sys.exit(13)
+
+    sys.exit(main(parsed_args))
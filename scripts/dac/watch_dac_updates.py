@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import os
+import sys
+import json
+import signal
+import subprocess
+from gdutils import GdacClient
+from gdutils.apis.watch import DacWatcher
+
+
+def main(args):
+    """Watch the IOOS Glider DAC deployments API and refresh the geoJSON tracks, deployment records and/or run a command
+    for each data set as soon as it updates"""
+
+    log_level = getattr(logging, args.loglevel.upper())
+    log_format = '%(asctime)s:%(module)s:%(levelname)s:%(message)s [line %(lineno)d]'
+    logging.basicConfig(format=log_format, level=log_level)
+
+    output_dir = args.outputdir
+    if not os.path.isdir(output_dir):
+        logging.error('Invalid destination path: {:}'.format(output_dir))
+        return 1
+
+    watcher = DacWatcher(poll_interval=args.poll_interval,
+                         debounce=args.debounce,
+                         max_delay=args.max_delay,
+                         max_workers=args.workers,
+                         snapshot_path=os.path.join(output_dir, 'dac_catalog_snapshot.pkl'),
+                         process_existing=args.all)
+
+    if args.tracks:
+        # A single client (and ERDDAP datasets table) is shared by all worker threads
+        client = GdacClient()
+
+        def refresh_track(dataset_id, record):
+            track = client.get_dataset_track_geojson(dataset_id)
+            if not track:
+                return
+            json_path = os.path.join(output_dir, '{:}_track.json'.format(dataset_id))
+            with open(json_path, 'w') as fid:
+                json.dump(track, fid)
+
+        watcher.register_handler('tracks', refresh_track)
+
+    if args.records:
+        def refresh_record(dataset_id, record):
+            json_path = os.path.join(output_dir, '{:}_deployment.json'.format(dataset_id))
+            with open(json_path, 'w') as fid:
+                json.dump(record.to_dict(), fid, default=str, sort_keys=True)
+
+        watcher.register_handler('records', refresh_record)
+
+    if args.command:
+        def run_command(dataset_id, record):
+            command = args.command.format(dataset_id=dataset_id)
+            logging.info('Running: {:}'.format(command))
+            subprocess.run(command, shell=True, check=True)
+
+        watcher.register_handler('command', run_command)
+
+    if not watcher.handlers:
+        logging.error('No handlers specified')
+        return 1
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+        watcher.shutdown()
+
+    return 0
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=main.__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-o', '--outputdir',
+                            help='Location to write tracks, deployment records and the catalog snapshot',
+                            default=os.path.realpath(os.curdir))
+
+    arg_parser.add_argument('-t', '--tracks',
+                            help='Refresh the geoJSON track of each updated data set',
+                            action='store_true')
+
+    arg_parser.add_argument('-r', '--records',
+                            help='Refresh the deployment record json of each updated data set',
+                            action='store_true')
+
+    arg_parser.add_argument('-c', '--command',
+                            help='Shell command to run for each updated data set. {dataset_id} is replaced with the '
+                                 'dataset id',
+                            type=str)
+
+    arg_parser.add_argument('-a', '--all',
+                            help='Process all data sets on the first poll if no catalog snapshot exists',
+                            action='store_true')
+
+    arg_parser.add_argument('--poll_interval',
+                            help='Seconds between deployments API requests',
+                            type=float,
+                            default=300)
+
+    arg_parser.add_argument('--debounce',
+                            help='Seconds a data set must go without updates before it is processed',
+                            type=float,
+                            default=600)
+
+    arg_parser.add_argument('--max_delay',
+                            help='Maximum seconds a continuously updating data set is held back',
+                            type=float,
+                            default=3600)
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='Number of worker threads',
+                            type=int,
+                            default=4)
+
+    arg_parser.add_argument('-l', '--loglevel',
+                            help='Verbosity level',
+                            type=str,
+                            choices=['debug', 'info', 'warning', 'error', 'critical'],
+                            default='info')
+
+    parsed_args = arg_parser.parse_args()
+
+    # print(parsed_args)
+    # sys.exit(13)
+
+    sys.exit(main(parsed_args))
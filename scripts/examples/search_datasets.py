@@ -1,6 +1,7 @@
 """Example using GdacClient to search for datasets by time and geospatial bounds and save the output to csv"""
 from gdutils import GdacClient
 from gdutils.plot import plot_calendar
+from gdutils.metadata import MetadataIndex
 import datetime
 import logging
 
@@ -35,7 +36,7 @@ client.search_datasets(params=params)
 client.datasets.to_html()
 
 # Count the total number of deployments within the dt0:dt1 time window
-num_deployments = client.datasets.shape[0]
+num_deployments = len(client.get_active_datasets(dt0, dt1))
 
 # Count the number of glider days withing the dt0:dt1 time window
 glider_days = client.glider_days_per_yyyymmdd.loc[dt0:dt1].sum()
@@ -46,45 +47,29 @@ profile_count = client.profiles_per_yyyymmdd.loc[dt0:dt1].sum()
 # Copy of the datasets data frame
 datasets = client.datasets.copy()
 
-# Loop through the datasets, fetch the info url and pull out the desired attributes
-sea_names = []
-funding_sources = []
-for dataset_id, row in datasets.iterrows():
-
-    # Fetch the dataset description from ERDDAP
-    info = client.get_dataset_metadata(dataset_id)
-
-    if info.empty:
-        continue
-
-    # Find all global NetCDF attributes
-    globals = info.loc[info['Variable Name'] == 'NC_GLOBAL']
-
-    # Find the sea_name global attribute
-    sea_name_attr = globals.loc[globals['Attribute Name'] == 'sea_name']
-    sea_name = 'unknown'
-    if not sea_name_attr.empty:
-        sea_name = sea_name_attr.Value.iloc[0]
-        sea_name = sea_name or 'unknown'
-    else:
-        logging.warning('{:}: sea_name NC_GLOBAL not found'.format(dataset_id))
-
-    # Find all global attributes that begin with 'acknowledg' as this attribute typically contains the funding sources
-    funding_attr = globals.loc[globals['Attribute Name'].str.startswith('acknowledg')]
-    funding = 'unknown'
-    if not funding_attr.empty:
-        funding = funding_attr.Value.iloc[0]
-        funding = funding or 'unknown'
-    else:
-        logging.warning('{:}: acknowledgment NC_GLOBAL not found'.format(dataset_id))
-
-    sea_names.append(sea_name)
-    funding_sources.append(funding)
-
-    # Count only the days and profiles that are dt0:dt1 inclusive
-    days = client.datasets_days[dataset_id].loc[dt0:dt1].sum()
-    profiles = client.datasets_profiles[dataset_id].loc[dt0:dt1].sum()
-    datasets.loc[dataset_id, ('days', 'num_profiles')] = [days, profiles]
+# Harvest the info pages of the data sets into the local metadata index.  Info pages are fetched concurrently and
+# completed data sets are only ever fetched once
+index = MetadataIndex()
+index.harvest(client.dataset_ids)
+
+# Pull out the sea_name and all global attributes that begin with 'acknowledg' as these attributes typically contain
+# the funding sources
+global_attributes = index.global_attributes(['sea_name', 'acknowledg%'], dataset_ids=datasets.index.tolist())
+for attribute in global_attributes.columns:
+    missing = global_attributes.index[global_attributes[attribute].isnull()]
+    for dataset_id in missing:
+        logging.warning('{:}: {:} NC_GLOBAL not found'.format(dataset_id, attribute))
+
+# Fleet-wide queries are local indexed lookups (i.e.: all SECOORA data sets funded by NOAA)
+secoora_noaa = index.find_datasets([('ioos_regional_association', '=', 'SECOORA'),
+                                    ('acknowledg%', 'like', '%NOAA%')])
+
+sea_names = global_attributes['sea_name'].replace('', 'unknown').fillna('unknown').tolist()
+funding_sources = global_attributes['acknowledg%'].replace('', 'unknown').fillna('unknown').tolist()
+
+# Count only the days and profiles that are dt0:dt1 inclusive
+datasets['days'] = client.get_datasets_glider_days(dt0, dt1).reindex(datasets.index).fillna(0)
+datasets['num_profiles'] = client.datasets_profiles.loc[dt0:dt1].sum().reindex(datasets.index).fillna(0)
 
 # Add the 2 columns
 datasets['deployment_area'] = sea_names
@@ -8,7 +8,7 @@ import datetime
 import dateutil
 import pytz
 from gdutils import GdacClient
-from gdutils.plot import plot_calendar
+from gdutils.plot import plot_calendar, plot_calendars
 import matplotlib.pyplot as plt
 
 
@@ -79,46 +79,29 @@ def main(args):
     date0 = dt0.strftime('%Y%m%dT%H00Z')
     date1 = dt1.strftime('%Y%m%dT%H00Z')
 
-    # deployments calendar
-    calendar = client.ym_deployments_calendar.loc[y0:y1,m0:m1]
-    ax = plot_calendar(calendar)
+    calendars = [(client.ym_deployments_calendar.loc[y0:y1, m0:m1], 'Deployments', 'deployments'),
+                 (client.ym_glider_days_calendar.loc[y0:y1, m0:m1], 'Glider Days', 'gliderdays'),
+                 (client.ym_profiles_calendar.loc[y0:y1, m0:m1], 'Profiles', 'profiles')]
 
-    ax.set_title('{:} Deployments: {:} - {:}'.format(title, dt0.strftime('%b %d, %Y'), dt1.strftime('%b %d, %Y')))
+    jobs = []
+    for calendar, label, name in calendars:
+        kwargs = {}
+        if name == 'profiles' and calendar.shape[1] > 8:
+            kwargs['annot_kws'] = {'fontsize': 8}
+        figure_title = '{:} {:}: {:} - {:}'.format(title, label, dt0.strftime('%b %d, %Y'), dt1.strftime('%b %d, %Y'))
+        image_name = os.path.join(img_path or '', 'ym_{:}_{:}-{:}.png'.format(name, date0, date1))
+        jobs.append((calendar, figure_title, image_name, kwargs))
 
+    # Write the calendars in parallel
     if img_path:
-        img_name = os.path.join(img_path, 'ym_deployments_{:}-{:}.png'.format(date0, date1))
-        logging.info('Writing {:}'.format(img_name))
-        plt.savefig(img_name, bbox_inches='tight', dpi=300)
-    else:
-        plt.show()
-
-    # glider days calendar
-    calendar = client.ym_glider_days_calendar.loc[y0:y1, m0:m1]
-    ax = plot_calendar(calendar)
-
-    ax.set_title('{:} Glider Days: {:} - {:}'.format(title, dt0.strftime('%b %d, %Y'), dt1.strftime('%b %d, %Y')))
-
-    if img_path:
-        img_name = os.path.join(img_path, 'ym_gliderdays_{:}-{:}.png'.format(date0, date1))
-        logging.info('Writing {:}'.format(img_name))
-        plt.savefig(img_name, bbox_inches='tight', dpi=300)
-    else:
-        plt.show()
-
-    # profiles calendar
-    calendar = client.ym_profiles_calendar.loc[y0:y1, m0:m1]
-    if calendar.shape[1] > 8:
-        ax = plot_calendar(calendar, annot_kws={'fontsize': 8})
-    else:
-        ax = plot_calendar(calendar)
-
-    ax.set_title('{:} Profiles: {:} - {:}'.format(title, dt0.strftime('%b %d, %Y'), dt1.strftime('%b %d, %Y')))
+        for image_path in plot_calendars(jobs, dpi=300):
+            if image_path:
+                logging.info('Wrote {:}'.format(image_path))
+        return 0
 
-    if img_path:
-        img_name = os.path.join(img_path, 'ym_profiles_{:}-{:}.png'.format(date0, date1))
-        logging.info('Writing {:}'.format(img_name))
-        plt.savefig(img_name, bbox_inches='tight', dpi=300)
-    else:
+    for calendar, figure_title, image_path, kwargs in jobs:
+        ax = plot_calendar(calendar, fast=True, **kwargs)
+        ax.set_title(figure_title)
         plt.show()
 
     return 0